@@ -167,6 +167,7 @@ class Atom(object):
                 if name == 'magmom' and array.ndim == 2:
                     assert len(value) == 3
                 array[self.index] = value
+                self.atoms._changed(plural)
             else:
                 if name == 'magmom' and np.asarray(value).ndim == 1:
                     array = np.zeros((len(self.atoms), 3))
@@ -9,6 +9,7 @@ object.
 
 import numbers
 import warnings
+import itertools
 from math import cos, sin
 import copy
 
@@ -18,7 +19,19 @@ import ase.units as units
 from ase.atom import Atom
 from ase.data import atomic_numbers, chemical_symbols, atomic_masses
 from ase.utils import basestring
-from ase.utils.geometry import wrap_positions, find_mic
+from ase.utils.geometry import (wrap_positions, find_mic,
+                                 get_distances_within)
+
+# Source of change stamps.  Stamps are unique across all Atoms objects:
+_stamps = itertools.count(1)
+
+# Quantities with change stamps and the arrays they are stored in:
+tracked_quantities = ['positions', 'numbers', 'cell', 'pbc',
+                      'initial_charges', 'initial_magmoms']
+tracked_arrays = {'positions': 'positions',
+                  'numbers': 'numbers',
+                  'charges': 'initial_charges',
+                  'magmoms': 'initial_magmoms'}
 
 
 class Atoms(object):
@@ -177,6 +190,7 @@ class Atoms(object):
                 info = copy.deepcopy(atoms.info)
 
         self.arrays = {}
+        self._versions = {}
 
         if symbols is None:
             if numbers is None:
@@ -231,6 +245,41 @@ class Atoms(object):
         self.adsorbate_info = {}
 
         self.set_calculator(calculator)
+        self._changed(*tracked_quantities)
+
+    def _changed(self, *names):
+        """Give the quantities in names new change stamps.
+
+        Names of arrays ('magmoms', 'charges', ...) can also be used."""
+        versions = self.__dict__.setdefault('_versions', {})
+        for name in names:
+            name = tracked_arrays.get(name, name)
+            if name in tracked_quantities:
+                versions[name] = next(_stamps)
+
+    def touch(self, *names):
+        """Mark quantities as changed.
+
+        Use this after modifying arrays in-place (like
+        ``atoms.positions[0] += 0.1``), which is not detected by
+        get_versions().  Default is to mark all tracked quantities."""
+        self._changed(*(names or tracked_quantities))
+
+    def get_versions(self):
+        """Get change stamps.
+
+        Returns a dictionary mapping 'positions', 'numbers', 'cell',
+        'pbc', 'initial_charges' and 'initial_magmoms' to integers.
+        A quantity gets a new stamp, unique among all Atoms objects,
+        whenever it is changed through a method of this object or by
+        assignment to one of the attributes positions, numbers, cell
+        and pbc.  In-place modifications of arrays are not detected
+        (see touch())."""
+        versions = self.__dict__.get('_versions')
+        if versions is None:
+            self.touch()
+            versions = self._versions
+        return dict(versions)
 
     def set_calculator(self, calc=None):
         """Attach calculator object."""
@@ -309,7 +358,9 @@ class Atoms(object):
         if scale_atoms:
             M = np.linalg.solve(self._cell, cell)
             self.arrays['positions'][:] = np.dot(self.arrays['positions'], M)
+            self._changed('positions')
         self._cell = cell
+        self._changed('cell')
 
     def set_celldisp(self, celldisp):
         """Set the unit cell displacement vectors."""
@@ -338,6 +389,7 @@ class Atoms(object):
         if isinstance(pbc, int):
             pbc = (pbc,) * 3
         self._pbc = np.array(pbc, bool)
+        self._changed('pbc')
 
     def get_pbc(self):
         """Get periodic boundary condition flags."""
@@ -369,6 +421,7 @@ class Atoms(object):
                              (a.shape, (a.shape[0:1] + shape)))
 
         self.arrays[name] = a
+        self._changed(name)
 
     def get_array(self, name, copy=True):
         """Get an array.
@@ -399,6 +452,7 @@ class Atoms(object):
                     raise ValueError('Array has wrong shape %s != %s.' %
                                      (a.shape, b.shape))
                 b[:] = a
+            self._changed(name)
 
     def has(self, name):
         """Check for existence of array.
@@ -828,6 +882,7 @@ class Atoms(object):
 
             self.set_array(name, a)
 
+        self._changed(*tracked_quantities)
         return self
 
     __iadd__ = extend
@@ -893,6 +948,7 @@ class Atoms(object):
         mask[i] = False
         for name, a in self.arrays.items():
             self.arrays[name] = a[mask]
+        self._changed(*tracked_quantities)
         if len(self._constraints) > 0:
             for n in range(len(self._constraints)):
                 self._constraints[n].delete_atom(range(len(mask))[i])
@@ -928,6 +984,7 @@ class Atoms(object):
             self.constraints = [c.repeat(m, n) for c in self.constraints]
 
         self._cell = np.array([m[c] * self._cell[c] for c in range(3)])
+        self._changed(*tracked_quantities)
 
         return self
 
@@ -951,6 +1008,7 @@ class Atoms(object):
         nx3 array (where n is the number of atoms)."""
 
         self.arrays['positions'] += np.array(displacement)
+        self._changed('positions')
 
     def center(self, vacuum=None, axis=(0, 1, 2), about=None):
         """Center atoms in unit cell.
@@ -1007,6 +1065,7 @@ class Atoms(object):
             self._cell[i] *= 1 + longer[i] / nowlen
             translation += shift[i] * c[i] / nowlen
         self.arrays['positions'] += translation
+        self._changed('positions', 'cell')
 
         # Optionally, translate to center about a point in space.
         if about is not None:
@@ -1149,6 +1208,7 @@ class Atoms(object):
                                        np.cross(p, s * v) +
                                        np.outer(np.dot(p, v), (1.0 - c) * v) +
                                        center)
+        self._changed('positions')
         if rotate_cell:
             rotcell = self.get_cell()
             rotcell[:] = (c * rotcell -
@@ -1256,6 +1316,7 @@ class Atoms(object):
             if mask[i]:
                 self.positions[i] = group[j].position
                 j += 1
+        self._changed('positions')
 
     def set_dihedral(self, list, angle, mask=None, indices=None):
         """Set the dihedral angle between vectors list[0]->list[1] and
@@ -1393,23 +1454,36 @@ class Atoms(object):
         L = len(self)
         R = self.arrays['positions']
 
-        D = []
-        for i in range(L - 1):
-            D.append(R[i + 1:] - R[i])
-        D = np.concatenate(D)
-
-        if mic:
-            D, D_len = find_mic(D, self._cell, self._pbc)
-        else:
-            D_len = np.sqrt((D**2).sum(1))
-
         results = np.zeros((L, L), dtype=float)
-        start = 0
-        for i in range(L - 1):
-            results[i, i + 1:] = D_len[start:start + L - i - 1]
-            start += L - i - 1
+        # Rows of the upper triangle in chunks of about 2**20 vectors:
+        chunksize = max(1, 2**20 // max(L, 1))
+        for i in range(0, L - 1, chunksize):
+            n = min(chunksize, L - 1 - i)
+            D = (R[i:] - R[i:i + n, np.newaxis]).reshape((-1, 3))
+            if mic:
+                D, D_len = find_mic(D, self._cell, self._pbc)
+            else:
+                D_len = np.sqrt((D**2).sum(1))
+            results[i:i + n, i:] = np.triu(D_len.reshape((n, -1)), 1)
         return results + results.T
 
+    def get_distances_within(self, rcut, mic=False, vector=False):
+        """Return distances of all pairs of atoms closer than rcut.
+
+        Use mic=True to use the Minimum Image Convention.  Only the
+        pairs within rcut are calculated, using bins of atoms, so the
+        cost grows linearly with the number of atoms for a fixed
+        density.  Returns the indices i and j of each pair with i < j,
+        and the distances (or the distance vectors from i to j if
+        vector=True).
+        """
+        i, j, D, D_len = get_distances_within(self.arrays['positions'],
+                                              rcut, self._cell, self._pbc,
+                                              mic)
+        if vector:
+            return i, j, D
+        return i, j, D_len
+
     def set_distance(self, a0, a1, distance, fix=0.5, mic=False):
         """Set the distance between two atoms.
 
@@ -1428,6 +1502,7 @@ class Atoms(object):
         x = 1.0 - distance / D_len[0]
         R[a0] += (x * fix) * D[0]
         R[a1] -= (x * (1.0 - fix)) * D[0]
+        self._changed('positions')
 
     def get_scaled_positions(self, wrap=True):
         """Get positions relative to unit cell.
@@ -1451,6 +1526,7 @@ class Atoms(object):
     def set_scaled_positions(self, scaled):
         """Set positions relative to unit cell."""
         self.arrays['positions'][:] = np.dot(scaled, self._cell)
+        self._changed('positions')
 
     def wrap(self, center=(0.5, 0.5, 0.5), pbc=None, eps=1e-7):
         """Wrap positions to unit cell.
@@ -1484,6 +1560,7 @@ class Atoms(object):
             pbc = self.pbc
         self.positions[:] = wrap_positions(self.positions, self.cell,
                                            pbc, center, eps)
+        self._changed('positions')
 
     def get_temperature(self):
         """Get the temperature in Kelvin."""
@@ -1531,6 +1608,7 @@ class Atoms(object):
     def _set_positions(self, pos):
         """Set positions directly, bypassing constraints."""
         self.arrays['positions'][:] = pos
+        self._changed('positions')
 
     positions = property(_get_positions, _set_positions,
                          doc='Attribute for direct ' +
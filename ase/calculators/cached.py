@@ -0,0 +1,192 @@
+"""Memoization of calculated properties keyed by the atomic configuration.
+
+A normal calculator only remembers the results for the last
+configuration.  Wrapping it in a CachedCalculator will make it
+remember many configurations so that revisiting a geometry (basin
+hopping, numerical forces and stresses, restarted NEB calculations,
+...) does not trigger a new calculation::
+
+    calc = CachedCalculator(Vasp(...), maxsize=1000, db='cache.db')
+    atoms.calc = calc
+
+The optional ase.db backend makes the cache persist between runs.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from ase.calculators.calculator import Calculator, all_changes, \
+    all_properties
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.io.jsonio import MyEncoder
+
+
+def configuration_hash(atoms, tol=1e-8):
+    """Hash of numbers, positions, cell, pbc, magmoms and charges.
+
+    Positions, cell, initial magnetic moments and initial charges are
+    rounded to multiples of tol before hashing."""
+
+    md5 = hashlib.md5()
+    md5.update(np.ascontiguousarray(atoms.numbers, np.int64).tobytes())
+    md5.update(np.ascontiguousarray(atoms.pbc, bool).tobytes())
+    for x in [atoms.positions, atoms.cell,
+              atoms.get_initial_magnetic_moments(),
+              atoms.get_initial_charges()]:
+        md5.update(np.ascontiguousarray(np.round(np.asarray(x) / tol),
+                                        np.int64).tobytes())
+    return md5.hexdigest()
+
+
+def calculator_hash(calc):
+    """Hash of the name and parameters of a calculator."""
+    name = getattr(calc, 'name', calc.__class__.__name__)
+    parameters = dict(getattr(calc, 'parameters', None) or {})
+    try:
+        text = json.dumps(parameters, sort_keys=True, cls=MyEncoder)
+    except TypeError:
+        text = repr(sorted(parameters.items()))
+    md5 = hashlib.md5()
+    md5.update(('%s %s' % (name, text)).encode())
+    return md5.hexdigest()
+
+
+def results_nbytes(results):
+    """Approximate size of a results dictionary in bytes."""
+    return sum(value.nbytes if isinstance(value, np.ndarray) else 8
+               for value in results.values())
+
+
+class CachedCalculator(Calculator):
+    """Calculator wrapper remembering results for many configurations.
+
+    calc: Calculator
+        The calculator doing the actual work.
+    maxsize: int
+        Maximum number of configurations held in memory.  The least
+        recently used ones are dropped first.
+    maxbytes: int or None
+        Maximum total size in bytes of the results held in memory.
+    tol: float
+        Positions, cell, magnetic moments and charges that agree after
+        rounding to this precision are considered identical.
+    db: str, Database object or None
+        Optional ase.db database used for looking up and storing
+        results not found in memory.  Rows are identified by the
+        ``cachekey`` key.
+
+    The keys cover the name and parameters of the wrapped calculator,
+    so a database shared by runs with different settings only returns
+    results for the same settings.  When the parameters of the wrapped
+    calculator change, the in-memory cache is cleared.
+
+    The number of cache hits and misses are available as the
+    attributes hits and misses.
+    """
+
+    def __init__(self, calc, maxsize=100, maxbytes=None, tol=1e-8,
+                 db=None):
+        Calculator.__init__(self)
+        self.calc = calc
+        self.implemented_properties = calc.implemented_properties
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.tol = tol
+
+        if isinstance(db, str):
+            from ase.db import connect
+            db = connect(db)
+        self.db = db
+
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.calckey = calculator_hash(calc)
+        self.hits = 0
+        self.misses = 0
+
+    def get_spin_polarized(self):
+        return self.calc.get_spin_polarized()
+
+    def check_state(self, atoms, tol=1e-15):
+        system_changes = Calculator.check_state(self, atoms, tol)
+        if (not system_changes and
+            calculator_hash(self.calc) != self.calckey):
+            # The wrapped calculator has new parameters:
+            system_changes = ['parameters']
+        return system_changes
+
+    def clear(self):
+        """Clear the in-memory cache."""
+        self.cache.clear()
+        self.nbytes = 0
+
+    def lookup(self, key):
+        """Return cached results for key or an empty dictionary."""
+        results = self.cache.pop(key, None)
+        if results is not None:
+            self.cache[key] = results  # now most recently used
+            return results
+
+        if self.db is not None:
+            for row in self.db.select(cachekey=key, limit=1):
+                results = dict((prop, row[prop])
+                               for prop in all_properties if prop in row)
+                self.insert(key, results)
+                return results
+
+        return {}
+
+    def insert(self, key, results):
+        """Insert results in memory and drop old entries if needed."""
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.nbytes -= results_nbytes(old)
+        self.cache[key] = results
+        self.nbytes += results_nbytes(results)
+        while self.cache and (len(self.cache) > self.maxsize or
+                              self.maxbytes is not None and
+                              self.nbytes > self.maxbytes):
+            oldkey, old = self.cache.popitem(last=False)
+            self.nbytes -= results_nbytes(old)
+
+    def store(self, key, atoms, results):
+        self.insert(key, results)
+        if self.db is not None:
+            ids = [row.id for row in self.db.select(cachekey=key)]
+            if ids:
+                self.db.delete(ids)
+            atoms = atoms.copy()
+            atoms.calc = SinglePointCalculator(
+                atoms, **dict((prop, results[prop])
+                              for prop in all_properties
+                              if prop in results))
+            self.db.write(atoms, cachekey=key)
+
+    def calculate(self, atoms=None, properties=['energy'],
+                  system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+
+        calckey = calculator_hash(self.calc)
+        if calckey != self.calckey:
+            self.clear()
+            self.calckey = calckey
+        key = configuration_hash(self.atoms, self.tol) + calckey
+        results = self.lookup(key)
+        missing = [prop for prop in properties if prop not in results]
+        if missing:
+            self.misses += 1
+            results = dict(results)
+            for prop in missing:
+                self.calc.get_property(prop, self.atoms)
+            for prop, value in self.calc.results.items():
+                if isinstance(value, np.ndarray):
+                    value = value.copy()
+                results[prop] = value
+            self.store(key, self.atoms, results)
+        else:
+            self.hits += 1
+
+        self.results = dict(results)
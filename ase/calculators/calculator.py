@@ -1,5 +1,6 @@
 import os
 import copy
+import itertools
 import subprocess
 from math import pi, sqrt
 
@@ -69,6 +70,23 @@ def equal(a, b, tol=None):
     return abs(a - b) < tol * abs(b) + tol
 
 
+def snapshot(atoms):
+    """Return a lightweight copy of atoms.
+
+    Only the unit cell, the boundary conditions and the arrays that
+    can influence calculated properties (numbers, positions, initial
+    magnetic moments and charges) are copied.  Constraints, momenta,
+    masses, tags and info are left out."""
+
+    from ase.atoms import Atoms
+    copy = Atoms(cell=atoms.cell, pbc=atoms.pbc)
+    copy.arrays = dict((name, atoms.arrays[name].copy())
+                       for name in ['numbers', 'positions',
+                                    'magmoms', 'charges']
+                       if name in atoms.arrays)
+    return copy
+
+
 def kptdensity2monkhorstpack(atoms, kptdensity=3.5, even=True):
     """Convert k-point density to Monkhorst-Pack grid size.
 
@@ -156,6 +174,13 @@ class Calculator:
     default_parameters = {}
     'Default parameters'
 
+    track_changes = False
+    """Detect system changes using the change stamps of the Atoms
+    object (see Atoms.get_versions()) instead of comparing arrays, and
+    keep only a lightweight copy of the atoms.  Only safe if the atoms
+    are not modified in-place between calculations (or if
+    Atoms.touch() is called after doing so)."""
+
     def __init__(self, restart=None, ignore_bad_restart_file=False, label=None,
                  atoms=None, **kwargs):
         """Basic calculator implementation.
@@ -176,6 +201,7 @@ class Calculator:
 
         self.atoms = None  # copy of atoms object from last calculation
         self.results = {}  # calculated properties (energy, forces, ...)
+        self.versions = None  # change stamps of atoms from last calculation
         self.parameters = None  # calculational parameters
 
         if restart is not None:
@@ -248,6 +274,7 @@ class Calculator:
 
         self.atoms = None
         self.results = {}
+        self.versions = None
 
     def read(self, label):
         """Read atoms, parameters and calculated properties from output file.
@@ -324,6 +351,10 @@ class Calculator:
         """Check for system changes since last calculation."""
         if self.atoms is None:
             system_changes = all_changes
+        elif self.track_changes and self.versions is not None:
+            versions = atoms.get_versions()
+            system_changes = [name for name in all_changes
+                              if versions[name] != self.versions[name]]
         else:
             system_changes = []
             if not equal(self.atoms.positions, atoms.positions, tol):
@@ -334,11 +365,13 @@ class Calculator:
                 system_changes.append('cell')
             if not equal(self.atoms.pbc, atoms.pbc):
                 system_changes.append('pbc')
-            if not equal(self.atoms.get_initial_magnetic_moments(),
-                         atoms.get_initial_magnetic_moments(), tol):
+            if ((self.atoms.has('magmoms') or atoms.has('magmoms')) and
+                not equal(self.atoms.get_initial_magnetic_moments(),
+                          atoms.get_initial_magnetic_moments(), tol)):
                 system_changes.append('initial_magmoms')
-            if not equal(self.atoms.get_initial_charges(),
-                         atoms.get_initial_charges(), tol):
+            if ((self.atoms.has('charges') or atoms.has('charges')) and
+                not equal(self.atoms.get_initial_charges(),
+                          atoms.get_initial_charges(), tol)):
                 system_changes.append('initial_charges')
 
         return system_changes
@@ -350,12 +383,18 @@ class Calculator:
         else:
             return energy
 
+    def get_potential_energies(self, atoms=None):
+        return self.get_property('energies', atoms)
+
     def get_forces(self, atoms=None):
         return self.get_property('forces', atoms)
 
     def get_stress(self, atoms=None):
         return self.get_property('stress', atoms)
 
+    def get_stresses(self, atoms=None):
+        return self.get_property('stresses', atoms)
+
     def get_dipole_moment(self, atoms=None):
         return self.get_property('dipole', atoms)
 
@@ -439,7 +478,12 @@ class Calculator:
         implementation to set the atoms attribute.
         """
 
-        if atoms is not None:
+        if atoms is None or atoms is self.atoms:
+            return
+        if self.track_changes:
+            self.atoms = snapshot(atoms)
+            self.versions = atoms.get_versions()
+        else:
             self.atoms = atoms.copy()
 
     def calculate_numerical_forces(self, atoms, d=0.001):
@@ -527,18 +571,50 @@ class FileIOCalculator(Calculator):
                                ('ASE_' + self.name.upper() + '_COMMAND') +
                                'or supply the command keyword')
         command = self.command.replace('PREFIX', self.prefix)
-        olddir = os.getcwd()
-        try:
-            os.chdir(self.directory)
-            errorcode = subprocess.call(command, shell=True)
-        finally:
-            os.chdir(olddir)
-        
+        errorcode = subprocess.call(command, shell=True, cwd=self.directory)
+
         if errorcode:
             raise RuntimeError('%s returned an error: %d' %
                                (self.name, errorcode))
         self.read_results()
 
+    def submit(self, atoms, properties=['energy', 'forces'],
+               directory=None, pool=None):
+        """Start a calculation without waiting for it to finish.
+
+        The calculation is done by a copy of this calculator in its own
+        directory (default is a numbered subdirectory of this
+        calculator's directory), so that several calculations can run
+        at the same time.
+
+        atoms: Atoms object
+            Configuration to calculate.  A copy is made, so atoms can
+            be modified right away.
+        properties: list of str
+            Properties to calculate.
+        directory: str
+            Directory for the calculation.
+        pool: JobPool object
+            Pool to run the calculation in.  Default is a shared pool
+            with one worker per CPU.
+
+        Returns a future (see the concurrent.futures module) whose
+        result() method returns the dictionary of calculated
+        properties."""
+
+        if directory is None:
+            if not hasattr(self, 'jobcounter'):
+                self.jobcounter = itertools.count()
+            directory = os.path.join(self.directory, '%s-job%d' %
+                                     (self.prefix, next(self.jobcounter)))
+        calc = copy.copy(self)
+        calc.parameters = copy.deepcopy(self.parameters)
+        calc.reset()
+        calc.set_label(os.path.join(directory, self.prefix))
+        if pool is None:
+            pool = get_default_pool()
+        return pool.submit(calc, atoms.copy(), properties)
+
     def write_input(self, atoms, properties=None, system_changes=None):
         """Write input file(s).
 
@@ -551,3 +627,62 @@ class FileIOCalculator(Calculator):
     def read_results(self):
         """Read energy, forces, ... from output file(s)."""
         pass
+
+
+class JobPool:
+    """Pool of worker threads running calculations concurrently.
+
+    The workers spend their time waiting for external programs, so
+    threads are sufficient for running several FileIOCalculator jobs
+    at once (see FileIOCalculator.submit()).
+
+    workers: int
+        Maximum number of simultaneous calculations.  Default is the
+        number of CPUs.
+
+    A pool can be used as a context manager, which waits for all jobs
+    to finish on exit::
+
+        with JobPool(4) as pool:
+            futures = [calc.submit(atoms, pool=pool) for atoms in images]
+            energies = [f.result()['energy'] for f in futures]
+    """
+
+    def __init__(self, workers=None):
+        from concurrent.futures import ThreadPoolExecutor
+        if workers is None:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers)
+
+    def submit(self, calc, atoms, properties):
+        """Calculate properties of atoms with calc in a worker.
+
+        Returns a future for the results dictionary of calc."""
+        return self.executor.submit(self.run, calc, atoms, properties)
+
+    @staticmethod
+    def run(calc, atoms, properties):
+        calc.calculate(atoms, properties, all_changes)
+        return calc.results
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+
+
+default_pool = None
+
+
+def get_default_pool():
+    """Return pool shared by all calculators."""
+    global default_pool
+    if default_pool is None:
+        default_pool = JobPool()
+    return default_pool
@@ -46,7 +46,7 @@ class LAMMPS:
     def __init__(self, label='lammps', tmp_dir=None, parameters={},
                  specorder=None, files=[], always_triclinic=False,
                  keep_alive=True, keep_tmp_files=False,
-                 no_data_file=False):
+                 no_data_file=False, streaming=False):
         """The LAMMPS calculators object
 
         files: list
@@ -72,6 +72,14 @@ class LAMMPS:
         always_triclinic: bool
             Force use of a triclinic cell in LAMMPS, even if the cell is
             a perfect parallelepiped.
+        streaming: bool
+            Requires keep_alive.  When only the positions have changed
+            since the previous calculation, send the changed coordinates
+            to the running LAMMPS process with "set atom" commands
+            instead of writing a new data file and input script.  The
+            forces are written to a file in /dev/shm (if available) and
+            read back with NumPy.  Not used together with the 'minimize'
+            and 'run' parameters.
         """
 
         self.label = label
@@ -88,6 +96,10 @@ class LAMMPS:
             # If tmp_dir is pointing somewhere, don't remove stuff!
             self.keep_tmp_files = True
         self._lmp_handle = None        # To handle the lmp process
+        self.streaming = streaming
+        self._lmp_positions = None     # Positions known to the lmp process
+        self._dump_all = False         # Is the dump of the full run active?
+        self._stream_file = None
 
         # read_log depends on that the first (three) thermo_style custom args
         # can be capitilized and matched aginst the log output. I.e.
@@ -126,8 +138,12 @@ class LAMMPS:
     def clean(self, force=False):
 
         self._lmp_end()
+        self._lmp_positions = None
 
         if not self.keep_tmp_files:
+            if (self._stream_file is not None and
+                os.path.exists(self._stream_file)):
+                os.remove(self._stream_file)
             shutil.rmtree(self.tmp_dir)
 
     def get_potential_energy(self, atoms):
@@ -150,6 +166,11 @@ class LAMMPS:
             self.calculate(atoms)
 
     def calculate(self, atoms):
+        if self._can_stream(atoms):
+            self.atoms = atoms.copy()
+            self.stream()
+            return
+
         self.atoms = atoms.copy()
         pbc = self.atoms.get_pbc()
         if all(pbc):
@@ -166,6 +187,24 @@ class LAMMPS:
             cell = self.atoms.get_cell()
         self.prism = prism(cell)
         self.run()
+        if self.streaming and self.keep_alive:
+            self._lmp_positions = np.dot(self.atoms.get_positions(),
+                                         self.prism.R)
+            self._dump_all = True
+
+    def _can_stream(self, atoms):
+        # Return True if only the positions changed since the last run
+        if not self.streaming or self._lmp_positions is None:
+            return False
+        if 'minimize' in self.parameters or 'run' in self.parameters:
+            return False
+        if not self._lmp_alive():
+            return False
+        old = self.atoms
+        return (len(old) == len(atoms) and
+                (old.get_atomic_numbers() == atoms.get_atomic_numbers()).all() and
+                (old.get_pbc() == atoms.get_pbc()).all() and
+                (old.get_cell() == atoms.get_cell()).all())
 
     def _lmp_alive(self):
         # Return True if this calculator is currently handling a running lammps process
@@ -217,7 +256,8 @@ class LAMMPS:
             lammps_data = None
         else:
             lammps_data_fd = NamedTemporaryFile(prefix='data_'+label, dir=self.tmp_dir,
-                                                delete=(not self.keep_tmp_files))
+                                                delete=(not self.keep_tmp_files),
+                                                mode='w')
             self.write_lammps_data(lammps_data=lammps_data_fd)
             lammps_data = lammps_data_fd.name
             lammps_data_fd.flush()
@@ -227,7 +267,8 @@ class LAMMPS:
         if not self._lmp_alive():
             # Attempt to (re)start lammps
             self._lmp_handle = Popen(lammps_cmd_line+lammps_options+['-log', '/dev/stdout'],
-                                    stdin=PIPE, stdout=PIPE)
+                                    stdin=PIPE, stdout=PIPE,
+                                    universal_newlines=True, bufsize=1)
         lmp_handle = self._lmp_handle
 
 
@@ -285,6 +326,70 @@ class LAMMPS:
 
         os.chdir(cwd)
 
+    def stream(self):
+        """Evaluate the current positions in the running LAMMPS process.
+
+        Only the coordinates that changed since the previous
+        calculation are sent.  The log is read without a separate
+        thread, as the echo of the "set atom" commands is switched
+        off."""
+
+        self.calls += 1
+
+        if self._stream_file is None:
+            if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+                dir = '/dev/shm'
+            else:
+                dir = self.tmp_dir
+            self._stream_file = uns_mktemp(prefix='forces_' + self.label,
+                                           dir=dir)
+
+        positions = np.dot(self.atoms.get_positions(), self.prism.R)
+        changed = np.nonzero((positions != self._lmp_positions).any(1))[0]
+
+        commands = []
+        if self._dump_all:
+            # No need to write the full trajectory any more
+            commands.append('undump dump_all\n')
+            self._dump_all = False
+        commands.append('log none\n')
+        commands.extend(['set atom %d x %.17g y %.17g z %.17g\n' %
+                         (i + 1, x, y, z)
+                         for i, (x, y, z) in zip(changed, positions[changed])])
+        commands.append('log /dev/stdout append\n' +
+                        'run 0\n' +
+                        ('write_dump all custom %s id fx fy fz modify sort id\n'
+                         % self._stream_file) +
+                        ('print "%s"\n' % CALCULATION_END_MARK))
+
+        lmp_handle = self._lmp_handle
+        lmp_handle.stdin.write(''.join(commands))
+        lmp_handle.stdin.flush()
+        self.read_lammps_log(lmp_handle.stdout)
+
+        if len(self.thermo_content) == 0:
+            self._lmp_positions = None
+            raise RuntimeError('Failed to retreive any thermo_style-output')
+        if int(self.thermo_content[-1]['atoms']) != len(self.atoms):
+            self._lmp_positions = None
+            raise RuntimeError('Atoms have gone missing')
+
+        forces = self.read_lammps_forces(self._stream_file)
+        self.forces = np.dot(forces, np.linalg.inv(self.prism.R))
+        self._lmp_positions = positions
+
+    def read_lammps_forces(self, filename):
+        """Read forces from a dump file with id, fx, fy and fz columns.
+
+        The atoms section is converted in one go with NumPy."""
+        with open(filename) as f:
+            header, data = f.read().split('ITEM: ATOMS', 1)
+        columns, data = data.split('\n', 1)
+        columns = columns.split()
+        values = np.array(data.split(), float).reshape((-1, len(columns)))
+        values = values[np.argsort(values[:, columns.index('id')])]
+        return values[:, [columns.index(x) for x in ('fx', 'fy', 'fz')]]
+
     def write_lammps_data(self, lammps_data=None):
         """Method which writes a LAMMPS data file with atomic structure."""
         if (lammps_data == None):
@@ -1,44 +1,25 @@
-import numpy as np
+from ase.calculators.pairpotential import PairPotential, MorseTerm
 
-from math import exp, sqrt
 
-from ase.calculators.calculator import Calculator
-
-
-class MorsePotential(Calculator):
+class MorsePotential(PairPotential):
     """Morse potential.
 
-    Default values chosen to be similar as Lennard-Jones.
+    Default values chosen to be similar as Lennard-Jones.  All pairs of
+    atoms in the unit cell interact; periodic images are not included,
+    so no stress is calculated.
     """
 
-    implemented_properties = ['energy', 'forces']
+    implemented_properties = ['energy', 'forces', 'energies']
     default_parameters = {'epsilon': 1.0,
                           'rho0': 6.0,
-                          'r0': 1.0}
-    nolabel = True
+                          'r0': 1.0,
+                          'smoothing': None,
+                          'width': 1.0}
 
-    def __init__(self, **kwargs):
-        Calculator.__init__(self, **kwargs)
+    def get_pair_terms(self):
+        return MorseTerm(self.parameters.epsilon,
+                         self.parameters.rho0,
+                         self.parameters.r0)
 
-    def calculate(self, atoms=None, properties=['energy'],
-                  system_changes=['positions', 'numbers', 'cell',
-                                  'pbc', 'charges','magmoms']):
-        Calculator.calculate(self, atoms, properties, system_changes)
-        epsilon = self.parameters.epsilon
-        rho0 = self.parameters.rho0
-        r0 = self.parameters.r0
-        positions = self.atoms.get_positions()
-        energy = 0.0
-        forces = np.zeros((len(self.atoms), 3))
-        preF = 2 * epsilon * rho0 / r0
-        for i1, p1 in enumerate(positions):
-            for i2, p2 in enumerate(positions[:i1]):
-                diff = p2 - p1
-                r = sqrt(np.dot(diff, diff))
-                expf = exp(rho0 * (1.0 - r / r0))
-                energy += epsilon * expf * (expf - 2)
-                F = preF * expf * (expf - 1) * diff / r
-                forces[i1] -= F
-                forces[i2] += F
-        self.results['energy'] = energy
-        self.results['forces'] = forces
+    def get_cutoff(self, term):
+        return None
@@ -0,0 +1,418 @@
+"""Generalized pair-potential calculator.
+
+All pair terms are evaluated through one vectorized pipeline: a flat
+list of pairs (i, j, offset) is built from a NeighborList, the pair
+energies and derivatives are evaluated per species pair on whole
+arrays, and forces, stress and per-atom quantities are accumulated
+with ``np.bincount``.
+
+Example::
+
+    from ase.calculators.pairpotential import (PairPotential,
+                                               LennardJonesTerm,
+                                               MorseTerm)
+    calc = PairPotential(pairs={('Ar', 'Ar'): LennardJonesTerm(0.01, 3.4),
+                                ('Ar', 'Kr'): MorseTerm(0.01, 6.0, 3.8)},
+                         rc=10.0, smoothing='shift')
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from ase.data import atomic_numbers, chemical_symbols
+from ase.calculators.neighborlist import NeighborList
+from ase.calculators.calculator import Calculator, all_changes
+
+
+class PairTerm:
+    """Base class for a pair term.
+
+    Subclasses implement evaluate(r), which returns the pair energy
+    and its derivative with respect to r for an array of distances.
+
+    rc: float or None
+        Cutoff for this term.  None means: use the cutoff of the
+        calculator.
+    """
+
+    rc = None
+
+    def evaluate(self, r):
+        raise NotImplementedError
+
+    def __call__(self, r):
+        return self.evaluate(np.asarray(r, float))
+
+
+class LennardJonesTerm(PairTerm):
+    """Lennard-Jones term: 4 epsilon ((sigma / r)^12 - (sigma / r)^6)."""
+
+    def __init__(self, epsilon=1.0, sigma=1.0, rc=None):
+        self.epsilon = epsilon
+        self.sigma = sigma
+        self.rc = rc
+
+    def evaluate(self, r):
+        c6 = (self.sigma / r)**6
+        c12 = c6**2
+        e = 4 * self.epsilon * (c12 - c6)
+        de = -24 * self.epsilon * (2 * c12 - c6) / r
+        return e, de
+
+
+class MorseTerm(PairTerm):
+    """Morse term: epsilon exp(rho0 (1 - r / r0)) (exp(...) - 2)."""
+
+    def __init__(self, epsilon=1.0, rho0=6.0, r0=1.0, rc=None):
+        self.epsilon = epsilon
+        self.rho0 = rho0
+        self.r0 = r0
+        self.rc = rc
+
+    def evaluate(self, r):
+        expf = np.exp(self.rho0 * (1.0 - r / self.r0))
+        e = self.epsilon * expf * (expf - 2)
+        de = -2 * self.epsilon * self.rho0 / self.r0 * expf * (expf - 1)
+        return e, de
+
+
+class TabulatedTerm(PairTerm):
+    """Pair term interpolated from a table.
+
+    r: array
+        Increasing grid of distances.
+    e: array
+        Pair energies on the grid.
+    de: array
+        Derivatives of the pair energy on the grid.  Estimated with
+        finite differences if not given.
+    rc: float
+        Cutoff.  Defaults to the last grid point.
+
+    Values between grid points are obtained by cubic Hermite
+    interpolation, so that energies and forces are consistent.
+    """
+
+    def __init__(self, r, e, de=None, rc=None):
+        self.r = np.asarray(r, float)
+        self.e = np.asarray(e, float)
+        if de is None:
+            de = np.gradient(self.e, self.r)
+        self.de = np.asarray(de, float)
+        assert self.r.shape == self.e.shape == self.de.shape
+        assert (np.diff(self.r) > 0).all()
+        if rc is None:
+            rc = self.r[-1]
+        self.rc = rc
+
+    def evaluate(self, r):
+        k = np.clip(np.searchsorted(self.r, r) - 1, 0, len(self.r) - 2)
+        h = self.r[k + 1] - self.r[k]
+        t = (r - self.r[k]) / h
+        t2 = t**2
+        t3 = t2 * t
+        e = ((2 * t3 - 3 * t2 + 1) * self.e[k] +
+             (t3 - 2 * t2 + t) * h * self.de[k] +
+             (-2 * t3 + 3 * t2) * self.e[k + 1] +
+             (t3 - t2) * h * self.de[k + 1])
+        de = ((6 * t2 - 6 * t) * self.e[k] / h +
+              (3 * t2 - 4 * t + 1) * self.de[k] +
+              (-6 * t2 + 6 * t) * self.e[k + 1] / h +
+              (3 * t2 - 2 * t) * self.de[k + 1])
+        return e, de
+
+
+def switching_function(r, r1, r2):
+    """Smooth step going from 1 at r1 to 0 at r2.
+
+    Returns the function and its derivative.  The polynomial
+    1 - 10x^3 + 15x^4 - 6x^5 has vanishing first and second
+    derivatives at both ends."""
+
+    x = np.clip((r - r1) / (r2 - r1), 0.0, 1.0)
+    s = 1 - x**3 * (10 - 15 * x + 6 * x**2)
+    ds = -30 * x**2 * (1 - x)**2 / (r2 - r1)
+    return s, ds
+
+
+def _get_number(symbol):
+    if isinstance(symbol, str):
+        return atomic_numbers[symbol]
+    return int(symbol)
+
+
+class PairPotential(Calculator):
+    """Calculator for sums of pair terms.
+
+    pairs: PairTerm or dict
+        Either a single term used for all pairs of atoms or a
+        dictionary mapping pairs of chemical symbols or atomic numbers
+        to terms.  The order within a pair does not matter.  Pairs of
+        species not found in the dictionary do not interact.
+    rc: float or None
+        Default cutoff for terms that do not have their own.  If the
+        cutoff is None for all terms, all pairs of atoms inside the
+        unit cell interact and periodic images are ignored.
+    smoothing: None, 'shift' or 'switch'
+        How to treat the cutoff.  'shift' subtracts the value at the
+        cutoff from the pair energy (forces are unchanged) and
+        'switch' multiplies the pair energy by a smooth switching
+        function going from 1 at rc - width to 0 at rc.
+    width: float
+        Width of the switching region.
+    skin: float
+        Skin distance of the neighbor list.
+
+    Per-atom energies and stresses are obtained by giving half of
+    each pair contribution to each of the two atoms.
+    """
+
+    implemented_properties = ['energy', 'forces', 'stress',
+                              'energies', 'stresses']
+    default_parameters = {'pairs': None,
+                          'rc': None,
+                          'smoothing': None,
+                          'width': 1.0,
+                          'skin': 0.3}
+    nolabel = True
+
+    def __init__(self, **kwargs):
+        self.terms = None
+        Calculator.__init__(self, **kwargs)
+        self.check_pair_terms(self.get_pair_terms())
+
+    def check_pair_terms(self, pairs):
+        """Raise ValueError unless pairs is a PairTerm or a dict of them."""
+        if isinstance(pairs, PairTerm):
+            return
+        if (isinstance(pairs, dict) and pairs and
+            all(isinstance(term, PairTerm) for term in pairs.values())):
+            return
+        raise ValueError('pairs must be a PairTerm or a dictionary mapping '
+                         'pairs of species to PairTerms, not {0!r}'
+                         .format(pairs))
+
+    def set(self, **kwargs):
+        if 'pairs' in kwargs:
+            self.check_pair_terms(kwargs['pairs'])
+        changed_parameters = Calculator.set(self, **kwargs)
+        if changed_parameters:
+            self.reset()
+            self.terms = None
+        return changed_parameters
+
+    def get_pair_terms(self):
+        """Return the pairs parameter.
+
+        Calculators built on top of this one override this method to
+        construct their terms from their own parameters."""
+        return self.parameters.pairs
+
+    def get_cutoff(self, term):
+        if term.rc is not None:
+            return term.rc
+        return self.parameters.rc
+
+    def initialize(self, atoms):
+        """Build the table of terms and the neighbor list."""
+        pairs = self.get_pair_terms()
+        if isinstance(pairs, PairTerm):
+            self.terms = [pairs]
+            self.table = None
+        else:
+            self.terms = []
+            self.table = -np.ones((len(chemical_symbols),) * 2, int)
+            for (s1, s2), term in pairs.items():
+                Z1 = _get_number(s1)
+                Z2 = _get_number(s2)
+                if term not in self.terms:
+                    self.terms.append(term)
+                t = self.terms.index(term)
+                self.table[Z1, Z2] = t
+                self.table[Z2, Z1] = t
+
+        cutoffs = [self.get_cutoff(term) for term in self.terms]
+        if None in cutoffs:
+            if any(rc is not None for rc in cutoffs):
+                raise ValueError('Cutoffs must be given for all terms '
+                                 'or for none of them')
+            self.nl = None
+        else:
+            rcmax = max(cutoffs)
+            self.nl = NeighborList([rcmax / 2] * len(atoms),
+                                   skin=self.parameters.get('skin', 0.3),
+                                   self_interaction=False)
+        self.pairs = None
+        self.batch_nls = []
+
+    def get_pairs(self, atoms):
+        """Return flat arrays of pair indices and cell offsets."""
+        if self.nl is None:
+            if self.pairs is None:
+                i, j = np.triu_indices(len(atoms), 1)
+                self.pairs = (i, j, np.zeros((len(i), 3), int))
+        elif self.nl.update(atoms) or self.pairs is None:
+            natoms = len(atoms)
+            i = np.repeat(np.arange(natoms),
+                          [len(n) for n in self.nl.neighbors])
+            if natoms > 0:
+                j = np.concatenate(self.nl.neighbors).astype(int)
+                offsets = np.concatenate(self.nl.displacements)
+            else:
+                j = np.empty(0, int)
+                offsets = np.empty((0, 3), int)
+            self.pairs = (i, j, offsets)
+        return self.pairs
+
+    def evaluate_pairs(self, numbers1, numbers2, d, r):
+        """Pair energies and the forces on the second atom of each pair.
+
+        numbers1, numbers2: arrays
+            Atomic numbers of the two atoms of each pair.
+        d: array
+            Distance vectors from the first to the second atom.
+        r: array
+            Lengths of the distance vectors."""
+
+        if self.table is None:
+            types = np.zeros(len(r), int)
+        else:
+            types = self.table[numbers1, numbers2]
+
+        e = np.zeros(len(r))
+        de = np.zeros(len(r))
+        smoothing = self.parameters.get('smoothing')
+        for t, term in enumerate(self.terms):
+            mask = types == t
+            rc = self.get_cutoff(term)
+            if rc is not None:
+                mask &= r < rc
+            if not mask.any():
+                continue
+            et, det = term(r[mask])
+            if rc is None or smoothing is None:
+                pass
+            elif smoothing == 'shift':
+                et -= term(rc)[0]
+            elif smoothing == 'switch':
+                s, ds = switching_function(r[mask],
+                                           rc - self.parameters.width, rc)
+                det = det * s + et * ds
+                et = et * s
+            else:
+                raise ValueError('Unknown smoothing: %r' % smoothing)
+            e[mask] = et
+            de[mask] = det
+
+        # Force on atom j from the pair (i, j):
+        f = -(de / np.where(r > 0, r, 1))[:, np.newaxis] * d
+        return e, f
+
+    def calculate_batch(self, images):
+        """Energies and forces of many replicas of the same system.
+
+        The replicas must have the same atomic numbers, unit cell and
+        boundary conditions.  The pairs of all replicas are evaluated
+        together.  Returns the energies as an array of shape (R,) and
+        the forces as an array of shape (R, N, 3), where R is the
+        number of replicas and N the number of atoms."""
+
+        atoms = images[0]
+        if self.terms is None:
+            self.initialize(atoms)
+        nreplicas = len(images)
+        natoms = len(atoms)
+        positions = np.array([image.positions for image in images])
+        numbers = atoms.numbers
+
+        if self.nl is None:
+            i, j = np.triu_indices(natoms, 1)
+            d = (positions[:, j] - positions[:, i]).reshape((-1, 3))
+            replica = np.repeat(np.arange(nreplicas), len(i))
+            i = (i + natoms * np.arange(nreplicas)[:, np.newaxis]).ravel()
+            j = (j + natoms * np.arange(nreplicas)[:, np.newaxis]).ravel()
+        else:
+            # One neighbor list per replica:
+            nls = self.batch_nls
+            if len(nls) != nreplicas or len(nls[0].cutoffs) != natoms:
+                nls = [NeighborList(self.nl.cutoffs, skin=self.nl.skin,
+                                    self_interaction=False)
+                       for image in images]
+                self.batch_nls = nls
+                self.batch_pairs = [None] * nreplicas
+            pairs = self.batch_pairs
+            for r, (nl, image) in enumerate(zip(nls, images)):
+                if nl.update(image) or pairs[r] is None:
+                    i = np.repeat(np.arange(natoms),
+                                  [len(n) for n in nl.neighbors])
+                    j = np.concatenate(nl.neighbors).astype(int)
+                    offsets = np.concatenate(nl.displacements)
+                    pairs[r] = (i + r * natoms, j + r * natoms,
+                                np.dot(offsets, atoms.cell))
+            i = np.concatenate([p[0] for p in pairs])
+            j = np.concatenate([p[1] for p in pairs])
+            positions = positions.reshape((-1, 3))
+            d = (positions[j] - positions[i] +
+                 np.concatenate([p[2] for p in pairs]))
+            replica = i // natoms
+
+        r = np.sqrt((d**2).sum(1))
+        e, f = self.evaluate_pairs(numbers[i % natoms], numbers[j % natoms],
+                                   d, r)
+        forces = np.zeros((nreplicas * natoms, 3))
+        for c in range(3):
+            forces[:, c] = (
+                np.bincount(j, f[:, c], minlength=nreplicas * natoms) -
+                np.bincount(i, f[:, c], minlength=nreplicas * natoms))
+        energies = np.bincount(replica, e, minlength=nreplicas)
+        return energies, forces.reshape((nreplicas, natoms, 3))
+
+    def calculate(self, atoms=None,
+                  properties=['energy'],
+                  system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+
+        if self.terms is None or 'numbers' in system_changes:
+            self.initialize(self.atoms)
+
+        natoms = len(self.atoms)
+        i, j, offsets = self.get_pairs(self.atoms)
+        positions = self.atoms.positions
+        cell = self.atoms.cell
+
+        d = positions[j] - positions[i] + np.dot(offsets, cell)
+        r = np.sqrt((d**2).sum(1))
+        e, f = self.evaluate_pairs(self.atoms.numbers[i],
+                                   self.atoms.numbers[j], d, r)
+
+        forces = np.zeros((natoms, 3))
+        for c in range(3):
+            forces[:, c] = (np.bincount(j, f[:, c], minlength=natoms) -
+                            np.bincount(i, f[:, c], minlength=natoms))
+
+        energies = 0.5 * (np.bincount(i, e, minlength=natoms) +
+                          np.bincount(j, e, minlength=natoms))
+
+        self.results['energy'] = e.sum()
+        self.results['energies'] = energies
+        self.results['forces'] = forces
+
+        if 'stress' not in self.implemented_properties:
+            return
+
+        volume = abs(self.atoms.get_volume())
+        if volume > 0:
+            # Voigt order: xx, yy, zz, yz, xz, xy
+            a = [0, 1, 2, 1, 0, 0]
+            b = [0, 1, 2, 2, 2, 1]
+            pairstress = -f[:, a] * d[:, b] / volume
+            stresses = np.empty((natoms, 6))
+            for c in range(6):
+                stresses[:, c] = 0.5 * (
+                    np.bincount(i, pairstress[:, c], minlength=natoms) +
+                    np.bincount(j, pairstress[:, c], minlength=natoms))
+            self.results['stress'] = pairstress.sum(0)
+            self.results['stresses'] = stresses
+        elif 'stress' in properties or 'stresses' in properties:
+            raise ValueError('Stress requires a unit cell with a volume')
@@ -392,6 +392,26 @@ class Database:
         
     def __len__(self):
         return self.count()
+
+    @parallel_function
+    def get_key_values(self, keys):
+        """Get the values of some keys for all rows.
+
+        Returns a dict mapping the id of each row that has any of the keys
+        to a dict of its values for those keys.  Numbers are returned as
+        floats.  Unlike select(), backends can do this without reading
+        the atoms of the rows.
+        """
+        key_values = {}
+        for row in self.select():
+            dct = dict((key, row.key_value_pairs[key]) for key in keys
+                       if key in row.key_value_pairs)
+            for key, value in dct.items():
+                if not isinstance(value, basestring):
+                    dct[key] = float(value)
+            if dct:
+                key_values[row.id] = dct
+        return key_values
         
     @parallel_function
     @lock
@@ -530,6 +530,22 @@ class SQLite3Database(Database):
         cur.execute(sql, args)
         return cur.fetchone()[0]
         
+    @parallel_function
+    @lock
+    def get_key_values(self, keys):
+        con = self._connect()
+        self._initialize(con)
+        cur = con.cursor()
+        q = ', '.join('?' * len(keys))
+        key_values = {}
+        for table in ['number_key_values', 'text_key_values']:
+            cur.execute('SELECT id, key, value FROM {0} WHERE key IN ({1})'
+                        .format(table, q), list(keys))
+            for id, key, value in cur.fetchall():
+                key_values.setdefault(id, {})[key] = value
+        con.close()
+        return key_values
+
     def analyse(self):
         con = self._connect()
         self._initialize(con)
@@ -1,8 +1,11 @@
 """
     Objects which handle all communication with the SQLite database.
 """
+import collections
 import os
 from ase import Atoms
+from ase.parallel import DummyMPI
+from ase.utils import Lock
 from ase.ga.atoms_attach import enable_raw_score_methods
 from ase.ga.atoms_attach import enable_parametrization_methods
 import ase.db
@@ -21,22 +24,119 @@ class DataConnection(object):
         All data communication is collected in this class in order to
         make a decoupling of the data representation and the GA method.
 
+        The key-value pairs telling the state of the candidates
+        (unrelaxed, queued or relaxed) are read once, without the
+        atoms, and then kept up to date as this object writes to the
+        database.  They are read again if the modification time of the
+        file shows that someone else has written to it.
+
         Parameters:
 
         db_file_name: Path to the ase.db data file.
     """
+    state_keys = ['gaid', 'relaxed', 'queued', 'generation', 'extinct',
+                  'raw_score', 'pairing', 'description']
+    integer_keys = ['gaid', 'relaxed', 'queued', 'generation', 'extinct',
+                    'pairing']
+
     def __init__(self, db_file_name):
         self.db_file_name = db_file_name
         if not os.path.isfile(self.db_file_name):
             raise IOError('DB file {0} not found'.format(self.db_file_name))
-        self.c = ase.db.connect(self.db_file_name)
+        # Other processes may change the database too.  This object
+        # holds the lock file that ase.db uses for writing while it
+        # changes the database and its state view:
+        self.c = ase.db.connect(self.db_file_name, use_lock_file=False)
+        self.lock = Lock(self.db_file_name + '.lock', world=DummyMPI())
         self.already_returned = set()
+        self._params = None
+
+        # The state view, see _read_rows():
+        self._stat = None
+        self._rows = {}
+        self._candidates = {}
+        self._unrelaxed = set()
+        self._queued = set()
+        self._relaxed_in_generation = collections.Counter()
 
         # slab = self.get_slab()
         # atom_numbers = list(slab.numbers)
         # atom_numbers.extend(list(self.get_atom_numbers_to_optimize()))
         # self.atom_numbers = np.array(atom_numbers)
 
+    def _get_stat(self):
+        st = os.stat(self.db_file_name)
+        return st.st_mtime, st.st_size
+
+    def _sync(self):
+        """ Read the state of the candidates again if the database
+            file has been changed since we last saw it. """
+        stat = self._get_stat()
+        if stat != self._stat:
+            self._read_rows()
+            self._stat = stat
+
+    def _written(self, before):
+        """ Mark the changes just made by this object as seen.
+
+            before is the stat of the file taken just before the
+            changes.  If it is not the one last seen, another process
+            (one not using the lock file) has changed the file as well,
+            and the state is read again by the next _sync(). """
+        if before == self._stat:
+            self._stat = self._get_stat()
+        else:
+            self._stat = None
+
+    def _read_rows(self):
+        """ Build the state view from the key-value pairs of all rows.
+
+            _rows maps the id of each row to its state_keys,
+            _candidates maps each gaid to the ids of its rows,
+            _unrelaxed and _queued are the gaids of candidates
+            in those states and _relaxed_in_generation counts
+            the relaxed rows of each generation. """
+        self._rows = {}
+        self._candidates = {}
+        self._unrelaxed = set()
+        self._queued = set()
+        self._relaxed_in_generation = collections.Counter()
+        for id, kvp in self.c.get_key_values(self.state_keys).items():
+            self._add_row(id, kvp)
+
+    def _add_row(self, id, key_value_pairs):
+        kvp = dict((key, key_value_pairs[key]) for key in self.state_keys
+                   if key in key_value_pairs)
+        for key in self.integer_keys:
+            if key in kvp:
+                kvp[key] = int(kvp[key])
+        self._rows[id] = kvp
+        if kvp.get('relaxed') == 1:
+            self._relaxed_in_generation[kvp.get('generation')] += 1
+        if 'gaid' in kvp:
+            self._candidates.setdefault(kvp['gaid'], set()).add(id)
+            self._update_state(kvp['gaid'])
+
+    def _remove_row(self, id):
+        kvp = self._rows.pop(id)
+        if kvp.get('relaxed') == 1:
+            self._relaxed_in_generation[kvp.get('generation')] -= 1
+        if 'gaid' in kvp:
+            self._candidates[kvp['gaid']].discard(id)
+            self._update_state(kvp['gaid'])
+        return kvp
+
+    def _update_state(self, gaid):
+        rows = [self._rows[id] for id in self._candidates[gaid]]
+        relaxed = [kvp.get('relaxed') for kvp in rows]
+        self._unrelaxed.discard(gaid)
+        self._queued.discard(gaid)
+        if 1 not in relaxed:
+            if any(kvp.get('queued') == 1 for kvp in rows):
+                self._queued.add(gaid)
+            elif 0 in relaxed:
+                self._unrelaxed.add(gaid)
+
     def get_number_of_unrelaxed_candidates(self):
         """ Returns the number of candidates not yet queued or relaxed. """
         return len(self.__get_ids_of_all_unrelaxed_candidates__())
@@ -57,16 +157,8 @@ class DataConnection(object):
 
     def __get_ids_of_all_unrelaxed_candidates__(self):
         """ Helper method used by the two above methods. """
-
-        all_unrelaxed_ids = set([t.gaid for t in self.c.select(relaxed=0)])
-        all_relaxed_ids = set([t.gaid for t in self.c.select(relaxed=1)])
-        all_queued_ids = set([t.gaid for t in self.c.select(queued=1)])
-
-        actually_unrelaxed = [gaid for gaid in all_unrelaxed_ids
-                              if (gaid not in all_relaxed_ids and
-                                  gaid not in all_queued_ids)]
-
-        return actually_unrelaxed
+        self._sync()
+        return sorted(self._unrelaxed)
 
     def __get_latest_traj_for_confid__(self, confid):
         """ Method for obtaining the latest traj
@@ -82,8 +174,14 @@ class DataConnection(object):
     def mark_as_queued(self, a):
         """ Marks a configuration as queued for relaxation. """
         gaid = a.info['confid']
-        self.c.write(None, gaid=gaid, queued=1,
-                     key_value_pairs=a.info['key_value_pairs'])
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            id = self.c.write(None, gaid=gaid, queued=1,
+                              key_value_pairs=a.info['key_value_pairs'])
+            self._add_row(id, dict(a.info['key_value_pairs'],
+                                   gaid=gaid, queued=1))
+            self._written(before)
 
 #         if not np.array_equal(a.numbers, self.atom_numbers):
 #             raise ValueError('Wrong stoichiometry')
@@ -112,9 +210,15 @@ class DataConnection(object):
         if perform_parametrization is not None:
             a.set_parametrization(perform_parametrization(a))
 
-        relax_id = self.c.write(a, gaid=gaid, relaxed=1,
-                                key_value_pairs=a.info['key_value_pairs'],
-                                data=a.info['data'])
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            relax_id = self.c.write(a, gaid=gaid, relaxed=1,
+                                    key_value_pairs=a.info['key_value_pairs'],
+                                    data=a.info['data'])
+            self._add_row(relax_id, dict(a.info['key_value_pairs'],
+                                         gaid=gaid, relaxed=1))
+            self._written(before)
         a.info['relax_id'] = relax_id
 
 #         if not np.array_equal(a.numbers, self.atom_numbers):
@@ -136,11 +240,19 @@ class DataConnection(object):
         # if not np.array_equal(candidate.numbers, self.atom_numbers):
         #     raise ValueError('Wrong stoichiometry')
 
-        gaid = self.c.write(candidate,
-                            key_value_pairs=candidate.info['key_value_pairs'],
-                            data=candidate.info['data'],
-                            **kwargs)
-        self.c.update(gaid, gaid=gaid)
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            gaid = self.c.write(
+                candidate,
+                key_value_pairs=candidate.info['key_value_pairs'],
+                data=candidate.info['data'],
+                **kwargs)
+            self.c.update(gaid, gaid=gaid)
+            kvp = dict(candidate.info['key_value_pairs'], **kwargs)
+            kvp['gaid'] = gaid
+            self._add_row(gaid, kvp)
+            self._written(before)
         candidate.info['confid'] = gaid
 
     def add_unrelaxed_step(self, candidate, description):
@@ -158,10 +270,17 @@ class DataConnection(object):
                   t: 1,
                   'description': desc,
                   'gaid': gaid}
-        self.c.write(candidate,
-                     key_value_pairs=candidate.info['key_value_pairs'],
-                     data=candidate.info['data'],
-                     **kwargs)
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            id = self.c.write(
+                candidate,
+                key_value_pairs=candidate.info['key_value_pairs'],
+                data=candidate.info['data'],
+                **kwargs)
+            self._add_row(id, dict(candidate.info['key_value_pairs'],
+                                   **kwargs))
+            self._written(before)
 
     def get_number_of_atoms_to_optimize(self):
         """ Get the number of atoms being optimized. """
@@ -185,12 +304,14 @@ class DataConnection(object):
             for the extended fitness calculation described in
             L.B. Vilhelmsen et al., JACS, 2012, 134 (30), pp 12807-12816
         """
-        entries = self.c.select(pairing=1)
-
+        self._sync()
         frequency = dict()
         pairs = []
-        for e in entries:
-            txt = e.description
+        for id in sorted(self._rows):
+            kvp = self._rows[id]
+            if kvp.get('pairing') != 1:
+                continue
+            txt = kvp['description']
             tsplit = txt.split(' ')
             c1 = int(tsplit[1])
             c2 = int(tsplit[2])
@@ -203,6 +324,13 @@ class DataConnection(object):
             frequency[c2] += 1
         return (frequency, pairs)
 
+    def _get_relaxed_ids(self, use_extinct=True):
+        """ Ids of the relaxed rows sorted by id. """
+        self._sync()
+        return [id for id in sorted(self._rows)
+                if self._rows[id].get('relaxed') == 1 and
+                (not use_extinct or self._rows[id].get('extinct') == 0)]
+
     def get_all_relaxed_candidates(self, only_new=False, use_extinct=False):
         """ Returns all candidates that have been relaxed.
 
@@ -216,21 +344,20 @@ class DataConnection(object):
             Set to True if the extinct key (and mass extinction) is going
             to be used. Default: False."""
 
-        if use_extinct:
-            entries = self.c.select('relaxed=1,extinct=0',
-                                    sort='-raw_score')
-        else:
-            entries = self.c.select('relaxed=1', sort='-raw_score')
+        ids = [id for id in self._get_relaxed_ids(use_extinct)
+               if 'raw_score' in self._rows[id]]
+        ids.sort(key=lambda id: self._rows[id]['raw_score'], reverse=True)
 
         trajs = []
-        for v in entries:
-            if only_new and v.gaid in self.already_returned:
+        for id in ids:
+            gaid = self._rows[id].get('gaid')
+            if only_new and gaid in self.already_returned:
                 continue
-            t = self.get_atoms(id=v.id)
-            t.info['confid'] = v.gaid
-            t.info['relax_id'] = v.id
+            t = self.get_atoms(id=id)
+            t.info['confid'] = gaid
+            t.info['relax_id'] = id
             trajs.append(t)
-            self.already_returned.add(v.gaid)
+            self.already_returned.add(gaid)
         # trajs.sort(key=lambda x: x.get_raw_score(), reverse=True)
         return trajs
 
@@ -238,14 +365,14 @@ class DataConnection(object):
         """ Returns all candidates that have been relaxed up to
             and including the specified generation
         """
-        q = 'relaxed=1,extinct=0,generation<={0}'
-        entries = self.c.select(q.format(gen))
-
         trajs = []
-        for v in entries:
-            t = self.get_atoms(id=v.id)
-            t.info['confid'] = v.gaid
-            t.info['relax_id'] = v.id
+        for id in self._get_relaxed_ids():
+            kvp = self._rows[id]
+            if kvp.get('generation', gen + 1) > gen:
+                continue
+            t = self.get_atoms(id=id)
+            t.info['confid'] = kvp.get('gaid')
+            t.info['relax_id'] = id
             trajs.append(t)
         trajs.sort(key=lambda x: x.get_raw_score(), reverse=True)
         return trajs
@@ -253,19 +380,20 @@ class DataConnection(object):
     def get_all_candidates_in_queue(self):
         """ Returns all structures that are queued, but have not yet
             been relaxed. """
-        all_queued_ids = [t.gaid for t in self.c.select(queued=1)]
-        all_relaxed_ids = [t.gaid for t in self.c.select(relaxed=1)]
-
-        in_queue = [qid for qid in all_queued_ids
-                    if qid not in all_relaxed_ids]
-        return in_queue
+        self._sync()
+        return sorted(self._queued)
 
     def remove_from_queue(self, confid):
         """ Removes the candidate confid from the queue. """
-
-        queued_ids = self.c.select(queued=1, gaid=confid)
-        ids = [q.id for q in queued_ids]
-        self.c.delete(ids)
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            ids = [id for id in self._candidates.get(confid, ())
+                   if self._rows[id].get('queued') == 1]
+            self.c.delete(ids)
+            for id in ids:
+                self._remove_row(id)
+            self._written(before)
 
     def get_generation_number(self, size=None):
         """ Returns the current generation number, by looking
@@ -281,11 +409,11 @@ class DataConnection(object):
         if size is None:
             # size = len(list(self.c.select(relaxed=0,generation=0)))
             return 0
+        self._sync()
         lg = size
         g = 0
-        all_candidates = list(self.c.select(relaxed=1))
         while lg > 0:
-            lg = len([c for c in all_candidates if c.generation == g])
+            lg = self._relaxed_in_generation[g]
             if lg >= size:
                 g += 1
             else:
@@ -299,7 +427,9 @@ class DataConnection(object):
 
     def get_param(self, parameter):
         """ Get a parameter saved when creating the database. """
-        return self.c.get(1).data.get(parameter)
+        if self._params is None:
+            self._params = self.c.get(1).data
+        return self._params.get(parameter)
 
     def remove_old_queued(self):
         pass
@@ -308,14 +438,21 @@ class DataConnection(object):
 
     def is_duplicate(self, **kwargs):
         """Check if the key-value pair is already present in the database"""
-        return len(list(self.c.select(**kwargs))) > 0
+        return self.c.count(**kwargs) > 0
 
     def kill_candidate(self, confid):
         """Sets extinct=1 in the key_value_pairs of the candidate
         with gaid=confid. This could be used in the
         mass extinction operator."""
-        for dct in self.c.select(gaid=confid):
-            self.c.update(dct.id, extinct=1)
+        with self.lock:
+            self._sync()
+            before = self._get_stat()
+            for id in sorted(self._candidates.get(confid, ())):
+                self.c.update(id, extinct=1)
+                kvp = self._remove_row(id)
+                kvp['extinct'] = 1
+                self._add_row(id, kvp)
+            self._written(before)
 
 
 class PrepareDB(object):
@@ -3,6 +3,7 @@ proposing structures to pair. """
 from random import randrange, random
 from math import tanh, sqrt, exp
 from operator import itemgetter
+from bisect import bisect_left, bisect_right
 import numpy as np
 
 from ase.db.core import now
@@ -19,6 +20,46 @@ def count_looks_like(a, all_cand, comp):
     return n
 
 
+class CandidateIndex(object):
+    """Candidates sorted by potential energy.
+
+    Comparators with a dE attribute (like the
+    InteratomicDistanceComparator and the EnergyComparator) only find
+    structures similar if their energies differ by less than dE.  For
+    these, the index returns only the candidates within this energy
+    window, so that a new candidate is not compared with the whole
+    history.  For other comparators all candidates are returned."""
+    def __init__(self, comparator, candidates=[]):
+        self.dE = getattr(comparator, 'dE', None)
+        self.energies = []
+        self.candidates = []
+        for a in candidates:
+            self.add(a)
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def add(self, a):
+        if self.dE is None:
+            self.candidates.append(a)
+            return
+        e = a.get_potential_energy()
+        i = bisect_right(self.energies, e)
+        self.energies.insert(i, e)
+        self.candidates.insert(i, a)
+
+    def near(self, a):
+        """Return the candidates that may look like a."""
+        if self.dE is None:
+            return self.candidates
+        e = a.get_potential_energy()
+        # A slightly larger window to be safe against rounding:
+        dE = self.dE * (1 + 1e-6)
+        i1 = bisect_left(self.energies, e - dE)
+        i2 = bisect_right(self.energies, e + dE)
+        return self.candidates[i1:i2]
+
+
 class Population(object):
     """Population class which maintains the current population
     and proposes which candidates to pair together.
@@ -61,6 +102,7 @@ class Population(object):
         self.pop = []
         self.pairs = None
         self.all_cand = None
+        self.index = None
         self.__initialize_pop__()
 
     def __initialize_pop__(self):
@@ -87,8 +129,9 @@ class Population(object):
             if not eq:
                 self.pop.append(c)
 
+        self.index = CandidateIndex(self.comparator, all_cand)
         for a in self.pop:
-            a.info['looks_like'] = count_looks_like(a, all_cand,
+            a.info['looks_like'] = count_looks_like(a, self.index.near(a),
                                                     self.comparator)
 
         self.all_cand = all_cand
@@ -122,6 +165,7 @@ class Population(object):
         for a in new_cand:
             self.__add_candidate__(a)
             self.all_cand.append(a)
+            self.index.add(a)
         self.__calc_participation__()
         self._write_log()
 
@@ -170,9 +214,8 @@ class Population(object):
             if self.comparator.looks_like(a, b):
                 if b.get_raw_score() < a.get_raw_score():
                     del self.pop[i]
-                    a.info['looks_like'] = count_looks_like(a,
-                                                            self.all_cand,
-                                                            self.comparator)
+                    a.info['looks_like'] = count_looks_like(
+                        a, self.index.near(a), self.comparator)
                     self.pop.append(a)
                     self.pop.sort(key=lambda x: x.get_raw_score(),
                                   reverse=True)
@@ -185,7 +228,7 @@ class Population(object):
 
         # add the new candidate
         a.info['looks_like'] = count_looks_like(a,
-                                                self.all_cand,
+                                                self.index.near(a),
                                                 self.comparator)
         self.pop.append(a)
         self.pop.sort(key=lambda x: x.get_raw_score(), reverse=True)
@@ -385,8 +428,9 @@ class RandomPopulation(Population):
             for i in range(self.bad_candidates):
                 self.pop.append(ratings[i][0])
 
+        self.index = CandidateIndex(self.comparator, all_cand)
         for a in self.pop:
-            a.info['looks_like'] = count_looks_like(a, all_cand,
+            a.info['looks_like'] = count_looks_like(a, self.index.near(a),
                                                     self.comparator)
 
         self.all_cand = all_cand
@@ -8,13 +8,33 @@ def get_sorted_dist_list(atoms, mic=False):
     unique_types = set(numbers)
     pair_cor = dict()
     for n in unique_types:
-        i_un = [i for i in range(len(atoms)) if atoms[i].number == n]
-        d = []
-        for i, n1 in enumerate(i_un):
-            for n2 in i_un[i + 1:]:
-                d.append(atoms.get_distance(n1, n2, mic))
+        i_un = np.nonzero(numbers == n)[0]
+        d = atoms[i_un].get_all_distances(mic)
+        d = d[np.triu_indices(len(i_un), 1)]
         d.sort()
-        pair_cor[n] = np.array(d)
+        pair_cor[n] = d
+    return pair_cor
+
+
+def get_cached_dist_list(atoms, n_top=0, mic=False):
+    """ Return the sorted distance list of the last n_top atoms
+        (all atoms if n_top is 0).
+
+        The list is cached on the atoms object and only calculated
+        again if the atoms have moved.  The cache is not part of
+        atoms.info, so it is neither shared with copies of the atoms
+        nor written to files. """
+    fingerprints = atoms.__dict__.setdefault('_fingerprints', {})
+    key = (n_top, bool(mic))
+    if key in fingerprints:
+        positions, numbers, cell, pair_cor = fingerprints[key]
+        if (np.array_equal(positions, atoms.positions) and
+            np.array_equal(numbers, atoms.numbers) and
+            np.array_equal(cell, atoms.cell)):
+            return pair_cor
+    pair_cor = get_sorted_dist_list(atoms[-n_top:], mic=mic)
+    fingerprints[key] = (atoms.get_positions(), atoms.get_atomic_numbers(),
+                         atoms.get_cell(), pair_cor)
     return pair_cor
 
 
@@ -53,18 +73,16 @@ class InteratomicDistanceComparator(object):
             return False
 
         # then we check the structure
-        a1top = a1[-self.n_top:]
-        a2top = a2[-self.n_top:]
-        cum_diff, max_diff = self.__compare_structure__(a1top, a2top)
+        cum_diff, max_diff = self.__compare_structure__(a1, a2)
 
         if cum_diff < self.pair_cor_cum_diff and max_diff < self.pair_cor_max:
             return True
 
     def __compare_structure__(self, a1, a2):
         """ Private method for calculating the structural difference. """
-        p1 = get_sorted_dist_list(a1, mic=self.mic)
-        p2 = get_sorted_dist_list(a2, mic=self.mic)
-        numbers = a1.numbers
+        p1 = get_cached_dist_list(a1, self.n_top, mic=self.mic)
+        p2 = get_cached_dist_list(a2, self.n_top, mic=self.mic)
+        numbers = a1.numbers[-self.n_top:]
         total_cum_diff = 0.
         max_diff = 0
         for n in p1.keys():
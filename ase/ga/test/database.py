@@ -0,0 +1,87 @@
+"""Time the queries made by DataConnection in every step of a GA run.
+
+Creates synthetic GA databases with an increasing number of candidates
+(give the numbers on the command line to change them) and compares
+queries selecting the full rows, as DataConnection did before, with
+the state view of DataConnection: the first query reading the view,
+later queries using it, and queries after another connection wrote
+to the database."""
+from __future__ import print_function
+import os
+import sys
+import time
+
+import numpy as np
+
+from ase import Atoms
+from ase.ga.data import DataConnection, PrepareDB
+
+
+def create_database(db_file, n, natoms=20, population_size=20):
+    """Candidates with an unrelaxed row, and for most also queued and
+    relaxed rows."""
+    rng = np.random.RandomState(42)
+    PrepareDB(db_file, population_size=population_size,
+              stoichiometry=[29] * natoms)
+    c = DataConnection(db_file).c
+    with c:
+        for gaid in range(2, n + 2):
+            atoms = Atoms('Cu%d' % natoms, rng.rand(natoms, 3) * 10,
+                          cell=(10, 10, 10))
+            generation = gaid // population_size
+            c.write(atoms, gaid=gaid, relaxed=0, extinct=0, mutation=1,
+                    generation=generation, description='synthetic')
+            if rng.rand() < 0.9:
+                c.write(None, gaid=gaid, queued=1, relaxed=0)
+                c.write(atoms, gaid=gaid, relaxed=1, extinct=0,
+                        generation=generation, raw_score=-rng.rand())
+
+
+def full_row_queries(c):
+    """The queries used before, loading all rows."""
+    unrelaxed = set([t.gaid for t in c.select(relaxed=0)])
+    relaxed = [t for t in c.select(relaxed=1)]
+    relaxed_ids = set([t.gaid for t in relaxed])
+    queued = [t.gaid for t in c.select(queued=1)]
+    unrelaxed = [gaid for gaid in unrelaxed
+                 if gaid not in relaxed_ids and gaid not in queued]
+    in_queue = [gaid for gaid in queued if gaid not in relaxed_ids]
+    size = c.get(1).data.population_size
+    g = 0
+    while len([t for t in relaxed if t.generation == g]) >= size:
+        g += 1
+    return sorted(unrelaxed), sorted(set(in_queue)), g
+
+
+def state_view_queries(dc):
+    return (dc.__get_ids_of_all_unrelaxed_candidates__(),
+            dc.get_all_candidates_in_queue(),
+            dc.get_generation_number())
+
+
+def timed(f, *args):
+    t0 = time.time()
+    result = f(*args)
+    return time.time() - t0, result
+
+
+sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000]
+print('%8s %8s %8s %8s %8s  (seconds)' %
+      ('cands', 'rows', 'first', 'cached', 'changed'))
+for n in sizes:
+    db_file = 'ga_benchmark_{0}.db'.format(n)
+    if os.path.isfile(db_file):
+        os.remove(db_file)
+    create_database(db_file, n)
+    dc = DataConnection(db_file)
+    t_rows, ref = timed(full_row_queries, dc.c)
+    t_first, result = timed(state_view_queries, dc)
+    assert result == ref
+    t_cached = timed(state_view_queries, dc)[0]
+    # Another process (here another connection) changes the file:
+    other = DataConnection(db_file)
+    other.kill_candidate(2)
+    t_changed = timed(state_view_queries, dc)[0]
+    print('%8d %8.3f %8.3f %8.5f %8.3f' %
+          (n, t_rows, t_first, t_cached, t_changed))
+    os.remove(db_file)
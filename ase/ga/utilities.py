@@ -126,55 +126,46 @@ def get_all_atom_types(slab, atom_numbers_to_optimize):
 
 
 def get_distance_matrix(atoms, self_distance=1000):
-    """ NB: This function is way slower than atoms.get_all_distances()
-        Returns a numpy matrix with the distances between the atoms
+    """ Returns a numpy matrix with the distances between the atoms
         in the supplied atoms object, with the indices of the matrix
         corresponding to the indices in the atoms object.
         The parameter self_distance will be put in the diagonal
         elements ([i][i])
     """
-    dm = np.zeros([len(atoms), len(atoms)])
-    for i in range(len(atoms)):
-        dm[i][i] = self_distance
-        for j in range(i + 1, len(atoms)):
-            rij = atoms.get_distance(i, j)
-            dm[i][j] = rij
-            dm[j][i] = rij
+    dm = atoms.get_all_distances()
+    dm[np.diag_indices_from(dm)] = self_distance
     return dm
 
 
 def get_rdf(atoms, rmax, nbins, distance_matrix=None):
     """
     Returns two numpy arrays; the radial distribution function
-    and the corresponding distances of the supplied atoms object
+    and the corresponding distances of the supplied atoms object.
+    Without a distance_matrix only the pairs closer than rmax
+    are calculated.
     """
-    dm = distance_matrix
-    if dm is None:
-        # dm = get_distance_matrix(atoms)
-        dm = atoms.get_all_distances()
-    rdf = np.zeros(nbins + 1)
     dr = float(rmax / nbins)
-    for i in range(len(atoms)):
-        for j in range(i + 1, len(atoms)):
-            rij = dm[i][j]
-            index = int(math.ceil(rij / dr))
-            if index <= nbins:
-                rdf[index] += 1
+    if distance_matrix is None:
+        # A little more than rmax, the bins below decide what is counted
+        i, j, rij = atoms.get_distances_within((nbins + 1) * dr)
+    else:
+        rij = distance_matrix[np.triu_indices(len(atoms), 1)]
+    index = np.ceil(rij / dr).astype(int)
+    rdf = np.bincount(index[index <= nbins],
+                      minlength=nbins + 1).astype(float)
 
     # Normalize
     phi = len(atoms) / atoms.get_volume()
     norm = 2.0 * math.pi * dr * phi * len(atoms)
 
-    dists = [0]
-    for i in range(1, nbins + 1):
-        rrr = (i - 0.5) * dr
-        dists.append(rrr)
-        rdf[i] /= (norm * ((rrr**2) + (dr**2) / 12.))
+    dists = np.zeros(nbins + 1)
+    dists[1:] = (np.arange(1, nbins + 1) - 0.5) * dr
+    rdf[1:] /= (norm * ((dists[1:]**2) + (dr**2) / 12.))
 
-    return rdf, np.array(dists)
+    return rdf, dists
 
 
-def get_nndist(atoms, distance_matrix):
+def get_nndist(atoms, distance_matrix=None):
     """
     Returns an estimate of the nearest neighbor bond distance
     in the supplied atoms object given the supplied distance_matrix.
@@ -184,8 +175,9 @@ def get_nndist(atoms, distance_matrix):
     rmax = 10.  # No bonds longer than 10 angstrom expected
     nbins = 200
     rdf, dists = get_rdf(atoms, rmax, nbins, distance_matrix)
+    gradient = np.gradient(rdf)
     i = 0
-    while np.gradient(rdf)[i] >= 0:
+    while gradient[i] >= 0:
         i += 1
     return dists[i]
 
@@ -201,7 +193,7 @@ def get_nnmat(atoms):
     get_nnmat returns a single list [Cu-Cu bonds/N(Cu),
     Cu-Ni bonds/N(Cu), Ni-Cu bonds/N(Ni), Ni-Ni bonds/N(Ni)]
     where N(element) is the number of atoms of the type element
-    in the atoms object.
+    in the atoms object. Every atom is counted as its own neighbor.
 
     The distance matrix can be quite costly to calculate every
     time nnmat is required (and disk intensive if saved), thus
@@ -210,26 +202,21 @@ def get_nnmat(atoms):
     """
     if 'nnmat' in atoms.info['data']:
         return atoms.info['data']['nnmat']
-    elements = sorted(set(atoms.get_chemical_symbols()))
-    nnmat = np.zeros((len(elements), len(elements)))
-    # dm = get_distance_matrix(atoms)
-    dm = atoms.get_all_distances()
-    nndist = get_nndist(atoms, dm) + 0.2
-    for i in range(len(atoms)):
-        row = [j for j in range(len(elements))
-               if atoms[i].symbol == elements[j]][0]
-        neighbors = [j for j in range(len(dm[i])) if dm[i][j] < nndist]
-        for n in neighbors:
-            column = [j for j in range(len(elements))
-                      if atoms[n].symbol == elements[j]][0]
-            nnmat[row][column] += 1
+    # Index of the element of each atom in the sorted list of elements
+    elements, species = np.unique(atoms.get_chemical_symbols(),
+                                  return_inverse=True)
+    nel = len(elements)
+    nndist = get_nndist(atoms) + 0.2
+    i, j, rij = atoms.get_distances_within(nndist)
+    # Each pair is a neighbor of both atoms, each atom of itself
+    pairs = np.concatenate([species[i] * nel + species[j],
+                            species[j] * nel + species[i],
+                            species * (nel + 1)])
+    nnmat = np.bincount(pairs, minlength=nel**2).reshape((nel, nel))
     # divide by the number of that type of atoms in the structure
-    for i, el in enumerate(elements):
-        nnmat[i] /= len([j for j in range(len(atoms))
-                         if atoms[int(j)].symbol == el])
+    nnmat = nnmat / np.bincount(species, minlength=nel)[:, np.newaxis]
     # makes a single list out of a list of lists
-    nnlist = np.reshape(nnmat, (len(nnmat)**2))
-    return nnlist
+    return nnmat.ravel()
 
 
 def get_atoms_connections(atoms, max_conn=5):
@@ -262,6 +262,21 @@ class Writer:
         dct = self.data[name + '.'] = {}
         return Writer(self.fd, data=dct)
         
+    def truncate(self, nitems):
+        """Drop all but the first nitems items.
+
+        The data of the dropped items stays in the file, but it is no
+        longer reachable, and new items are written after it."""
+        if nitems > self.nitems:
+            raise ValueError('Can not truncate {0} items to {1}'
+                             .format(self.nitems, nitems))
+        if nitems == self.nitems:
+            return
+        self.nitems = nitems
+        writeint(self.fd, self.nitems, 32)
+        self.fd.flush()
+        self.fd.seek(0, 2)  # end of file
+
     def close(self):
         n = int('_little_endian' in self.data)
         if len(self.data) > n:
@@ -287,6 +302,9 @@ class DummyWriter:
     def sync(self):
         pass
         
+    def truncate(self, nitems):
+        pass
+
     def write(self, *args, **kwargs):
         pass
         
@@ -216,6 +216,17 @@ class TrajectoryWriter:
         """Close the trajectory file."""
         self.backend.close()
 
+    def get_state(self):
+        """Return the number of images written so far.
+
+        Used by checkpoints of the dynamics (see
+        ase.optimize.optimize.Dynamics.write_checkpoint)."""
+        return {'images': len(self.backend)}
+
+    def set_state(self, state):
+        """Drop the images written after get_state() was called."""
+        self.backend.truncate(state['images'])
+
     def __len__(self):
         return world.sum(len(self.backend))
 
@@ -7,8 +7,11 @@ from __future__ import print_function
 This module only depends on NumPy and the space group database.
 """
 
+import hashlib
+import itertools
 import os
 import warnings
+import zipfile
 
 import numpy as np
 
@@ -125,11 +128,7 @@ class Spacegroup(object):
             return
         if not datafile:
             datafile = get_datafile()
-        f = open(datafile, 'r')
-        try:
-            _read_datafile(self, spacegroup, setting, f)
-        finally:
-            f.close()
+        _read_datafile(self, spacegroup, setting, datafile)
 
     def __repr__(self):
         return 'Spacegroup(%d, setting=%d)' % (self.no, self.setting)
@@ -282,13 +281,8 @@ class Spacegroup(object):
                [ 0,  0, -2]])
         """
         hkl = np.array(hkl, dtype=int, ndmin=2)
-        normalised = np.empty(hkl.shape, int)
-        R = self.get_rotations().transpose(0, 2, 1)
-        for i, g in enumerate(hkl):
-            gsym = np.dot(R, g)
-            j = np.lexsort(gsym.T)[0]
-            normalised[i,:] = gsym[j]
-        return normalised
+        gsym = np.einsum('sji,nj->nsi', self.get_rotations(), hkl)
+        return gsym[np.arange(len(hkl)), _lexargmin(gsym)]
 
     def unique_reflections(self, hkl):
         """Returns a subset *hkl* containing only the symmetry-unique
@@ -364,42 +358,55 @@ class Spacegroup(object):
         >>> kinds
         [0, 0, 0, 0, 1, 1, 1, 1]
         """
-        kinds = []
-        sites = []
         scaled = np.array(scaled_positions, ndmin=2)
-        for kind, pos in enumerate(scaled):
-            for rot, trans in self.get_symop():
-                site = np.mod(np.dot(rot, pos) + trans, 1.)
-                if not sites:
-                    sites.append(site)
-                    kinds.append(kind)
-                    continue
-                t = site - sites
-                mask = np.all((abs(t) < symprec) |
-                              (abs(abs(t) - 1.0) < symprec), axis=1)
-                if np.any(mask):
-                    ind = np.argwhere(mask)[0][0]
-                    if kinds[ind] == kind:
-                        pass
-                    elif ondublicates == 'keep':
-                        pass
-                    elif ondublicates == 'replace':
-                        kinds[ind] = kind
-                    elif ondublicates == 'warn':
-                        warnings.warn('scaled_positions %d and %d '
-                                      'are equivalent'%(kinds[ind], kind))
-                    elif ondublicates == 'error':
-                        raise SpacegroupValueError(
-                            'scaled_positions %d and %d are equivalent'%(
-                                kinds[ind], kind))
-                    else:
-                        raise SpacegroupValueError(
-                            'Argument "ondublicates" must be one of: '
-                            '"keep", "replace", "warn" or "error".')
-                else:
-                    sites.append(site)
-                    kinds.append(kind)
-        return np.array(sites), kinds
+        symop = self.get_symop()
+        rot = np.array([r for r, t in symop])
+        trans = np.array([t for r, t in symop])
+        # All images, ordered first by kind and then by symmetry operation:
+        candidates = np.mod(np.einsum('sij,kj->ksi', rot, scaled) + trans, 1.)
+        candidates = candidates.reshape((-1, 3))
+        ckinds = np.repeat(np.arange(len(scaled)), len(symop))
+
+        # A candidate becomes a new site if it is not equivalent to an
+        # earlier site.  first[c] is the first site equivalent to
+        # candidate c (or c itself if it becomes a site):
+        i, j = _periodic_pairs(candidates, symprec)
+        first = np.arange(len(candidates))
+        np.minimum.at(first, i, j)
+        isfirst = first == np.arange(len(candidates))
+        # The earliest equivalent candidate is always a site unless the
+        # tolerance makes the equivalence non-transitive:
+        if not isfirst[first[~isfirst]].all():
+            isfirst = np.zeros(len(candidates), bool)
+            for c in range(len(candidates)):
+                isfirst[c] = not isfirst[j[i == c]].any()
+        first = np.arange(len(candidates))
+        m = isfirst[j]
+        np.minimum.at(first, i[m], j[m])
+
+        index = np.cumsum(isfirst) - 1  # site number of candidates
+        kinds = list(ckinds[isfirst])
+        for c in np.nonzero(ckinds != ckinds[first])[0]:
+            ind = index[first[c]]
+            kind = ckinds[c]
+            if kinds[ind] == kind:
+                pass
+            elif ondublicates == 'keep':
+                pass
+            elif ondublicates == 'replace':
+                kinds[ind] = kind
+            elif ondublicates == 'warn':
+                warnings.warn('scaled_positions %d and %d '
+                              'are equivalent'%(kinds[ind], kind))
+            elif ondublicates == 'error':
+                raise SpacegroupValueError(
+                    'scaled_positions %d and %d are equivalent'%(
+                        kinds[ind], kind))
+            else:
+                raise SpacegroupValueError(
+                    'Argument "ondublicates" must be one of: '
+                    '"keep", "replace", "warn" or "error".')
+        return candidates[isfirst], kinds
 
     def symmetry_normalised_sites(self, scaled_positions,
                                   map_to_unitcell=True):
@@ -420,17 +427,13 @@ class Spacegroup(object):
                [ 0.,  0.,  0.]])
         """
         scaled = np.array(scaled_positions, ndmin=2)
-        normalised = np.empty(scaled.shape, np.float)
         rot, trans = self.get_op()
-        for i, pos in enumerate(scaled):
-            sympos = np.dot(rot, pos) + trans
-            if map_to_unitcell:
-                # Must be done twice, see the scaled_positions.py test
-                sympos %= 1.0
-                sympos %= 1.0
-            j = np.lexsort(sympos.T)[0]
-            normalised[i,:] = sympos[j]
-        return normalised
+        sympos = np.einsum('sij,nj->nsi', rot, scaled) + trans
+        if map_to_unitcell:
+            # Must be done twice, see the scaled_positions.py test
+            sympos %= 1.0
+            sympos %= 1.0
+        return sympos[np.arange(len(scaled)), _lexargmin(sympos)]
 
     def unique_sites(self, scaled_positions, symprec=1e-3, output_mask=False,
                      map_to_unitcell=True):
@@ -501,6 +504,54 @@ class Spacegroup(object):
         return tags
     
 
+
+def _lexargmin(x):
+    """Index of the lexicographically smallest vector along axis 1 of
+    x, comparing the last component first (like numpy.lexsort).  The
+    first index is returned for ties."""
+    mask = np.ones(x.shape[:2], bool)
+    for c in range(x.shape[2] - 1, -1, -1):
+        xc = np.where(mask, x[:, :, c], np.inf)
+        mask &= xc == xc.min(axis=1)[:, np.newaxis]
+    return mask.argmax(axis=1)
+
+
+def _periodic_pairs(positions, symprec):
+    """Find all pairs of equivalent scaled positions in [0, 1).
+
+    Two positions are equivalent if all components differ by less
+    than symprec, modulo one.  The positions are sorted into a
+    periodic grid of cells no larger than symprec, so that only
+    neighbouring cells need to be compared.  Returns arrays i and j
+    with the pairs, where j < i."""
+    n = max(1, int(np.ceil(1.0 / symprec)))
+    reach = int(np.ceil(symprec * n))
+    cell_pc = np.floor(positions * n).astype(int) % n
+    key_p = np.dot(cell_pc, [n * n, n, 1])
+    order = np.argsort(key_p, kind='mergesort')
+    sorted_keys = key_p[order]
+
+    offsets = np.unique(np.arange(-reach, reach + 1) % n)
+    i_x = []
+    j_x = []
+    for offset in itertools.product(offsets, repeat=3):
+        key = np.dot((cell_pc + offset) % n, [n * n, n, 1])
+        start = np.searchsorted(sorted_keys, key, 'left')
+        count = np.searchsorted(sorted_keys, key, 'right') - start
+        i = np.repeat(np.arange(len(positions)), count)
+        # Index into sorted_keys for each pair:
+        k = (np.arange(count.sum()) +
+             np.repeat(start - np.cumsum(count) + count, count))
+        i_x.append(i)
+        j_x.append(order[k])
+    i = np.concatenate(i_x)
+    j = np.concatenate(j_x)
+    t = abs(positions[i] - positions[j])
+    match = ((j < i) &
+             np.all((t < symprec) | (abs(t - 1.0) < symprec), axis=1))
+    return i[match], j[match]
+
+
 def get_datafile():
     """Return default path to datafile."""
     return os.path.join(os.path.dirname(__file__), 'spacegroup.dat')
@@ -532,38 +583,23 @@ def format_symbol(symbol):
 
 
 #-----------------------------------------------------------------
-# Functions for parsing the database. They are moved outside the
-# Spacegroup class in order to make it easier to later implement
-# caching to avoid reading the database each time a new Spacegroup
-# instance is created.
+# Functions for parsing the database.  The whole database is parsed
+# the first time a space group is needed and kept in memory, so that
+# creating a Spacegroup instance is a dictionary lookup.  A binary
+# copy of the parsed database is stored in _cachedir (~/.ase/cache,
+# if writable) and used by later processes as long as it is newer
+# than the text file.
 #-----------------------------------------------------------------
 
-def _skip_to_blank(f, spacegroup, setting):
-    """Read lines from f until a blank line is encountered."""
-    while True:
-        line = f.readline()
-        if not line:
-            raise SpacegroupNotFoundError(
-                'invalid spacegroup %s, setting %i not found in data base' %
-                ( spacegroup, setting ) )
-        if not line.strip():
-            break
+# Parsed databases and created space groups.  Maps the datafile to a
+# dict mapping (no, setting) to the attributes of the space group and
+# (symbol, setting) to the number.
+_tables = {}
+_cache = {}  # (spacegroup, setting, datafile) -> attributes
 
-
-def _skip_to_nonblank(f, spacegroup, setting):
-    """Read lines from f until a nonblank line not starting with a
-    hash (#) is encountered and returns this and the next line."""
-    while True:
-        line1 = f.readline()
-        if not line1:
-            raise SpacegroupNotFoundError(
-                'invalid spacegroup %s, setting %i not found in data base' %
-                ( spacegroup, setting ) )
-        line1.strip()
-        if line1 and not line1.startswith('#'):
-            line2 = f.readline()
-            break
-    return line1, line2
+# Binary copies of the parsed databases go here (not into the
+# installation, which may be read-only or shared):
+_cachedir = os.path.join(os.path.expanduser('~'), '.ase', 'cache')
 
 
 def _read_datafile_entry(spg, no, symbol, setting, f):
@@ -577,50 +613,175 @@ def _read_datafile_entry(spg, no, symbol, setting, f):
     spg._scaled_primitive_cell = np.array([[float(s)
                                             for s in f.readline().split()]
                                            for i in range(3)],
-                                          dtype=np.float)
+                                          dtype=float)
     # primitive reciprocal vectors
     f.readline()
     spg._reciprocal_cell = np.array([[int(i)
                                       for i in f.readline().split()]
                                      for i in range(3)],
-                                    dtype=np.int)
+                                    dtype=int)
     # subtranslations
     spg._nsubtrans = int(f.readline().split()[0])
     spg._subtrans = np.array([[float(t) for t in f.readline().split()]
                               for i in range(spg._nsubtrans)],
-                             dtype=np.float)
+                             dtype=float)
     # symmetry operations
     nsym = int(f.readline().split()[0])
     symop = np.array([[float(s) for s in f.readline().split()]
                       for i in range(nsym)],
-                     dtype=np.float)
+                     dtype=float)
     spg._nsymop = nsym
-    spg._rotations = np.array(symop[:,:9].reshape((nsym,3,3)), dtype=np.int)
+    spg._rotations = np.array(symop[:,:9].reshape((nsym,3,3)), dtype=int)
     spg._translations = symop[:,9:]
 
 
-def _read_datafile(spg, spacegroup, setting, f):
-    if isinstance(spacegroup, int):
+def _parse_datafile(f):
+    """Parse all entries of the database in f.
+
+    Returns a list of dicts with the attributes of the space groups."""
+    class Entry:
         pass
-    elif isinstance(spacegroup, str):
-        #spacegroup = ' '.join(spacegroup.strip().split())
-        spacegroup = format_symbol(spacegroup)
-    else:
-        raise SpacegroupValueError('`spacegroup` must be of type int or str')
+    entries = []
     while True:
-        line1, line2 = _skip_to_nonblank(f, spacegroup, setting)
-        _no,_symbol = line1.strip().split(None, 1)
-        _symbol = format_symbol(_symbol)
-        _setting = int(line2.strip().split()[1])
-        _no = int(_no)
-        if ((isinstance(spacegroup, int) and _no == spacegroup) or
-            (isinstance(spacegroup, str) and
-             _symbol == spacegroup)) and _setting == setting:
-            _read_datafile_entry(spg, _no, _symbol, _setting, f)
+        line1 = f.readline()
+        if not line1:
             break
+        if not line1.strip() or line1.startswith('#'):
+            continue
+        line2 = f.readline()
+        no, symbol = line1.strip().split(None, 1)
+        entry = Entry()
+        _read_datafile_entry(entry, int(no), format_symbol(symbol),
+                             int(line2.strip().split()[1]), f)
+        entries.append(entry.__dict__)
+    return entries
+
+
+def _get_npzfile(datafile):
+    """Name of the binary copy of datafile in the cache directory."""
+    path = os.path.abspath(datafile)
+    name = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.md5(path.encode()).hexdigest()[:12]
+    return os.path.join(_cachedir, '%s-%s.npz' % (name, digest))
+
+
+def _write_npz(entries, npzfile):
+    """Store the parsed database as concatenated arrays.
+
+    The arrays go to a temporary file in the same directory, which is
+    renamed to npzfile when complete, so that other processes never
+    see a partial file."""
+    dirname = os.path.dirname(npzfile)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    tmpname = '%s.%d.tmp' % (npzfile, os.getpid())
+    try:
+        with open(tmpname, 'wb') as fd:
+            _savez(fd, entries)
+        getattr(os, 'replace', os.rename)(tmpname, npzfile)
+    finally:
+        if os.path.isfile(tmpname):
+            os.remove(tmpname)
+
+
+def _savez(fd, entries):
+    np.savez(fd,
+             no=[e['_no'] for e in entries],
+             symbol=[e['_symbol'] for e in entries],
+             setting=[e['_setting'] for e in entries],
+             centrosymmetric=[e['_centrosymmetric'] for e in entries],
+             primitive=[e['_scaled_primitive_cell'] for e in entries],
+             reciprocal=[e['_reciprocal_cell'] for e in entries],
+             nsubtrans=[e['_nsubtrans'] for e in entries],
+             subtrans=np.concatenate([e['_subtrans'] for e in entries]),
+             nsymop=[e['_nsymop'] for e in entries],
+             rotations=np.concatenate([e['_rotations'] for e in entries]),
+             translations=np.concatenate([e['_translations']
+                                          for e in entries]))
+
+
+def _read_npz(npzfile):
+    """Read the database stored by _write_npz()."""
+    npz = np.load(npzfile)
+    data = dict((name, npz[name]) for name in npz.files)
+    npz.close()
+    entries = []
+    i1 = i2 = 0
+    for n, (nsubtrans, nsymop) in enumerate(zip(data['nsubtrans'],
+                                                 data['nsymop'])):
+        entries.append({
+            '_no': int(data['no'][n]),
+            '_symbol': str(data['symbol'][n]),
+            '_setting': int(data['setting'][n]),
+            '_centrosymmetric': bool(data['centrosymmetric'][n]),
+            '_scaled_primitive_cell': data['primitive'][n],
+            '_reciprocal_cell': data['reciprocal'][n],
+            '_nsubtrans': int(nsubtrans),
+            '_subtrans': data['subtrans'][i1:i1 + nsubtrans],
+            '_nsymop': int(nsymop),
+            '_rotations': data['rotations'][i2:i2 + nsymop],
+            '_translations': data['translations'][i2:i2 + nsymop]})
+        i1 += nsubtrans
+        i2 += nsymop
+    return entries
+
+
+def _get_table(datafile):
+    """Return the parsed database in datafile."""
+    if datafile in _tables:
+        return _tables[datafile]
+
+    npzfile = _get_npzfile(datafile)
+    entries = None
+    if (os.path.isfile(npzfile) and
+        os.path.getmtime(npzfile) >= os.path.getmtime(datafile)):
+        try:
+            entries = _read_npz(npzfile)
+        except (zipfile.BadZipfile, ValueError, EOFError, KeyError,
+                IOError, OSError):
+            pass  # broken copy: parse the text file and replace it
+    if entries is None:
+        f = open(datafile, 'r')
+        try:
+            entries = _parse_datafile(f)
+        finally:
+            f.close()
+        try:
+            _write_npz(entries, npzfile)
+        except (IOError, OSError):
+            pass  # no writable cache directory
+
+    table = {}
+    for entry in entries:
+        for value in entry.values():
+            if isinstance(value, np.ndarray):
+                # Shared by all instances of the space group:
+                value.flags.writeable = False
+        table[(entry['_no'], entry['_setting'])] = entry
+        table[(entry['_symbol'], entry['_setting'])] = entry['_no']
+    _tables[datafile] = table
+    return table
+
+
+def _read_datafile(spg, spacegroup, setting, datafile):
+    key = (spacegroup, setting, datafile)
+    if key not in _cache:
+        if isinstance(spacegroup, int):
+            no = spacegroup
+        elif isinstance(spacegroup, str):
+            spacegroup = format_symbol(spacegroup)
+            no = _get_table(datafile).get((spacegroup, setting))
         else:
-            _skip_to_blank(f, spacegroup, setting)
-                
+            raise SpacegroupValueError(
+                '`spacegroup` must be of type int or str')
+        entry = _get_table(datafile).get((no, setting))
+        if entry is None:
+            raise SpacegroupNotFoundError(
+                'invalid spacegroup %s, setting %i not found in data base' %
+                (spacegroup, setting))
+        _cache[key] = entry
+    spg.__dict__.update(_cache[key])
+
 
 def parse_sitesym(symlist, sep=','):
     """Parses a sequence of site symmetries in the form used by
@@ -0,0 +1,283 @@
+"""Molecular dynamics for many independent replicas in lockstep.
+
+The positions and momenta of R replicas of the same system are kept in
+stacked arrays of shape (R, N, 3), and each step of the integrator is
+done for all replicas at once.  The Atoms objects of the replicas are
+views into the stacked arrays, so observers, loggers and trajectories
+can be attached to the individual replicas as usual::
+
+    from ase.md.batch import BatchLangevin
+    images = [atoms.copy() for r in range(100)]
+    dyn = BatchLangevin(images, 5 * units.fs, 300 * units.kB, 0.02,
+                        calculator=LennardJones())
+    dyn.attach(Trajectory('replica0.traj', 'w', images[0]), interval=10)
+    dyn.run(1000)
+
+Forces are calculated for all replicas with one call to
+``calculator.calculate_batch(images)`` if the calculator has such a
+method (see
+:meth:`ase.calculators.pairpotential.PairPotential.calculate_batch`).
+Otherwise each replica is calculated on its own.
+"""
+
+import weakref
+
+import numpy as np
+
+from ase.calculators.calculator import Calculator
+from ase.md.langevin import langevin_coefficients
+from ase.optimize.optimize import Dynamics
+
+
+class ReplicaResults(Calculator):
+    """Energy and forces of one replica from the last batch calculation.
+
+    Before the first step, asking for them calculates all replicas.
+    The results are not recalculated if the atoms are changed outside
+    the dynamics."""
+
+    name = 'batch'
+    implemented_properties = ['energy', 'forces']
+
+    def __init__(self, dyn, index):
+        Calculator.__init__(self)
+        self.dyn = weakref.proxy(dyn)
+        self.index = index
+
+    def get_property(self, name, atoms=None, allow_calculation=True):
+        if name not in self.dyn.results:
+            if not allow_calculation:
+                return None
+            self.dyn.get_forces()
+        return self.dyn.results[name][self.index].copy()
+
+
+class BatchMolecularDynamics(Dynamics):
+    """Base-class for MD of many replicas.
+
+    images: list of Atoms
+        The replicas.  They must have the same number of atoms.
+    timestep: float
+        The time step.
+    calculator: Calculator or None
+        Calculator for all replicas.  If it has a calculate_batch()
+        method, all replicas are calculated in one call, otherwise
+        one replica at a time.  If None, the calculator attached to
+        each replica is used.
+
+    Observers are called after each step of all replicas.  Use the
+    *atoms* keyword of attach() to make an observer work on a single
+    replica."""
+
+    def __init__(self, images, timestep, calculator=None):
+        Dynamics.__init__(self, images, logfile=None, trajectory=None)
+        natoms = len(images[0])
+        for image in images:
+            if len(image) != natoms:
+                raise ValueError('All replicas must have the same number '
+                                 'of atoms')
+        self.images = images
+        self.dt = timestep
+        self.calc = calculator
+        self.results = {}
+
+        self.masses = np.array([image.get_masses() for image in images])
+        self.masses.shape = (len(images), natoms, 1)
+        if (self.masses == 0).any():
+            raise ValueError('Zero mass encountered in atoms')
+
+        # The replicas keep views of the stacked arrays:
+        self.positions = np.array([image.get_positions() for image in images])
+        self.momenta = np.array([image.get_momenta() for image in images])
+        for r, image in enumerate(images):
+            image.arrays['positions'] = self.positions[r]
+            image.arrays['momenta'] = self.momenta[r]
+            if calculator is not None:
+                image.set_calculator(ReplicaResults(self, r))
+        self.constrained = [r for r, image in enumerate(images)
+                            if image.constraints]
+
+    def set_positions(self, positions):
+        """Set the positions of all replicas, honoring constraints."""
+        for r in self.constrained:
+            self.images[r].set_positions(positions[r])
+            positions[r] = self.positions[r]
+        self.positions[:] = positions
+        for image in self.images:
+            image.touch('positions')
+
+    def set_momenta(self, momenta):
+        """Set the momenta of all replicas, honoring constraints."""
+        for r in self.constrained:
+            self.images[r].set_momenta(momenta[r])
+            momenta[r] = self.momenta[r]
+        self.momenta[:] = momenta
+
+    def get_forces(self):
+        """Forces on all replicas as an array of shape (R, N, 3)."""
+        if self.calc is None:
+            return np.array([image.get_forces() for image in self.images])
+        if hasattr(self.calc, 'calculate_batch'):
+            energies, forces = self.calc.calculate_batch(self.images)
+        else:
+            energies = np.empty(len(self.images))
+            forces = np.empty_like(self.positions)
+            for r, image in enumerate(self.images):
+                energies[r] = self.calc.get_potential_energy(image)
+                forces[r] = self.calc.get_forces(image)
+        for r in self.constrained:
+            for constraint in self.images[r].constraints:
+                constraint.adjust_forces(self.images[r], forces[r])
+        self.results = {'energy': energies, 'forces': forces}
+        return forces.copy()
+
+    def get_potential_energies(self):
+        """Potential energies of all replicas."""
+        if self.calc is None:
+            return np.array([image.get_potential_energy()
+                             for image in self.images])
+        if 'energy' not in self.results:
+            self.get_forces()
+        return self.results['energy'].copy()
+
+    def get_kinetic_energies(self):
+        """Kinetic energies of all replicas."""
+        return 0.5 * (self.momenta**2 / self.masses).sum(axis=(1, 2))
+
+    def get_state(self):
+        return {'nsteps': self.nsteps,
+                'positions': self.positions.copy(),
+                'momenta': self.momenta.copy()}
+
+    def set_state(self, state):
+        self.nsteps = state['nsteps']
+        self.positions[:] = state['positions']
+        self.momenta[:] = state['momenta']
+        for image in self.images:
+            image.touch('positions')
+
+    def run(self, steps=50):
+        """Integrate equation of motion."""
+        f = self.get_forces()
+        try:
+            for step in range(steps):
+                f = self.step(f)
+                self.nsteps += 1
+                self.call_observers()
+        finally:
+            self.flush()
+
+    def get_time(self):
+        return self.nsteps * self.dt
+
+
+class BatchVelocityVerlet(BatchMolecularDynamics):
+    """Velocity Verlet for many replicas.
+
+    Each replica follows exactly the same trajectory as with
+    :class:`~ase.md.verlet.VelocityVerlet`."""
+
+    def step(self, f):
+        p = self.momenta + 0.5 * self.dt * f
+        self.set_positions(self.positions + self.dt * p / self.masses)
+        self.set_momenta(p)
+        f = self.get_forces()
+        self.set_momenta(self.momenta + 0.5 * self.dt * f)
+        return f
+
+
+class BatchLangevin(BatchMolecularDynamics):
+    """Langevin dynamics for many replicas.
+
+    temperature: float or array
+        Temperature in energy units, either one for all replicas or
+        one per replica.
+    friction: float or array
+        Friction coefficient.  Like the temperature, it can be an
+        array of shape (R,) with one value per replica.  Arrays of
+        shape (N,) (the same for all replicas, if N differs from R) or
+        (R, N) give one value per atom.
+    fixcm: bool
+        Keep the center of mass of each replica fixed.
+    rng: random number generator
+        Object with a standard_normal() method.  Default is
+        numpy.random.  The random numbers for all replicas are drawn
+        at once; with a single replica the same numbers are drawn as by
+        :class:`~ase.md.langevin.Langevin`.
+    """
+
+    def __init__(self, images, timestep, temperature, friction, fixcm=True,
+                 calculator=None, rng=None):
+        BatchMolecularDynamics.__init__(self, images, timestep, calculator)
+        self.temp = temperature
+        self.frict = friction
+        self.fixcm = fixcm
+        if rng is None:
+            rng = np.random
+        self.rng = rng
+        self.updatevars()
+
+    def set_temperature(self, temperature):
+        self.temp = temperature
+        self.updatevars()
+
+    def set_friction(self, friction):
+        self.frict = friction
+        self.updatevars()
+
+    def set_timestep(self, timestep):
+        self.dt = timestep
+        self.updatevars()
+
+    def per_atom(self, x, name):
+        """Return number x or array x broadcast to one value per atom."""
+        nreplicas, natoms = self.masses.shape[:2]
+        if np.ndim(x) == 0:
+            return x
+        x = np.asarray(x, float)
+        if x.shape == (nreplicas,):
+            x = x[:, np.newaxis]
+        elif x.shape not in [(natoms,), (nreplicas, natoms)]:
+            raise ValueError('The %s must be a number or an array of shape '
+                             '(%d,), (%d,) or (%d, %d), not %s' %
+                             (name, nreplicas, natoms, nreplicas, natoms,
+                              x.shape))
+        return np.broadcast_to(x, (nreplicas, natoms)).ravel()
+
+    def updatevars(self):
+        nreplicas, natoms = self.masses.shape[:2]
+        coefficients = langevin_coefficients(
+            self.dt, self.per_atom(self.temp, 'temperature'),
+            self.per_atom(self.frict, 'friction'), self.masses)
+        (self.sdpos, self.sdmom, self.c1, self.c2, self.act0, self.c3,
+         self.c4, self.pmcor, self.cnst) = [
+            np.reshape(c, (nreplicas, natoms, 1)) if np.ndim(c) > 0 else c
+            for c in coefficients]
+
+    def step(self, f):
+        nreplicas, natoms = self.masses.shape[:2]
+        p = self.momenta.copy()
+
+        random1 = self.rng.standard_normal(size=(nreplicas, natoms, 3))
+        random2 = self.rng.standard_normal(size=(nreplicas, natoms, 3))
+
+        rrnd = self.sdpos * random1
+        prnd = (self.sdmom * self.pmcor * random1 +
+                self.sdmom * self.cnst * random2)
+
+        if self.fixcm:
+            rrnd = rrnd - np.sum(rrnd, 1)[:, np.newaxis] / natoms
+            prnd = prnd - np.sum(prnd, 1)[:, np.newaxis] / natoms
+            rrnd *= np.sqrt(natoms / (natoms - 1.0))
+            prnd *= np.sqrt(natoms / (natoms - 1.0))
+
+        self.set_positions(self.positions +
+                           self.c1 * p +
+                           self.c2 * f + rrnd)
+        p *= self.act0
+        p += self.c3 * f + prnd
+        self.set_momenta(p)
+
+        f = self.get_forces()
+        self.set_momenta(self.momenta + self.c4 * f)
+        return f
@@ -8,6 +8,107 @@ from ase.md.md import MolecularDynamics
 from ase.parallel import world
 
 
+def langevin_coefficients(dt, temp, frict, masses):
+    """Coefficients of the Langevin integrator.
+
+    Returns sdpos, sdmom, c1, c2, act0, c3, c4, pmcor and cnst.  The
+    masses can have any shape; the per-atom coefficients are returned
+    with shape (-1, 1).  If the friction is an array, act0, c3, c4,
+    pmcor and cnst are arrays of the same shape (-1, 1)."""
+    localfrict = hasattr(frict, 'shape')
+    lt = frict * dt
+    sdpos = dt * np.sqrt(temp / masses.reshape(-1) * (2.0/3.0 - 0.5 * lt) * lt)
+    sdpos.shape = (-1, 1)
+    sdmom = np.sqrt(temp * masses.reshape(-1) * 2.0 * (1.0 - lt) * lt)
+    sdmom.shape = (-1, 1)
+    pmcor = np.sqrt(3.0)/2.0 * (1.0 - 0.125 * lt)
+    cnst = np.sqrt((1.0 - pmcor) * (1.0 + pmcor))
+
+    act0 = 1.0 - lt + 0.5 * lt * lt
+    act1 = (1.0 - 0.5 * lt + (1.0/6.0) * lt * lt)
+    act2 = 0.5 - (1.0/6.0) * lt + (1.0/24.0) * lt * lt
+    c1 = act1 * dt / masses.reshape(-1)
+    c1.shape = (-1, 1)
+    c2 = act2 * dt * dt / masses.reshape(-1)
+    c2.shape = (-1, 1)
+    c3 = (act1 - act2) * dt
+    c4 = act2 * dt
+    if localfrict:
+        # If the friction is an array, so are these
+        act0.shape = (-1, 1)
+        c3.shape = (-1, 1)
+        c4.shape = (-1, 1)
+        pmcor.shape = (-1, 1)
+        cnst.shape = (-1, 1)
+    return sdpos, sdmom, c1, c2, act0, c3, c4, pmcor, cnst
+
+
+# Constants of the Philox4x32-10 generator:
+PHILOX_M = (0xD2511F53, 0xCD9E8D57)
+PHILOX_W = (0x9E3779B9, 0xBB67AE85)
+
+
+def philox(counters, key, rounds=10):
+    """Philox4x32 counter-based random number generator.
+
+    counters: array of shape (n, 4)
+        32-bit counters.
+    key: two 32-bit integers
+
+    Returns n blocks of four random 32-bit integers (as uint64 array
+    of shape (n, 4)).  The output is a function of counter and key
+    only, so any block can be generated independently of the others.
+    See Salmon et al., Parallel random numbers: as easy as 1, 2, 3,
+    SC'11 (2011)."""
+    mask = np.uint64(0xFFFFFFFF)
+    shift = np.uint64(32)
+    c = np.array(counters, np.uint64) & mask
+    c0, c1, c2, c3 = c.T
+    k0 = np.uint64(key[0]) & mask
+    k1 = np.uint64(key[1]) & mask
+    m0 = np.uint64(PHILOX_M[0])
+    m1 = np.uint64(PHILOX_M[1])
+    for r in range(rounds):
+        if r > 0:
+            k0 = (k0 + np.uint64(PHILOX_W[0])) & mask
+            k1 = (k1 + np.uint64(PHILOX_W[1])) & mask
+        p0 = m0 * c0
+        p1 = m1 * c2
+        c0, c1, c2, c3 = ((p1 >> shift) ^ c1 ^ k0, p1 & mask,
+                          (p0 >> shift) ^ c3 ^ k1, p0 & mask)
+    return np.array([c0, c1, c2, c3]).T
+
+
+def counter_normal(seed, step, ids, n):
+    """Normal random numbers keyed by seed, step and atom index.
+
+    Returns an array of shape (len(ids), n) with n independent
+    standard normal numbers for each atom.  The numbers for atom
+    ids[i] at a given step and seed are always the same, no matter
+    which other atoms are included."""
+    ids = np.asarray(ids, np.uint64)
+    nblocks = (n + 1) // 2  # two normals from one block of four words
+    counters = np.zeros((len(ids), nblocks, 4), np.uint64)
+    counters[:, :, 0] = step & 0xFFFFFFFF
+    counters[:, :, 1] = step >> 32
+    counters[:, :, 2] = ids[:, np.newaxis]
+    counters[:, :, 3] = np.arange(nblocks)
+    seed = int(seed)
+    x = philox(counters.reshape((-1, 4)),
+               (seed & 0xFFFFFFFF, (seed >> 32) & 0xFFFFFFFF))
+    # Two uniform numbers in (0, 1] with 53 bits from each block:
+    x = x.astype(float)
+    u1 = 1.0 - (np.floor(x[:, 0] / 32) * 67108864.0 +
+                np.floor(x[:, 1] / 64)) / 9007199254740992.0
+    u2 = (np.floor(x[:, 2] / 32) * 67108864.0 +
+          np.floor(x[:, 3] / 64)) / 9007199254740992.0
+    # Box-Muller:
+    r = np.sqrt(-2 * np.log(u1))
+    phi = 2 * np.pi * u2
+    normal = np.array([r * np.cos(phi), r * np.sin(phi)]).T
+    return normal.reshape((len(ids), 2 * nblocks))[:, :n]
+
+
 class Langevin(MolecularDynamics):
     """Langevin (constant N, V, T) molecular dynamics.
 
@@ -29,6 +130,14 @@ class Langevin(MolecularDynamics):
         If True, the position and momentum of the center of mass is
         kept unperturbed.  Default: True.
 
+    seed
+        If given, the random numbers are generated from the seed, the
+        step number and the index of each atom with a counter-based
+        generator (Philox).  All ranks then generate the same numbers
+        without communication, and the trajectory does not depend on
+        the number of ranks.  Default: None, which uses numpy.random
+        and broadcasts the numbers from the master rank.
+
     The temperature and friction are normally scalars, but in principle one
     quantity per atom could be specified by giving an array.
 
@@ -37,13 +146,14 @@ class Langevin(MolecularDynamics):
     _lgv_version = 2  # Helps Asap doing the right thing.  Increment when changing stuff.
     def __init__(self, atoms, timestep, temperature, friction, fixcm=True,
                  trajectory=None, logfile=None, loginterval=1,
-                 communicator=world):
+                 communicator=world, seed=None):
         MolecularDynamics.__init__(self, atoms, timestep, trajectory,
                                    logfile, loginterval)
         self.temp = temperature
         self.frict = friction
         self.fixcm = fixcm  # will the center of mass be held fixed?
         self.communicator = communicator
+        self.seed = seed
         self.updatevars()
         
     def set_temperature(self, temperature):
@@ -59,56 +169,35 @@ class Langevin(MolecularDynamics):
         self.updatevars()
 
     def updatevars(self):
-        dt = self.dt
         # If the friction is an array some other constants must be arrays too.
         self._localfrict = hasattr(self.frict, 'shape')
-        lt = self.frict * dt
-        masses = self.masses
-        sdpos = dt * np.sqrt(self.temp / masses.reshape(-1) * (2.0/3.0 - 0.5 * lt) * lt)
-        sdpos.shape = (-1, 1)
-        sdmom = np.sqrt(self.temp * masses.reshape(-1) * 2.0 * (1.0 - lt) * lt)
-        sdmom.shape = (-1, 1)
-        pmcor = np.sqrt(3.0)/2.0 * (1.0 - 0.125 * lt)
-        cnst = np.sqrt((1.0 - pmcor) * (1.0 + pmcor))
-
-        act0 = 1.0 - lt + 0.5 * lt * lt
-        act1 = (1.0 - 0.5 * lt + (1.0/6.0) * lt * lt)
-        act2 = 0.5 - (1.0/6.0) * lt + (1.0/24.0) * lt * lt
-        c1 = act1 * dt / masses.reshape(-1)
-        c1.shape = (-1, 1)
-        c2 = act2 * dt * dt / masses.reshape(-1)
-        c2.shape = (-1, 1)
-        c3 = (act1 - act2) * dt
-        c4 = act2 * dt
-        del act1, act2
-        if self._localfrict:
-            # If the friction is an array, so are these
-            act0.shape = (-1, 1)
-            c3.shape = (-1, 1)
-            c4.shape = (-1, 1)
-            pmcor.shape = (-1, 1)
-            cnst.shape = (-1, 1)
-        self.sdpos = sdpos
-        self.sdmom = sdmom
-        self.c1 = c1
-        self.c2 = c2
-        self.act0 = act0
-        self.c3 = c3
-        self.c4 = c4
-        self.pmcor = pmcor
-        self.cnst = cnst
+        (self.sdpos, self.sdmom, self.c1, self.c2, self.act0, self.c3,
+         self.c4, self.pmcor, self.cnst) = langevin_coefficients(
+            self.dt, self.temp, self.frict, self.masses)
         self.natoms = self.atoms.get_number_of_atoms() # Also works in parallel Asap.
 
+    def get_atom_ids(self):
+        """Global indices of the atoms, used for the counter-based
+        random numbers.  Domain-decomposed codes, where each rank only
+        has some of the atoms, should override this."""
+        return np.arange(len(self.atoms))
+
     def step(self, f):
         atoms = self.atoms
         p = self.atoms.get_momenta()
 
-        random1 = standard_normal(size=(len(atoms), 3))
-        random2 = standard_normal(size=(len(atoms), 3))
-
-        if self.communicator is not None:
-            self.communicator.broadcast(random1, 0)
-            self.communicator.broadcast(random2, 0)
+        if self.seed is not None:
+            random = counter_normal(self.seed, self.nsteps,
+                                    self.get_atom_ids(), 6)
+            random1 = random[:, :3]
+            random2 = random[:, 3:]
+        else:
+            random1 = standard_normal(size=(len(atoms), 3))
+            random2 = standard_normal(size=(len(atoms), 3))
+
+            if self.communicator is not None:
+                self.communicator.broadcast(random1, 0)
+                self.communicator.broadcast(random2, 0)
         
         rrnd = self.sdpos * random1
         prnd = (self.sdmom * self.pmcor * random1 +
@@ -81,6 +81,10 @@ class MDLogger:
             self.logfile.close()
 
     def __call__(self):
+        self.write_snapshot(self.snapshot())
+
+    def snapshot(self):
+        """The numbers for one line of the log."""
         epot = self.atoms.get_potential_energy()
         ekin = self.atoms.get_kinetic_energy()
         temp = ekin / (1.5 * units.kB * self.natoms)
@@ -95,6 +99,28 @@ class MDLogger:
         dat += (epot+ekin, epot, ekin, temp)
         if self.stress:
             dat += tuple(self.atoms.get_stress() / units.GPa)
+        return dat
+
+    def write_snapshot(self, dat):
         self.logfile.write(self.fmt % dat)
         self.logfile.flush()
+
+    def get_state(self):
+        """Return the size of the log file (None if it is not a file).
+
+        Used by checkpoints of the dynamics."""
+        self.logfile.flush()
+        try:
+            return {'position': self.logfile.tell()}
+        except (AttributeError, IOError, ValueError):
+            return None
+
+    def set_state(self, state):
+        """Drop the lines written after get_state() was called."""
+        position = state['position']
+        self.logfile.flush()
+        self.logfile.seek(0, 2)
+        if position <= self.logfile.tell():
+            self.logfile.truncate(position)
+            self.logfile.seek(position)
         
@@ -31,10 +31,13 @@ class MolecularDynamics(Dynamics):
         if not self.atoms.has('momenta'):
             self.atoms.set_momenta(np.zeros_like(f))
 
-        for step in range(steps):
-            f = self.step(f)
-            self.nsteps += 1
-            self.call_observers()
+        try:
+            for step in range(steps):
+                f = self.step(f)
+                self.nsteps += 1
+                self.call_observers()
+        finally:
+            self.flush()
 
     def get_time(self):
         return self.nsteps * self.dt
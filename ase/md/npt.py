@@ -235,10 +235,32 @@ class NPT(MolecularDynamics):
             if self.have_the_atoms_been_changed():
                 raise NotImplementedError("You have modified the atoms since the last timestep.")
 
-        for i in range(steps):
-            self.step()
-            self.nsteps += 1
-            self.call_observers()
+        try:
+            for i in range(steps):
+                self.step()
+                self.nsteps += 1
+                self.call_observers()
+        finally:
+            self.flush()
+
+    # Variables of the integrator saved by get_state():
+    state_variables = ['initialized', 'h', 'h_past', 'inv_h',
+                       'q', 'q_past', 'q_future', 'eta', 'eta_past',
+                       'zeta', 'zeta_past', 'zeta_integrated']
+
+    def get_state(self):
+        state = MolecularDynamics.get_state(self)
+        state['timeelapsed'] = self.timeelapsed
+        state['npt'] = dict((name, getattr(self, name))
+                            for name in self.state_variables
+                            if hasattr(self, name))
+        return state
+
+    def set_state(self, state):
+        MolecularDynamics.set_state(self, state)
+        self.timeelapsed = state['timeelapsed']
+        for name, value in state['npt'].items():
+            setattr(self, name, value)
 
     def have_the_atoms_been_changed(self):
         "Checks if the user has modified the positions or momenta of the atoms"
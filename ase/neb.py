@@ -1,20 +1,23 @@
 # -*- coding: utf-8 -*-
 import threading
+import traceback
+import multiprocessing
 from math import sqrt
 
 import numpy as np
 
 import ase.parallel as mpi
 from ase.calculators.calculator import Calculator
+from ase.calculators.neighborlist import NeighborList
 from ase.calculators.singlepoint import SinglePointCalculator
 from ase.io import read
-from ase.optimize import BFGS
+from ase.optimize import LBFGS
 from ase.utils.geometry import find_mic
 
 
 class NEB:
     def __init__(self, images, k=0.1, climb=False, parallel=False,
-                 world=None):
+                 world=None, workers=None, pool=None):
         """Nudged elastic band.
 
         images: list of Atoms objects
@@ -24,11 +27,34 @@ class NEB:
         climb: bool
             Use a climbing image (default is no climbing image).
         parallel: bool
-            Distribute images over processors.
+            Distribute images over processors.  Without MPI, the images
+            are calculated in separate threads, which is useful for
+            calculators running external programs (FileIOCalculator).
+            Each image must then have its own calculator and label.
+            Use parallel='processes' to calculate the images in
+            long-lived worker processes instead, which also helps for
+            calculators written in Python.
+        workers: int
+            Number of worker processes for parallel='processes'.
+            Default is one for each internal image.
+        pool: JobPool object
+            Calculate the internal images concurrently with the submit()
+            method of their calculators (FileIOCalculators), which run
+            copies of the calculators in their own job directories of
+            the pool (see ase.calculators.calculator.JobPool).  The
+            images may then share one calculator.
+
+        With parallel='processes', each worker holds a copy of its
+        images and their calculators.  Positions, energies and forces
+        are exchanged through shared memory, and the images in this
+        process get SinglePointCalculators with the results.  Call
+        close() to stop the workers and get the original calculators
+        back.
         """
         self.images = images
         self.climb = climb
         self.parallel = parallel
+        self.pool = pool
         self.natoms = len(images[0])
         self.nimages = len(images)
         self.emax = np.nan
@@ -41,7 +67,13 @@ class NEB:
             world = mpi.world
         self.world = world
 
-        if parallel:
+        if parallel == 'processes':
+            assert world.size == 1
+            if workers is None:
+                workers = self.nimages - 2
+            self.workers = max(1, min(workers, self.nimages - 2))
+            self.processes = None
+        elif parallel:
             assert world.size == 1 or world.size % (self.nimages - 2) == 0
 
     def interpolate(self, method='linear', mic=False):
@@ -51,19 +83,51 @@ class NEB:
             self.idpp_interpolate(traj=None, log=None, mic=mic)
 
     def idpp_interpolate(self, traj='idpp.traj', log='idpp.log', fmax=0.1,
-                         optimizer=BFGS, mic=False):
-        d1 = self.images[0].get_all_distances(mic=mic)
-        d2 = self.images[-1].get_all_distances(mic=mic)
+                         optimizer=LBFGS, mic=False, cutoff=None,
+                         steps=100000000):
+        """Optimize the internal images with the IDPP.
+
+        Target distances are interpolated linearly between those of
+        the initial and final images.  If cutoff is given, only pairs
+        of atoms closer than cutoff in the initial or the final image
+        contribute.  All images are evaluated together in one batched
+        pass."""
+        i, j = idpp_pairs(self.images[0], self.images[-1], cutoff, mic)
+        d1 = pair_distances(self.images[0], i, j, mic)
+        d2 = pair_distances(self.images[-1], i, j, mic)
         d = (d2 - d1) / (self.nimages - 1)
+        targets = d1 + np.arange(self.nimages)[:, np.newaxis] * d
+        path = IDPPPath(self.images, targets, (i, j), mic)
         old = []
-        for i, image in enumerate(self.images):
+        for n, image in enumerate(self.images):
             old.append(image.calc)
-            image.calc = IDPP(d1 + i * d, mic=mic)
-        opt = BFGS(self, trajectory=traj, logfile=log)
-        opt.run(fmax=0.1)
+            image.calc = IDPP(targets[n], mic=mic, pairs=(i, j),
+                              path=path, index=n)
+        # The worker processes do not know about the IDPP calculators:
+        parallel = self.parallel
+        if parallel == 'processes':
+            self.parallel = False
+        try:
+            opt = optimizer(self, trajectory=traj, logfile=log)
+            opt.run(fmax=fmax, steps=steps)
+        finally:
+            self.parallel = parallel
         for image, calc in zip(self.images, old):
             image.calc = calc
 
+    def calculate_in_pool(self, energies, forces):
+        """Submit all internal images to the pool and wait for them."""
+        futures = [image.get_calculator().submit(image, ['energy', 'forces'],
+                                                 pool=self.pool)
+                   for image in self.images[1:-1]]
+        for i, future in enumerate(futures):
+            results = future.result()
+            image = self.images[i + 1]
+            energies[i] = results['energy']
+            forces[i] = results['forces']
+            for constraint in image.constraints:
+                constraint.adjust_forces(image, forces[i])
+
     def get_positions(self):
         positions = np.empty(((self.nimages - 2) * self.natoms, 3))
         n1 = 0
@@ -92,11 +156,15 @@ class NEB:
         forces = np.empty(((self.nimages - 2), self.natoms, 3))
         energies = np.empty(self.nimages - 2)
 
-        if not self.parallel:
+        if self.pool is not None:
+            self.calculate_in_pool(energies, forces)
+        elif not self.parallel:
             # Do all images - one at a time:
             for i in range(1, self.nimages - 1):
                 energies[i - 1] = images[i].get_potential_energy()
                 forces[i - 1] = images[i].get_forces()
+        elif self.parallel == 'processes':
+            self.calculate_in_processes(energies, forces)
         elif self.world.size == 1:
             def run(image, energies, forces):
                 energies[:] = image.get_potential_energy()
@@ -162,6 +230,72 @@ class NEB:
 
         return forces.reshape((-1, 3))
 
+    def start_processes(self):
+        """Start the worker processes for parallel='processes'."""
+        n = self.nimages - 2
+        self.shared = [multiprocessing.RawArray('d', size)
+                       for size in [n * self.natoms * 3,
+                                    n * self.natoms * 3,
+                                    n]]
+        positions, forces, energies = self.get_shared_arrays(self.shared,
+                                                             n, self.natoms)
+        self.calculators = [image.calc for image in self.images]
+        self.processes = []
+        self.connections = []
+        for w in range(self.workers):
+            # Contiguous blocks of images:
+            indices = list(range(1 + w * n // self.workers,
+                                 1 + (w + 1) * n // self.workers))
+            images = dict((i, self.images[i]) for i in indices)
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=image_worker,
+                args=(images, child, self.shared, n, self.natoms))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+            self.connections.append(conn)
+
+    @staticmethod
+    def get_shared_arrays(shared, n, natoms):
+        positions = np.frombuffer(shared[0]).reshape((n, natoms, 3))
+        forces = np.frombuffer(shared[1]).reshape((n, natoms, 3))
+        energies = np.frombuffer(shared[2])
+        return positions, forces, energies
+
+    def calculate_in_processes(self, energies, forces):
+        if self.processes is None:
+            self.start_processes()
+        n = self.nimages - 2
+        shared_positions, shared_forces, shared_energies = \
+            self.get_shared_arrays(self.shared, n, self.natoms)
+        for i in range(1, self.nimages - 1):
+            shared_positions[i - 1] = self.images[i].get_positions()
+        for conn in self.connections:
+            conn.send(True)
+        errors = [conn.recv() for conn in self.connections]
+        for error in errors:
+            if error is not None:
+                raise RuntimeError('Parallel NEB failed!\n' + error)
+        energies[:] = shared_energies
+        forces[:] = shared_forces
+        for i in range(1, self.nimages - 1):
+            self.images[i].calc = SinglePointCalculator(
+                self.images[i], energy=energies[i - 1],
+                forces=forces[i - 1].copy())
+
+    def close(self):
+        """Stop worker processes and restore the original calculators."""
+        if self.parallel != 'processes' or self.processes is None:
+            return
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        for image, calc in zip(self.images, self.calculators):
+            image.calc = calc
+        self.processes = None
+
     def get_potential_energy(self):
         return self.emax
 
@@ -169,6 +303,120 @@ class NEB:
         return (self.nimages - 2) * self.natoms
 
 
+def image_worker(images, conn, shared, n, natoms):
+    """Calculate energies and forces of some NEB images on request.
+
+    Positions are read from and results written to the shared arrays.
+    A None message stops the worker."""
+    positions, forces, energies = NEB.get_shared_arrays(shared, n, natoms)
+    while conn.recv() is not None:
+        try:
+            for i, image in images.items():
+                image.set_positions(positions[i - 1])
+                energies[i - 1] = image.get_potential_energy()
+                forces[i - 1] = image.get_forces()
+        except Exception:
+            conn.send(traceback.format_exc())
+        else:
+            conn.send(None)
+
+
+def idpp_pairs(initial, final, cutoff=None, mic=False):
+    """Return indices i < j of the pairs entering the IDPP.
+
+    With a cutoff, only pairs closer than cutoff in the initial or the
+    final configuration are included."""
+    natoms = len(initial)
+    if cutoff is None:
+        return np.triu_indices(natoms, 1)
+    keys = []
+    for atoms in [initial, final]:
+        nl = NeighborList([cutoff / 2] * natoms, skin=0.0,
+                          self_interaction=False, bothways=True)
+        nl.update(atoms)
+        for a in range(natoms):
+            neighbors, offsets = nl.get_neighbors(a)
+            if not mic:
+                neighbors = neighbors[(offsets == 0).all(1)]
+            neighbors = neighbors[neighbors > a]
+            keys.append(a * natoms + neighbors)
+    keys = np.unique(np.concatenate(keys).astype(int))
+    return keys // natoms, keys % natoms
+
+
+def pair_distances(atoms, i, j, mic=False):
+    """Distances between atoms i and j (arrays of indices)."""
+    D = atoms.positions[j] - atoms.positions[i]
+    if mic:
+        return find_mic(D, atoms.cell, atoms.pbc)[1]
+    return np.sqrt((D**2).sum(1))
+
+
+def idpp(positions, targets, pairs, cell=None, pbc=None, mic=False):
+    """Batched image dependent pair potential.
+
+    positions: (M, N, 3) array
+        Positions of M configurations.
+    targets: (M, P) array
+        Target distances of the P pairs for each configuration.
+    pairs: tuple of two arrays
+        Atom indices i and j of the P pairs.
+
+    Returns the (M,) energies and (M, N, 3) forces."""
+
+    i, j = pairs
+    nconfs, natoms = positions.shape[:2]
+    D = positions[:, j] - positions[:, i]
+    if mic:
+        D, d = find_mic(D.reshape((-1, 3)), cell, pbc)
+        D = D.reshape((nconfs, -1, 3))
+        d = d.reshape((nconfs, -1))
+    else:
+        d = np.sqrt((D**2).sum(2))
+
+    dd = d - targets
+    d4 = d**4
+    energies = (dd**2 / d4).sum(1)
+    # dE/dd / d for each pair:
+    g = 2 * dd * (1 - 2 * dd / d) / (d4 * d)
+    f = g[..., np.newaxis] * D  # force on i, minus force on j
+
+    offsets = natoms * np.arange(nconfs)[:, np.newaxis]
+    I = (i + offsets).ravel()
+    J = (j + offsets).ravel()
+    forces = np.empty((nconfs * natoms, 3))
+    for c in range(3):
+        fc = f[..., c].ravel()
+        forces[:, c] = (np.bincount(I, fc, minlength=nconfs * natoms) -
+                        np.bincount(J, fc, minlength=nconfs * natoms))
+    return energies, forces.reshape((nconfs, natoms, 3))
+
+
+class IDPPPath:
+    """IDPP energies and forces for all images of a path.
+
+    The IDPP calculators of the images share one IDPPPath, so that the
+    first image asked for its energy evaluates all images in one
+    batched pass."""
+
+    def __init__(self, images, targets, pairs, mic):
+        self.images = images
+        self.targets = targets
+        self.pairs = pairs
+        self.mic = mic
+        self.positions = None
+
+    def get_results(self, index):
+        positions = np.array([image.positions for image in self.images])
+        if self.positions is None or (positions != self.positions).any():
+            atoms = self.images[0]
+            self.energies, self.forces = idpp(positions, self.targets,
+                                              self.pairs, atoms.cell,
+                                              atoms.pbc, self.mic)
+            self.positions = positions
+        return self.energies[index], self.forces[index].copy()
+
+
 class IDPP(Calculator):
     """Image dependent pair potential.
 
@@ -179,37 +427,42 @@ class IDPP(Calculator):
         Søren Smidstrup, Andreas Pedersen, Kurt Stokbro and Hannes Jónsson
 
         Chem. Phys. 140, 214106 (2014)
+
+    target: array
+        Target distances: an N x N matrix or, if pairs is given, one
+        distance for each pair.
+    pairs: tuple of two arrays
+        Atom indices i and j of the interacting pairs.  Default is
+        all pairs.
+    path, index: IDPPPath and int
+        Take the results for image number index from a batched
+        calculation of a whole path.
     """
 
     implemented_properties = ['energy', 'forces']
 
-    def __init__(self, target, mic):
+    def __init__(self, target, mic, pairs=None, path=None, index=None):
         Calculator.__init__(self)
         self.target = target
         self.mic = mic
+        self.pairs = pairs
+        self.path = path
+        self.index = index
 
     def calculate(self, atoms, properties, system_changes):
         Calculator.calculate(self, atoms, properties, system_changes)
 
-        P = atoms.get_positions()
-        d = []
-        D = []
-        for p in P:
-            Di = P - p
-            if self.mic:
-                Di, di = find_mic(Di, atoms.get_cell(), atoms.get_pbc())
-            else:
-                di = np.sqrt((Di**2).sum(1))
-            d.append(di)
-            D.append(Di)
-        d = np.array(d)
-        D = np.array(D)
-
-        dd = d - self.target
-        d.ravel()[::len(d) + 1] = 1  # avoid dividing by zero
-        d4 = d**4
-        e = 0.5 * (dd**2 / d4).sum()
-        f = -2 * ((dd * (1 - 2 * dd / d) / d**5)[..., np.newaxis] * D).sum(0)
+        if self.path is not None:
+            e, f = self.path.get_results(self.index)
+        else:
+            if self.pairs is None:
+                self.pairs = np.triu_indices(len(atoms), 1)
+                self.target = self.target[self.pairs]
+            e, f = idpp(atoms.positions[np.newaxis],
+                        self.target[np.newaxis], self.pairs,
+                        atoms.cell, atoms.pbc, self.mic)
+            e = e[0]
+            f = f[0]
         self.results = {'energy': e, 'forces': f}
 
 
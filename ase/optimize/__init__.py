@@ -6,7 +6,7 @@ from ase.optimize.lbfgs import HessLBFGS, LineLBFGS
 from ase.optimize.fire import FIRE
 from ase.optimize.lbfgs import LBFGS, LBFGSLineSearch
 from ase.optimize.bfgslinesearch import BFGSLineSearch
-from ase.optimize.bfgs import BFGS
+from ase.optimize.bfgs import BFGS, InverseBFGS
 from ase.optimize.oldqn import GoodOldQuasiNewton
 
 try:
@@ -26,7 +26,8 @@ class BasinHopping(Dynamics):
                  trajectory='lowest.traj',
                  optimizer_logfile='-',
                  local_minima_trajectory='local_minima.traj',
-                 adjust_cm=True):
+                 adjust_cm=True,
+                 minima_store=None):
         """Parameters:
 
         atoms: Atoms object
@@ -38,6 +39,11 @@ class BasinHopping(Dynamics):
         logfile: file object or str
             If *logfile* is a string, a file with that name will be opened.
             Use '-' for stdout.
+
+        minima_store: MinimaStore object
+            If given, each distinct local minimum is added once to this
+            store (see ase.optimize.minimahopping.MinimaStore).  Give
+            the store an energy_tolerance to speed up the lookups.
         """
         Dynamics.__init__(self, atoms, logfile, trajectory)
         self.kT = temperature
@@ -54,6 +60,7 @@ class BasinHopping(Dynamics):
         if isinstance(local_minima_trajectory, str):
             self.lm_trajectory = Trajectory(local_minima_trajectory,
                                                   'w', atoms)
+        self.minima_store = minima_store
 
         self.initialize()
 
@@ -136,5 +143,10 @@ class BasinHopping(Dynamics):
                 # Something went wrong.
                 # In GPAW the atoms are probably to near to each other.
                 return None
+
+            if self.minima_store is not None:
+                id, dmax = self.minima_store.find(self.atoms, self.energy)
+                if id is None:
+                    self.minima_store.add(self.atoms)
             
         return self.energy
@@ -113,6 +113,92 @@ class BFGS(Optimizer):
         self.r0 = r0
         self.f0 = f0
 
+
+class InverseBFGS(BFGS):
+    def __init__(self, atoms, restart=None, logfile='-', trajectory=None,
+                 maxstep=None, master=None, alpha=70.0, restart_interval=10):
+        """BFGS optimizer working on the inverse Hessian.
+
+        The step is obtained as a matrix-vector product with the
+        inverse Hessian, which is updated directly.  That costs O(N^2)
+        per step instead of the O(N^3) diagonalization done by BFGS.
+        Updates that would make the inverse Hessian lose positive
+        definiteness are skipped.
+
+        Parameters are the same as for BFGS, plus:
+
+        alpha: float
+            Initial guess for the Hessian (eV/Å^2).
+        restart_interval: int
+            Write the restart file every restart_interval steps (and
+            when run() returns) instead of after every step.
+        """
+        self.alpha = alpha
+        self.restart_interval = restart_interval
+        BFGS.__init__(self, atoms, restart, logfile, trajectory, maxstep,
+                      master)
+        # The steps between writes are counted instead:
+        self.restartinterval = 0.0
+
+    def initialize(self):
+        self.Hinv = None
+        self.r0 = None
+        self.f0 = None
+        self.maxstep = 0.04
+
+    def read(self):
+        self.Hinv, self.r0, self.f0, self.maxstep = self.load()
+
+    def write_restart(self):
+        self.dump((self.Hinv, self.r0, self.f0, self.maxstep))
+
+    def run(self, fmax=0.05, steps=100000000):
+        try:
+            BFGS.run(self, fmax, steps)
+        finally:
+            self.write_restart()
+
+    def step(self, f):
+        atoms = self.atoms
+        r = atoms.get_positions()
+        f = f.reshape(-1)
+        self.update(r.flat, f, self.r0, self.f0)
+        dr = np.dot(self.Hinv, f).reshape((-1, 3))
+        steplengths = (dr**2).sum(1)**0.5
+        dr = self.determine_step(dr, steplengths)
+        atoms.set_positions(r + dr)
+        self.r0 = r.flat.copy()
+        self.f0 = f.copy()
+        if (self.nsteps + 1) % self.restart_interval == 0:
+            self.write_restart()
+
+    def update(self, r, f, r0, f0):
+        if self.Hinv is None:
+            self.Hinv = np.eye(3 * len(self.atoms)) / self.alpha
+            return
+        dr = r - r0
+
+        if np.abs(dr).max() < 1e-7:
+            # Same configuration again (maybe a restart):
+            return
+
+        dg = f0 - f  # change of the gradient
+        a = np.dot(dr, dg)
+        if a <= 0.0:
+            # Curvature condition not fulfilled:
+            return
+        Hdg = np.dot(self.Hinv, dg)
+        b = np.dot(dg, Hdg)
+        u = (0.5 * (a + b) / a**2) * dr - Hdg / a
+        self.Hinv += np.outer(u, dr)
+        self.Hinv += np.outer(dr, u)
+
+    def replay_trajectory(self, traj):
+        """Initialize inverse hessian from old trajectory."""
+        self.Hinv = None
+        BFGS.replay_trajectory(self, traj)
+
+
 class oldBFGS(BFGS):
     def determine_step(self, dr, steplengths):
         """Old BFGS behaviour for scaling step lengths
@@ -5,8 +5,8 @@ from ase.optimize.optimize import Optimizer
 
 class FIRE(Optimizer):
     def __init__(self, atoms, restart=None, logfile='-', trajectory=None,
-                 dt=0.1, maxmove=0.2, dtmax=1.0, Nmin=5, finc=1.1, fdec=0.5,
-                 astart=0.1, fa=0.99, a=0.1, master=None):
+                 dt=None, maxmove=0.2, dtmax=None, Nmin=5, finc=1.1, fdec=0.5,
+                 astart=0.1, fa=0.99, a=0.1, master=None, precon=None):
         """Parameters:
 
         atoms: Atoms object
@@ -27,9 +27,31 @@ class FIRE(Optimizer):
         master: boolean
             Defaults to None, which causes only rank 0 to save files.  If
             set to true,  this rank will save files.
+
+        dt: float
+            Initial time step.  Default is 0.1, or 1.0 with a
+            preconditioner.
+
+        dtmax: float
+            Maximum time step.  Default is 1.0, or 2.0 with a
+            preconditioner.
+
+        precon: Precon object
+            Sparse preconditioner (see ase.optimize.precon), used as
+            the mass matrix: the velocities follow the preconditioned
+            forces, and the mixing of velocities and forces uses the
+            norm given by P.  Time is then measured in units where a
+            step of 1.0 is about a Newton step.  Default is None (no
+            preconditioning).  For some systems, preconditioning costs
+            force calls instead of saving them (see
+            ase/optimize/test/precon.py).
         """
         Optimizer.__init__(self, atoms, restart, logfile, trajectory, master)
 
+        if dt is None:
+            dt = 0.1 if precon is None else 1.0
+        if dtmax is None:
+            dtmax = 1.0 if precon is None else 2.0
         self.dt = dt
         self.Nsteps = 0
         self.maxmove = maxmove
@@ -40,6 +62,7 @@ class FIRE(Optimizer):
         self.astart = astart
         self.fa = fa
         self.a = a
+        self.precon = precon
 
     def initialize(self):
         self.v = None
@@ -49,13 +72,18 @@ class FIRE(Optimizer):
        
     def step(self,f):
         atoms = self.atoms
+        if self.precon is None:
+            g = f
+        else:
+            self.precon.make_precon(atoms)
+            g = self.precon.solve(f).reshape((-1, 3))
         if self.v is None:
             self.v = np.zeros((len(atoms), 3))
         else:
             vf = np.vdot(f, self.v)
             if vf > 0.0:
-                self.v = (1.0 - self.a) * self.v + self.a * f / np.sqrt(
-                    np.vdot(f, f)) * np.sqrt(np.vdot(self.v, self.v))
+                self.v = (1.0 - self.a) * self.v + self.a * g * np.sqrt(
+                    self.norm2(self.v) / self.norm2(g))
                 if self.Nsteps > self.Nmin:
                     self.dt = min(self.dt * self.finc, self.dtmax)
                     self.a *= self.fa
@@ -66,7 +94,7 @@ class FIRE(Optimizer):
                 self.dt *= self.fdec
                 self.Nsteps = 0
 
-        self.v += self.dt * f
+        self.v += self.dt * g
         dr = self.dt * self.v
         normdr = np.sqrt(np.vdot(dr, dr))
         if normdr > self.maxmove:
@@ -74,3 +102,9 @@ class FIRE(Optimizer):
         r = atoms.get_positions()
         atoms.set_positions(r + dr)
         self.dump((self.v, self.dt))
+
+    def norm2(self, v):
+        """Squared norm of v (in the metric of the preconditioner)."""
+        if self.precon is None:
+            return np.vdot(v, v)
+        return np.vdot(v, self.precon.dot(v))
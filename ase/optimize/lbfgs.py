@@ -17,7 +17,7 @@ class LBFGS(Optimizer):
     """
     def __init__(self, atoms, restart=None, logfile='-', trajectory=None,
                  maxstep=None, memory=100, damping=1.0, alpha=70.0,
-                 use_line_search=False, master=None):
+                 use_line_search=False, master=None, precon=None):
         """Parameters:
 
         atoms: Atoms object
@@ -57,6 +57,12 @@ class LBFGS(Optimizer):
         master: boolean
             Defaults to None, which causes only rank 0 to save files.  If
             set to true,  this rank will save files.
+
+        precon: Precon object
+            Sparse preconditioner (see ase.optimize.precon) used as the
+            initial inverse Hessian instead of 1 / alpha.  The history
+            is cleared when P is rebuilt.  Default is None (no
+            preconditioning).
         """
         Optimizer.__init__(self, atoms, restart, logfile, trajectory, master)
 
@@ -74,6 +80,7 @@ class LBFGS(Optimizer):
                             # 1./70. is to emulate the behaviour of BFGS
                             # Note that this is never changed!
         self.damping = damping
+        self.precon = precon
         self.use_line_search = use_line_search
         self.p = None
         self.function_calls = 0
@@ -113,7 +120,11 @@ class LBFGS(Optimizer):
         rho = self.rho
         H0 = self.H0
 
-        loopmax = np.min([self.memory, self.iteration])
+        if self.precon is not None and self.precon.make_precon(self.atoms):
+            # The history was collected relative to the old P:
+            del s[:], y[:], rho[:]
+
+        loopmax = len(s)
         a = np.empty((loopmax,), dtype=np.float64)
 
         ### The algorithm itself:
@@ -121,7 +132,10 @@ class LBFGS(Optimizer):
         for i in range(loopmax - 1, -1, -1):
             a[i] = rho[i] * np.dot(s[i], q)
             q -= a[i] * y[i]
-        z = H0 * q
+        if self.precon is None:
+            z = H0 * q
+        else:
+            z = self.precon.solve(q)
         
         for i in range(loopmax):
             b = rho[i] * np.dot(y[i], z)
@@ -176,7 +190,7 @@ class LBFGS(Optimizer):
             rho0 = 1.0 / np.dot(y0, s0)
             self.rho.append(rho0)
 
-        if self.iteration > self.memory:
+        if len(self.s) > self.memory:
             self.s.pop(0)
             self.y.pop(0)
             self.rho.pop(0)
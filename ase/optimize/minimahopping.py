@@ -1,6 +1,9 @@
 import os
+from itertools import product
+
 import numpy as np
 from ase import io, units
+from ase.utils.geometry import find_mic
 from ase.optimize import QuasiNewton
 from ase.parallel import paropen, rank, world
 from ase.md import VelocityVerlet
@@ -27,6 +30,7 @@ class MinimaHopping:
         'mdmin': 2,  # criteria to stop MD simulation (no. of minima)
         'logfile': 'hop.log',  # text log
         'minima_threshold': 0.5,  # A, threshold for identical configs
+        'minima_energy_tolerance': None,  # eV, same for energies
         'timestep': 1.0,  # fs, timestep for MD simulations
         'optimizer': QuasiNewton,  # local optimizer to use
         'minima_traj': 'minima.traj',  # storage file for minima list
@@ -47,6 +51,7 @@ class MinimaHopping:
         # Misc storage.
         self._previous_optimum = None
         self._previous_energy = None
+        self._minima = None
         self._temperature = self._T0
         self._Ediff = self._Ediff0
 
@@ -192,8 +197,11 @@ class MinimaHopping:
                 return
         # In a previously found position?
         unique, dmax_closest = self._unique_minimum_position()
-        self._log('msg', 'Max distance to closest minimum: %.3f A' %
-                  dmax_closest)
+        if dmax_closest < np.inf:
+            self._log('msg', 'Max distance to closest minimum: %.3f A' %
+                      dmax_closest)
+        else:
+            self._log('msg', 'No similar minimum found.')
         if not unique:
             self._temperature *= self._beta2
             self._log('msg', 'Found previously found minimum.')
@@ -261,26 +269,20 @@ class MinimaHopping:
 
     def _record_minimum(self):
         """Adds the current atoms configuration to the minima list."""
-        traj = io.Trajectory(self._minima_traj, 'a')
-        traj.write(self._atoms)
-        self._read_minima()
+        self._minima.add(self._atoms)
         self._log('msg', 'Recorded minima #%i.' % (len(self._minima) - 1))
 
     def _read_minima(self):
-        """Reads in the list of minima from the minima file."""
+        """Reads in the minima added to the minima file since the last
+        call (by this or other runs sharing the file)."""
         exists = os.path.exists(self._minima_traj)
-        if exists:
-            empty = os.path.getsize(self._minima_traj) == 0
-        if os.path.exists(self._minima_traj):
-            if not empty:
-                traj = io.Trajectory(self._minima_traj, 'r')
-                self._minima = [atoms for atoms in traj]
-            else:
-                self._minima = []
-            return True
+        if self._minima is None:
+            self._minima = MinimaStore(self._minima_traj,
+                                       self._minima_threshold,
+                                       self._minima_energy_tolerance)
         else:
-            self._minima = []
-            return False
+            self._minima.update()
+        return exists
 
     def _molecular_dynamics(self, resume=None):
         """Performs a molecular dynamics simulation, until mdmin is
@@ -332,17 +334,10 @@ class MinimaHopping:
     def _unique_minimum_position(self):
         """Identifies if the current position of the atoms, which should be
         a local minima, has been found before."""
-        unique = True
-        dmax_closest = 99999.
-        compare = ComparePositions(translate=True)
         self._read_minima()
-        for minimum in self._minima:
-            dmax = compare(minimum, self._atoms)
-            if dmax < self._minima_threshold:
-                unique = False
-            if dmax < dmax_closest:
-                dmax_closest = dmax
-        return unique, dmax_closest
+        id, dmax_closest = self._minima.find(
+            self._atoms, self._atoms.get_potential_energy())
+        return id is None, dmax_closest
 
 
 class ComparePositions:
@@ -439,6 +434,193 @@ class ComparePositions:
         return dmax
 
 
+def distance_fingerprint(atoms):
+    """Sorted interatomic distances (minimum image convention).
+
+    If every atom of one structure is within d of an atom of the same
+    kind in another structure (after a translation), the fingerprints
+    of the two differ by at most 2 d element by element."""
+    positions = atoms.get_positions()
+    i, j = np.triu_indices(len(atoms), 1)
+    D = positions[j] - positions[i]
+    if atoms.pbc.any():
+        D, D_len = find_mic(D, atoms.cell, atoms.pbc)
+    else:
+        D_len = np.sqrt((D**2).sum(1))
+    return np.sort(D_len)
+
+
+def fingerprint_cell(fingerprint, width, nblocks=3):
+    """Cell of a coarse grid that a fingerprint falls in.
+
+    The fingerprint is split into nblocks consecutive blocks (short,
+    intermediate and long distances), and the block means are rounded
+    down to multiples of width.  If two fingerprints differ by at most
+    width element by element, their cells differ by at most one in
+    each direction."""
+    means = [block.mean() if len(block) else 0.0
+             for block in np.array_split(fingerprint, nblocks)]
+    return tuple(int(np.floor(mean / width)) for mean in means)
+
+
+class MinimaStore:
+    """Store of local minima with an index for finding known minima.
+
+    filename: str or None
+        An ase.db database (.db or .json) or a trajectory (.traj) to
+        store the minima in.  The minima already in the file are
+        indexed when the store is created, and minima written by other
+        processes are picked up by update().  With None, the minima
+        are only kept in memory.
+    threshold: float
+        Structures are the same minimum if no atom is displaced by
+        more than threshold (see ComparePositions).
+    energy_tolerance: float or None
+        If given, minima with energies differing by more than this
+        are never considered the same.
+
+    The index puts each minimum in a cell given by its energy (in
+    steps of energy_tolerance) and by a coarse descriptor of its
+    distance fingerprint (see distance_fingerprint() and
+    fingerprint_cell()).  A lookup only compares the fingerprints of
+    the minima in the neighbouring cells, so its cost does not grow
+    with the number of minima as long as they are spread over many
+    cells, and only does the full comparison for those whose
+    fingerprints are within 2 threshold element by element.  Without
+    an energy tolerance no minimum that could be the same is skipped.
+    The number of fingerprints compared in the last lookup is kept in
+    ncompared."""
+
+    def __init__(self, filename=None, threshold=0.5, energy_tolerance=None):
+        self.filename = filename
+        self.threshold = threshold
+        self.energy_tolerance = energy_tolerance
+        self.compare = ComparePositions(translate=True)
+        self.db = None
+        if filename is not None and not filename.endswith('.traj'):
+            from ase.db import connect
+            self.db = connect(filename)
+        self.cells = {}  # (energy bucket, fingerprint cell) -> ids
+        self.fingerprints = {}
+        self.energies = {}
+        self.atoms = {}  # cache
+        self.nminima = 0
+        self.lastid = 0
+        self.ncompared = 0
+        self.update()
+
+    def __len__(self):
+        return self.nminima
+
+    def get_bucket(self, energy):
+        if self.energy_tolerance is None:
+            return 0
+        return int(np.floor(energy / self.energy_tolerance))
+
+    def get_width(self):
+        return 2 * self.threshold + 1e-8
+
+    def index(self, id, fingerprint, energy):
+        cell = ((self.get_bucket(energy),) +
+                fingerprint_cell(fingerprint, self.get_width()))
+        self.cells.setdefault(cell, []).append(id)
+        self.fingerprints[id] = fingerprint
+        self.energies[id] = energy
+        self.nminima += 1
+        self.lastid = max(self.lastid, id)
+
+    def update(self):
+        """Index minima written to the file by other processes."""
+        if self.filename is None:
+            return
+        if self.db is not None:
+            if not os.path.isfile(self.filename):
+                return
+            for row in self.db.select('id>%d' % self.lastid):
+                if 'fingerprint' in row.data:
+                    fingerprint = np.array(row.data['fingerprint'])
+                else:
+                    fingerprint = distance_fingerprint(row.toatoms())
+                self.index(row.id, fingerprint, row.get('energy'))
+        elif (os.path.isfile(self.filename) and
+              os.path.getsize(self.filename) > 0):
+            traj = io.Trajectory(self.filename, 'r')
+            for n in range(self.lastid, len(traj)):
+                atoms = traj[n]
+                self.index(n + 1, distance_fingerprint(atoms),
+                           atoms.get_potential_energy())
+
+    def add(self, atoms):
+        """Add a minimum and return its id."""
+        fingerprint = distance_fingerprint(atoms)
+        energy = atoms.get_potential_energy()
+        if self.db is not None:
+            id = self.db.write(atoms, data={'fingerprint': fingerprint})
+        else:
+            if self.filename is not None:
+                self.update()
+                traj = io.Trajectory(self.filename, 'a')
+                traj.write(atoms)
+                traj.close()
+            id = self.lastid + 1
+        self.atoms[id] = atoms.copy()
+        self.index(id, fingerprint, energy)
+        return id
+
+    def get_atoms(self, id):
+        """Return the minimum with the given id."""
+        if id not in self.atoms:
+            if self.db is not None:
+                self.atoms[id] = self.db.get_atoms(id=id)
+            else:
+                self.atoms[id] = io.read(self.filename, index=id - 1)
+        return self.atoms[id]
+
+    def candidates(self, atoms, energy=None):
+        """Ids of minima that could be the same as atoms."""
+        fingerprint = distance_fingerprint(atoms)
+        width = self.get_width()
+        if self.energy_tolerance is None:
+            buckets = [0]
+        else:
+            if energy is None:
+                energy = atoms.get_potential_energy()
+            b = self.get_bucket(energy)
+            buckets = [b - 1, b, b + 1]
+        cell = fingerprint_cell(fingerprint, width)
+        self.ncompared = 0
+        for b in buckets:
+            for shift in product([-1, 0, 1], repeat=len(cell)):
+                neighbour = (b,) + tuple(c + s for c, s in zip(cell, shift))
+                for id in self.cells.get(neighbour, []):
+                    if (self.energy_tolerance is not None and
+                        abs(self.energies[id] - energy) >
+                        self.energy_tolerance):
+                        continue
+                    self.ncompared += 1
+                    other = self.fingerprints[id]
+                    if (len(other) == len(fingerprint) and
+                        (len(other) == 0 or
+                         abs(other - fingerprint).max() <= width)):
+                        yield id
+
+    def find(self, atoms, energy=None):
+        """Find the closest known minimum.
+
+        Returns the id of a minimum within threshold (None if there is
+        none) and the largest atomic displacement to the closest of the
+        compared minima (infinity if no minimum could be close)."""
+        found = None
+        dmax_closest = np.inf
+        for id in self.candidates(atoms, energy):
+            dmax = self.compare(self.get_atoms(id), atoms)
+            if dmax < dmax_closest:
+                dmax_closest = dmax
+                if dmax < self.threshold:
+                    found = id
+        return found, dmax_closest
+
+
 class PassedMinimum:
     """Simple routine to find if a minimum in the potential energy surface
     has been passed. In its default settings, a minimum is found if the
@@ -1,16 +1,190 @@
 """Structure optimization. """
 
+import os
 import sys
 import pickle
 import time
+import threading
+import weakref
 from math import sqrt
 from os.path import isfile
 
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+try:
+    from inspect import signature
+except ImportError:  # Python 2
+    signature = None
+
 import numpy as np
 
+from ase.calculators.calculator import all_properties
+from ase.calculators.singlepoint import SinglePointCalculator
 from ase.parallel import rank, barrier
 from ase.io.trajectory import Trajectory
-import collections
+
+
+checkpoint_version = 1
+
+
+def atomic_dump(data, filename, fsync=False):
+    """Pickle data to a file, replacing it atomically.
+
+    The data goes to a temporary file in the same directory, which is
+    renamed to filename when complete.  A crash leaves either the old
+    or the new file, never a partial one.  With *fsync*, the data is
+    also forced to disk before the rename, which protects against
+    power loss but is slow on network file systems."""
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmpname, 'wb') as fd:
+        pickle.dump(data, fd, protocol=2)
+        fd.flush()
+        if fsync:
+            os.fsync(fd.fileno())
+    getattr(os, 'replace', os.rename)(tmpname, filename)
+
+
+def snapshot_atoms(atoms):
+    """Copy of atoms with the current results in a SinglePointCalculator.
+
+    Filters are replaced by the atoms they wrap (like Trajectory does)."""
+    while hasattr(atoms, 'atoms_for_saving'):
+        atoms = atoms.atoms_for_saving
+    if not hasattr(atoms, 'copy'):
+        raise TypeError('Can not make a snapshot of %r' % atoms)
+    copy = atoms.copy()
+    calc = atoms.get_calculator()
+    if calc is None:
+        return copy
+    if hasattr(calc, 'results') and hasattr(calc, 'check_state'):
+        if calc.check_state(atoms):
+            results = {}
+        else:
+            results = dict((name, value)
+                           for name, value in calc.results.items()
+                           if name in all_properties)
+    else:
+        results = {}
+        try:
+            results['energy'] = atoms.get_potential_energy()
+            results['forces'] = atoms.get_forces()
+        except NotImplementedError:
+            pass
+    copy.set_calculator(SinglePointCalculator(copy, **results))
+    return copy
+
+
+class ThrottledObserver:
+    """Observer called at most once every *seconds* of wall time.
+
+    If the last call was skipped and the dynamics has not taken a
+    step since, flush() makes the call."""
+    def __init__(self, function, seconds, dyn):
+        self.function = function
+        self.seconds = seconds
+        self.dyn = weakref.proxy(dyn)
+        self.last = None
+        self.pending = None
+
+    def __call__(self, *args, **kwargs):
+        t = time.time()
+        if self.last is not None and t - self.last < self.seconds:
+            self.pending = (self.dyn.nsteps, args, kwargs)
+            return
+        self.last = t
+        self.pending = None
+        self.function(*args, **kwargs)
+
+    def flush(self):
+        if self.pending is not None:
+            nsteps, args, kwargs = self.pending
+            self.pending = None
+            if nsteps == self.dyn.nsteps:
+                self.last = time.time()
+                self.function(*args, **kwargs)
+        if isinstance(self.function, AsyncObserver):
+            self.function.flush()
+
+
+def accepts_atoms(function, args, kwargs):
+    """Can function be called with args, kwargs and an atoms keyword?"""
+    if signature is None:
+        return True
+    try:
+        sig = signature(function)
+    except (TypeError, ValueError):
+        return False
+    kwargs = dict(kwargs)
+    kwargs['atoms'] = None
+    try:
+        sig.bind(*args, **kwargs)
+    except TypeError:
+        return False
+    return True
+
+
+class AsyncObserver:
+    """Observer called from a background writer thread.
+
+    Inside the dynamics loop only a snapshot is taken and put on a
+    bounded queue (the loop blocks if the writer falls more than
+    *maxsize* snapshots behind).  Observers that know what they need
+    can implement snapshot() and write_snapshot(data); other observers
+    must take an *atoms* keyword argument (like Trajectory.write) and
+    are called with a copy of the atoms (see snapshot_atoms).  Any
+    other observer is rejected by Dynamics.attach(), as it would read
+    the atoms while the dynamics moves them.
+
+    Errors raised in the writer thread are re-raised in the dynamics
+    loop on the next call or by flush()."""
+    def __init__(self, function, atoms, maxsize=64):
+        self.function = function
+        self.atoms = atoms
+        self.queue = Queue(maxsize)
+        self.thread = None
+        self.error = None
+
+    def __call__(self, *args, **kwargs):
+        self.check()
+        if hasattr(self.function, 'write_snapshot'):
+            data = self.function.snapshot()
+        else:
+            kwargs = dict(kwargs)
+            kwargs['atoms'] = snapshot_atoms(kwargs.get('atoms', self.atoms))
+            data = None
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.writer)
+            self.thread.daemon = True
+            self.thread.start()
+        self.queue.put((data, args, kwargs))
+
+    def writer(self):
+        while True:
+            data, args, kwargs = self.queue.get()
+            try:
+                if self.error is None:
+                    if hasattr(self.function, 'write_snapshot'):
+                        self.function.write_snapshot(data)
+                    else:
+                        self.function(*args, **kwargs)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until all snapshots have been written."""
+        self.queue.join()
+        self.check()
+
+    def check(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
 
 
 class Dynamics:
@@ -51,6 +225,8 @@ class Dynamics:
         
         self.observers = []
         self.nsteps = 0
+        self.logflushinterval = 1.0
+        self.logflushtime = 0.0
 
         if trajectory is not None:
             if isinstance(trajectory, str):
@@ -63,9 +239,10 @@ class Dynamics:
 
     def insert_observer(self, function, position=0, interval=1,
                         *args, **kwargs):
-        """Insert an observer."""
-        if not isinstance(function, collections.Callable):
-            function = function.write
+        """Insert an observer.
+
+        See attach() for the *async_* and *throttle* keywords."""
+        function = self.make_observer(function, args, kwargs)
         self.observers.insert(position, (function, interval, args, kwargs))
 
     def attach(self, function, interval=1, *args, **kwargs):
@@ -76,11 +253,42 @@ class Dynamics:
 
         If *interval <= 0*, after step *interval*, call *function* with
         arguments *args* and keyword arguments *kwargs*.  This is
-        currently zero indexed."""
+        currently zero indexed.
+
+        Two keywords are not passed on to *function*:
+
+        async_: bool
+            Call *function* from a background thread.  The loop only
+            takes a snapshot of the data (see AsyncObserver).  The
+            function must take an *atoms* keyword argument or implement
+            snapshot() and write_snapshot(); otherwise ValueError is
+            raised.
+        throttle: float
+            Call *function* at most once every *throttle* seconds
+            of wall time (in addition to *interval*).
+
+        Pending calls are finished when run() returns or when
+        flush() is called."""
 
+        function = self.make_observer(function, args, kwargs)
+        self.observers.append((function, interval, args, kwargs))
+
+    def make_observer(self, function, args, kwargs):
         if not hasattr(function, '__call__'):
             function = function.write
-        self.observers.append((function, interval, args, kwargs))
+        async_ = kwargs.pop('async_', False)
+        throttle = kwargs.pop('throttle', None)
+        if async_:
+            if not (hasattr(function, 'write_snapshot') or
+                    accepts_atoms(function, args, kwargs)):
+                raise ValueError(
+                    'Can not call %r asynchronously: it must take an atoms '
+                    'keyword argument or implement snapshot() and '
+                    'write_snapshot()' % (function,))
+            function = AsyncObserver(function, self.atoms)
+        if throttle is not None:
+            function = ThrottledObserver(function, throttle, self)
+        return function
 
     def call_observers(self):
         for function, interval, args, kwargs in self.observers:
@@ -96,6 +304,113 @@ class Dynamics:
             if call:
                 function(*args, **kwargs)
 
+    def flush(self):
+        """Finish pending observer calls and flush the logfile."""
+        for function, interval, args, kwargs in self.observers:
+            if isinstance(function, (AsyncObserver, ThrottledObserver)):
+                function.flush()
+        if self.logfile is not None:
+            self.logfile.flush()
+            self.logflushtime = time.time()
+
+    def get_state(self):
+        """Return the variables needed to continue the dynamics.
+
+        Subclasses add their own variables to the dictionary."""
+        atoms = self.atoms
+        while hasattr(atoms, 'atoms_for_saving'):
+            atoms = atoms.atoms_for_saving
+        if hasattr(atoms, 'arrays'):
+            state = {'positions': atoms.get_positions(),
+                     'cell': atoms.get_cell()}
+            if atoms.has('momenta'):
+                state['momenta'] = atoms.get_momenta()
+        else:
+            state = {'positions': atoms.get_positions()}
+        state['nsteps'] = self.nsteps
+        return state
+
+    def set_state(self, state):
+        """Restore variables returned by get_state()."""
+        self.nsteps = state['nsteps']
+        atoms = self.atoms
+        while hasattr(atoms, 'atoms_for_saving'):
+            atoms = atoms.atoms_for_saving
+        if hasattr(atoms, 'arrays'):
+            atoms.set_cell(state['cell'])
+            # Bypass the constraints; the positions were adjusted already:
+            atoms.positions = state['positions']
+            if 'momenta' in state:
+                atoms.set_array('momenta', state['momenta'])
+        else:
+            atoms.set_positions(state['positions'])
+
+    def get_observer_objects(self):
+        """Objects with get_state() and set_state() behind the observers.
+
+        For each observer, this is the object itself or the object of a
+        bound method (like Trajectory.write), or None."""
+        objects = []
+        for function, interval, args, kwargs in self.observers:
+            while isinstance(function, (ThrottledObserver, AsyncObserver)):
+                function = function.function
+            obj = getattr(function, '__self__', function)
+            if obj is self or not hasattr(obj, 'get_state'):
+                obj = None
+            objects.append(obj)
+        return objects
+
+    def write_checkpoint(self, filename):
+        """Write the state of the dynamics to a file.
+
+        The file holds the state of the dynamics and the atoms (see
+        get_state()), the state of numpy.random and the state of
+        observers that have a get_state() method, like trajectories
+        and MD loggers, so that they can be rewound to the checkpoint.
+        Attach the checkpoint after such observers.  The file is
+        replaced atomically, so an interrupted run always leaves a
+        complete checkpoint."""
+        for function, interval, args, kwargs in self.observers:
+            while isinstance(function, ThrottledObserver):
+                function = function.function
+            if isinstance(function, AsyncObserver):
+                function.flush()
+        observers = [obj.get_state() if obj is not None else None
+                     for obj in self.get_observer_objects()]
+        data = {'version': checkpoint_version,
+                'class': self.__class__.__name__,
+                'state': self.get_state(),
+                'random': np.random.get_state(),
+                'observers': observers}
+        if rank == 0:
+            atomic_dump(data, filename, fsync=True)
+
+    def read_checkpoint(self, filename):
+        """Continue from a file written by write_checkpoint()."""
+        with open(filename, 'rb') as fd:
+            data = pickle.load(fd)
+        if data.get('version') != checkpoint_version:
+            raise ValueError('Unsupported checkpoint version: %r' %
+                             data.get('version'))
+        if data['class'] != self.__class__.__name__:
+            raise ValueError('Checkpoint is for %s, not %s' %
+                             (data['class'], self.__class__.__name__))
+        self.set_state(data['state'])
+        np.random.set_state(data['random'])
+        for obj, state in zip(self.get_observer_objects(),
+                              data['observers']):
+            if state is not None and obj is not None:
+                obj.set_state(state)
+
+    def attach_checkpoint(self, filename, interval=1, seconds=None):
+        """Write a checkpoint every *interval* steps.
+
+        With *seconds*, checkpoints are written at most once every
+        *seconds* of wall time, and a last checkpoint is written when
+        run() returns.  Use read_checkpoint() to continue a run."""
+        self.attach(self.write_checkpoint, interval, filename,
+                    throttle=seconds)
+
 
 class Optimizer(Dynamics):
     """Base-class for all structure optimization classes."""
@@ -125,6 +440,12 @@ class Optimizer(Dynamics):
         """
         Dynamics.__init__(self, atoms, logfile, trajectory, master)
         self.restart = restart
+        self.dumped = None
+        self.restart_data = None
+        # Writing the restart file every step is slow for large systems:
+        self.restartinterval = 1.0
+        self.restarttime = 0.0
+        self.restartpending = False
 
         if restart is None or not isfile(restart):
             self.initialize()
@@ -144,15 +465,18 @@ class Optimizer(Dynamics):
 
         self.fmax = fmax
         step = 0
-        while step < steps:
-            f = self.atoms.get_forces()
-            self.log(f)
-            self.call_observers()
-            if self.converged(f):
-                return
-            self.step(f)
-            self.nsteps += 1
-            step += 1
+        try:
+            while step < steps:
+                f = self.atoms.get_forces()
+                self.log(f)
+                self.call_observers()
+                if self.converged(f):
+                    return
+                self.step(f)
+                self.nsteps += 1
+                step += 1
+        finally:
+            self.flush()
 
     def converged(self, forces=None):
         """Did the optimization converge?"""
@@ -171,14 +495,53 @@ class Optimizer(Dynamics):
             name = self.__class__.__name__
             self.logfile.write('%s: %3d  %02d:%02d:%02d %15.6f %12.4f\n' %
                                (name, self.nsteps, T[3], T[4], T[5], e, fmax))
-            self.logfile.flush()
+            # Flushing every step is slow for cheap potentials:
+            if time.time() - self.logflushtime >= self.logflushinterval:
+                self.logfile.flush()
+                self.logflushtime = time.time()
         
     def dump(self, data):
-        if rank == 0 and self.restart is not None:
-            pickle.dump(data, open(self.restart, 'wb'), protocol=2)
+        """Store the optimizer data for the restart file.
+
+        The file is written at most once every *restartinterval*
+        seconds of wall time, and when run() returns."""
+        self.dumped = data
+        if rank != 0 or self.restart is None:
+            return
+        if time.time() - self.restarttime >= self.restartinterval:
+            self.write_dump()
+        else:
+            self.restartpending = True
+
+    def write_dump(self):
+        atomic_dump(self.dumped, self.restart)
+        self.restarttime = time.time()
+        self.restartpending = False
+
+    def flush(self):
+        """Also write a pending restart file."""
+        Dynamics.flush(self)
+        if self.restartpending:
+            self.write_dump()
 
     def load(self):
-        return pickle.load(open(self.restart))
+        if self.restart_data is not None:
+            data = self.restart_data
+            self.restart_data = None
+            return data
+        return pickle.load(open(self.restart, 'rb'))
+
+    def get_state(self):
+        state = Dynamics.get_state(self)
+        state['optimizer'] = self.dumped
+        return state
+
+    def set_state(self, state):
+        Dynamics.set_state(self, state)
+        if state['optimizer'] is not None:
+            self.restart_data = state['optimizer']
+            self.read()
+            self.dumped = state['optimizer']
 
 
 class NDPoly:
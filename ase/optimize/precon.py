@@ -0,0 +1,285 @@
+"""Sparse preconditioners for structure optimization.
+
+A preconditioner P approximates the Hessian using only the
+connectivity of the atoms, so that steps along soft (long-wavelength
+or weakly bonded) directions become longer than steps along stiff
+ones.  P is built from a NeighborList as a sparse 3N x 3N matrix and
+applied through a sparse LU factorization::
+
+    from ase.optimize import LBFGS
+    from ase.optimize.precon import Exp
+    opt = LBFGS(atoms, precon=Exp(A=3.0))
+
+See:
+
+    D. Packwood, J. Kermode, L. Mones, N. Bernstein, J. Woolley,
+    N. Gould, C. Ortner and G. Csanyi,
+    A universal preconditioner for simulating condensed phase materials,
+    J. Chem. Phys. 144, 164109 (2016)
+
+The preconditioners need scipy.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from ase.constraints import FixAtoms
+from ase.data import covalent_radii
+from ase.calculators.neighborlist import NeighborList
+
+
+def estimate_nearest_neighbour_distance(atoms):
+    """Largest of the nearest-neighbour distances of all atoms."""
+    natoms = len(atoms)
+    rcut = 2.0
+    while True:
+        nl = NeighborList([rcut / 2] * natoms, skin=0.0,
+                          self_interaction=False, bothways=True)
+        nl.update(atoms)
+        nearest = np.empty(natoms)
+        for a in range(natoms):
+            neighbors, offsets = nl.get_neighbors(a)
+            if len(neighbors) == 0:
+                break
+            D = (atoms.positions[neighbors] + np.dot(offsets, atoms.cell) -
+                 atoms.positions[a])
+            nearest[a] = np.sqrt((D**2).sum(1).min())
+        else:
+            return nearest.max()
+        rcut *= 1.5
+        if rcut > 100.0:
+            raise ValueError('Could not find neighbours for all atoms')
+
+
+class Precon:
+    """Base class for sparse preconditioners.
+
+    Subclasses implement get_pairs_matrix(atoms, i, j, D, r) returning
+    the 3N x 3N sparse matrix for the pairs (i, j) with distance
+    vectors D and distances r.
+
+    rcut: float
+        Cutoff for the pairs entering the preconditioner.
+    skin: float
+        The matrix is only rebuilt when an atom has moved more than skin
+        since the last build.
+    """
+
+    def __init__(self, rcut=None, skin=1.0):
+        self.rcut = rcut
+        self.skin = skin
+        self.nl = None
+        self.P = None
+        self.solver = None
+
+    def get_cutoff(self, atoms):
+        return self.rcut
+
+    def make_precon(self, atoms):
+        """Build the preconditioner for the current configuration.
+
+        Nothing is done if the neighbor list does not need an update.
+        Returns True if P was rebuilt."""
+        if self.nl is None or len(self.nl.cutoffs) != len(atoms):
+            rcut = self.get_cutoff(atoms)
+            self.nl = NeighborList([rcut / 2] * len(atoms), skin=self.skin,
+                                   self_interaction=False, bothways=True)
+        if not self.nl.update(atoms) and self.P is not None:
+            return False
+
+        natoms = len(atoms)
+        i = np.repeat(np.arange(natoms),
+                      [len(n) for n in self.nl.neighbors])
+        j = np.concatenate(self.nl.neighbors).astype(int)
+        offsets = np.concatenate(self.nl.displacements)
+        D = atoms.positions[j] - atoms.positions[i] + np.dot(offsets,
+                                                               atoms.cell)
+        r = np.sqrt((D**2).sum(1))
+        P = self.get_pairs_matrix(atoms, i, j, D, r).tocsr()
+
+        # Fixed atoms are decoupled from the rest:
+        fixed = np.zeros(3 * natoms, bool)
+        for constraint in atoms.constraints:
+            if isinstance(constraint, FixAtoms):
+                fixed[3 * constraint.index[:, np.newaxis] +
+                      np.arange(3)] = True
+        if fixed.any():
+            from scipy import sparse
+            free = sparse.diags((~fixed).astype(float))
+            P = free * P * free + sparse.diags(fixed.astype(float))
+
+        from scipy.sparse.linalg import factorized
+        self.P = P.tocsc()
+        self.solver = factorized(self.P)
+        return True
+
+    def solve(self, x):
+        """Apply the inverse of the preconditioner to a vector."""
+        return self.solver(np.ascontiguousarray(x, float).ravel())
+
+    def dot(self, x):
+        """Apply the preconditioner to a vector."""
+        return self.P.dot(np.asarray(x, float).ravel())
+
+
+def laplacian(natoms, i, j, c, diagonal):
+    """Sparse 3N x 3N matrix from scalar pair coefficients.
+
+    The pair (i, j) contributes -c to the off-diagonal elements and
+    each atom gets the sum of its coefficients plus diagonal on the
+    diagonal.  The same matrix is used for x, y and z."""
+    from scipy import sparse
+    d = np.bincount(i, c, minlength=natoms) + diagonal
+    L = sparse.coo_matrix((np.concatenate([-c, d]),
+                           (np.concatenate([i, np.arange(natoms)]),
+                            np.concatenate([j, np.arange(natoms)]))),
+                          shape=(natoms, natoms))
+    return sparse.kron(L, sparse.identity(3))
+
+
+class Exp(Precon):
+    """Exponential preconditioner.
+
+    Pairs closer than rcut are coupled with the coefficient
+    mu exp(-A (r / r_NN - 1)), where r_NN is the nearest-neighbour
+    distance.
+
+    A: float
+        Decay of the coupling with distance.
+    r_NN: float
+        Nearest-neighbour distance.  Estimated from the first
+        configuration if not given.
+    rcut: float
+        Cutoff.  Default is 2 r_NN.
+    mu: float
+        Energy scale in eV/Ang^2.  If not given, it is estimated once
+        by comparing the change in forces for a smooth test
+        displacement with the preconditioner (this costs one or two
+        extra force calls).  Estimates below 1.0, or a failed fit,
+        give 1.0.
+    c_stab: float
+        Diagonal stabilization relative to mu.
+
+    Far from a minimum, for example for adatoms starting on top sites,
+    the preconditioner can cost force calls instead of saving them
+    (see ase/optimize/test/precon.py).
+    """
+
+    def __init__(self, A=3.0, r_NN=None, rcut=None, mu=None, c_stab=0.1,
+                 skin=1.0):
+        Precon.__init__(self, rcut, skin)
+        self.A = A
+        self.r_NN = r_NN
+        self.mu = mu
+        self.c_stab = c_stab
+
+    def get_cutoff(self, atoms):
+        if self.r_NN is None:
+            self.r_NN = estimate_nearest_neighbour_distance(atoms)
+        if self.rcut is None:
+            self.rcut = 2 * self.r_NN
+        return self.rcut
+
+    def get_pairs_matrix(self, atoms, i, j, D, r, mu=None):
+        if mu is None:
+            if self.mu is None:
+                self.mu = self.estimate_mu(atoms, i, j, D, r)
+            mu = self.mu
+        mask = r < self.rcut
+        c = mu * np.exp(-self.A * (r[mask] / self.r_NN - 1))
+        return laplacian(len(atoms), i[mask], j[mask], c, mu * self.c_stab)
+
+    def estimate_mu(self, atoms, i, j, D, r):
+        """Fit mu to the change of the forces for a test displacement."""
+        x0 = atoms.get_positions()
+        f0 = atoms.get_forces()
+        L = np.ptp(x0, axis=0) + 1.0
+        v = 0.01 * r.min() * np.sin(2 * np.pi * x0 / L)
+        atoms.set_positions(x0 + v)
+        v = atoms.get_positions() - x0  # constraints may have changed it
+        f1 = atoms.get_forces()
+        atoms.set_positions(x0)
+        P1 = self.get_pairs_matrix(atoms, i, j, D, r, mu=1.0)
+        vPv = np.vdot(v, P1.dot(v.ravel()))
+        if vPv <= 0.0:
+            return 1.0  # all atoms fixed
+        mu = np.vdot(v, f0 - f1) / vPv
+        if not np.isfinite(mu) or mu < 1.0:
+            return 1.0
+        return mu
+
+
+class FF(Precon):
+    """Bonded force-field preconditioner.
+
+    Each bond (i, j) contributes the Hessian of a harmonic spring with
+    force constant k along the bond direction.
+
+    bonds: list of (i, j, k) tuples
+        Explicit bonds and force constants.  If not given, atoms closer
+        than scale times the sum of their covalent radii are bonded
+        with the force constant k.
+    k: float
+        Default force constant in eV/Ang^2.
+    c_stab: float
+        Diagonal stabilization in eV/Ang^2.
+
+    The fixed force constants do not adapt to strongly distorted
+    structures; for the "island" system of ase/optimize/test/precon.py
+    LBFGS needs nearly twice as many force calls with FF as without.
+    """
+
+    def __init__(self, bonds=None, k=5.0, scale=1.2, c_stab=1.0, skin=1.0):
+        Precon.__init__(self, None, skin)
+        self.bonds = bonds
+        self.k = k
+        self.scale = scale
+        self.c_stab = c_stab
+
+    def get_cutoff(self, atoms):
+        if self.bonds is not None:
+            r = [atoms.get_distance(a, b, mic=True)
+                 for a, b, k in self.bonds]
+            return 1.01 * max(r)
+        return 2 * self.scale * covalent_radii[atoms.numbers].max()
+
+    def get_pairs_matrix(self, atoms, i, j, D, r):
+        from scipy import sparse
+        natoms = len(atoms)
+        if self.bonds is None:
+            radii = covalent_radii[atoms.numbers]
+            mask = r < self.scale * (radii[i] + radii[j])
+            k = np.zeros(len(i)) + self.k
+        else:
+            force_constants = {}
+            for a, b, kab in self.bonds:
+                force_constants[(a, b)] = kab
+                force_constants[(b, a)] = kab
+            k = np.array([force_constants.get(pair, 0.0)
+                          for pair in zip(i, j)])
+            mask = k > 0
+            # Only the shortest image of a bonded pair:
+            for n in np.nonzero(mask)[0]:
+                same = (i == i[n]) & (j == j[n]) & mask
+                mask[n] = r[n] <= r[same].min()
+        i = i[mask]
+        j = j[mask]
+        u = D[mask] / r[mask][:, np.newaxis]
+        blocks = k[mask][:, np.newaxis, np.newaxis] * (
+            u[:, :, np.newaxis] * u[:, np.newaxis, :])
+        # Each pair appears twice (bothways), so only the off-diagonal
+        # block of (i, j) and the diagonal block of i are added here:
+        c = np.arange(3)
+        rows = 3 * i[:, np.newaxis, np.newaxis] + c[:, np.newaxis] + 0 * c
+        cols = 3 * j[:, np.newaxis, np.newaxis] + c + 0 * c[:, np.newaxis]
+        diag_cols = (3 * i[:, np.newaxis, np.newaxis] + c +
+                     0 * c[:, np.newaxis])
+        data = np.concatenate([-blocks.ravel(), blocks.ravel(),
+                               np.zeros(3 * natoms) + self.c_stab])
+        rows = np.concatenate([rows.ravel(), rows.ravel(),
+                               np.arange(3 * natoms)])
+        cols = np.concatenate([cols.ravel(), diag_cols.ravel(),
+                               np.arange(3 * natoms)])
+        return sparse.coo_matrix((data, (rows, cols)),
+                                 shape=(3 * natoms, 3 * natoms))
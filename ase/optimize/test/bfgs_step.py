@@ -0,0 +1,34 @@
+"""Cost of a single optimizer step for growing systems.
+
+Compares BFGS (dense Hessian, diagonalized every step), InverseBFGS
+(dense inverse Hessian, O(N^2) update) and LBFGS.  The forces are
+calculated once outside the timing, so only the optimizer is timed."""
+from __future__ import print_function
+import time
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS, InverseBFGS, LBFGS
+
+nsteps = 5
+print('%6s %12s %12s %12s' % ('atoms', 'BFGS', 'InverseBFGS', 'LBFGS'))
+for n in [3, 5, 7, 9]:
+    atoms0 = bulk('Cu', 'fcc', a=3.6, cubic=True) * (n, n, n)
+    atoms0.rattle(0.05, seed=1)
+    times = []
+    for optimizer in [BFGS, InverseBFGS, LBFGS]:
+        if optimizer is BFGS and len(atoms0) > 1500:
+            times.append(float('nan'))
+            continue
+        atoms = atoms0.copy()
+        atoms.calc = EMT()
+        opt = optimizer(atoms, logfile=None)
+        t = 0.0
+        for i in range(nsteps):
+            f = atoms.get_forces()
+            t0 = time.time()
+            opt.step(f)
+            t += time.time() - t0
+            opt.nsteps += 1
+        times.append(t / nsteps)
+    print('%6d %12.4f %12.4f %12.4f' % ((len(atoms0),) + tuple(times)))
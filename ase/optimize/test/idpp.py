@@ -0,0 +1,35 @@
+"""Scaling of the IDPP interpolation with the number of atoms.
+
+Times NEB.idpp_interpolate() with all pairs and with a cutoff, using
+LBFGS (the default) and BFGS, for a vacancy hop in Cu slabs of
+increasing size."""
+from __future__ import print_function
+import time
+
+from ase.lattice.surface import fcc100
+from ase.neb import NEB
+from ase.optimize import BFGS, LBFGS
+
+print('%6s %-6s %8s %8s' % ('atoms', 'opt', 'all', 'cutoff'))
+for n in [4, 8, 12]:
+    initial = fcc100('Cu', size=(n, n, 4), vacuum=5.0)
+    final = initial.copy()
+    del initial[-1]
+    del final[-2]
+    images = [initial]
+    for i in range(5):
+        images.append(initial.copy())
+    images.append(final)
+    for optimizer in [LBFGS, BFGS]:
+        if optimizer is BFGS and len(initial) > 300:
+            continue
+        times = []
+        for cutoff in [None, 5.0]:
+            neb = NEB(images)
+            neb.interpolate()
+            t0 = time.time()
+            neb.idpp_interpolate(traj=None, log=None, optimizer=optimizer,
+                                 mic=True, cutoff=cutoff)
+            times.append(time.time() - t0)
+        print('%6d %-6s %8.2f %8.2f' % ((len(initial), optimizer.__name__) +
+                                        tuple(times)))
@@ -0,0 +1,90 @@
+"""Force calls needed with and without preconditioning.
+
+Relaxes a few standard EMT systems with LBFGS and FIRE, with and
+without the Exp and FF preconditioners of ase.optimize.precon, and
+prints the number of force calls (including those used for fitting mu
+in Exp).  Runs that need more force calls than the same optimizer
+without a preconditioner are marked with a star.  With EMT, the
+preconditioners lose for the island, whose adatoms start on top sites:
+there LBFGS+FF and FIRE+Exp need nearly twice as many force calls as
+LBFGS and FIRE without preconditioning."""
+from __future__ import print_function
+
+from ase.lattice import bulk
+from ase.lattice.surface import fcc100, fcc111, add_adsorbate
+from ase.constraints import FixAtoms
+from ase.calculators.emt import EMT
+from ase.optimize import LBFGS, FIRE
+from ase.optimize.precon import Exp, FF
+
+
+class CountingEMT(EMT):
+    ncalls = 0
+
+    def calculate(self, *args, **kwargs):
+        self.ncalls += 1
+        EMT.calculate(self, *args, **kwargs)
+
+
+def vacancy():
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (5, 5, 5)
+    del atoms[0]
+    atoms.rattle(0.05, seed=7)
+    return atoms
+
+
+def strained_bulk():
+    atoms = bulk('Al', 'fcc', a=4.05, cubic=True) * (8, 4, 4)
+    atoms.positions[:, 0] *= 1 + 0.02 * (atoms.positions[:, 0] /
+                                         atoms.cell[0, 0])
+    atoms.rattle(0.02, seed=8)
+    return atoms
+
+
+def adsorbate():
+    atoms = fcc100('Al', size=(5, 5, 6), vacuum=6.0)
+    add_adsorbate(atoms, 'Au', 1.7, 'hollow')
+    atoms.set_constraint(FixAtoms(mask=[atom.tag > 3 for atom in atoms]))
+    atoms.rattle(0.05, seed=9)
+    return atoms
+
+
+def island():
+    atoms = fcc111('Cu', size=(6, 6, 4), vacuum=6.0)
+    for x in range(3):
+        add_adsorbate(atoms, 'Cu', 2.1, position=(2.55 * x, 0.0))
+    atoms.set_constraint(FixAtoms(mask=[atom.tag > 2 for atom in atoms]))
+    return atoms
+
+
+optimizers = [('LBFGS', LBFGS, None),
+              ('LBFGS+Exp', LBFGS, Exp),
+              ('LBFGS+FF', LBFGS, FF),
+              ('FIRE', FIRE, None),
+              ('FIRE+Exp', FIRE, Exp)]
+
+print('%-14s' % 'system' + ''.join('%12s' % name
+                                    for name, opt, precon in optimizers))
+losses = []
+for system in [vacancy, strained_bulk, adsorbate, island]:
+    line = '%-14s' % system.__name__
+    reference = {}
+    for name, optimizer, precon in optimizers:
+        atoms = system()
+        atoms.calc = CountingEMT()
+        kwargs = {}
+        if precon is not None:
+            kwargs['precon'] = precon()
+        opt = optimizer(atoms, logfile=None, **kwargs)
+        opt.run(fmax=0.01, steps=1000)
+        n = atoms.calc.ncalls
+        if precon is None:
+            reference[optimizer] = n
+            line += '%12d' % n
+        elif n > reference[optimizer]:
+            losses.append('%s: %s' % (system.__name__, name))
+            line += '%11d*' % n
+        else:
+            line += '%12d' % n
+    print(line)
+print('Preconditioning loses for:', ', '.join(losses) or 'none')
@@ -23,6 +23,10 @@ from ase.parallel import rank, barrier
 from ase.dft import monkhorst_pack
 from ase.io.trajectory import Trajectory
 from ase.utils import opencew
+from ase.vibrations.displacements import (DisplacementStore, submit,
+                                          as_completed, apply_constraints,
+                                          get_symmetry_operations,
+                                          IrreducibleDisplacements)
 
 
 class Displacement:
@@ -40,8 +44,11 @@ class Displacement:
     
     """
 
+    # Properties needed by get_output():
+    properties = []
+
     def __init__(self, atoms, calc=None, supercell=(1, 1, 1), name=None,
-                 delta=0.01, refcell=None):
+                 delta=0.01, refcell=None, store=None, symmetry=False):
         """Init with an instance of class ``Atoms`` and a calculator.
 
         Parameters
@@ -61,6 +68,15 @@ class Displacement:
             Reference cell in which the atoms will be displaced. If ``None``,
             corner cell in supercell is used. If ``str``, cell in the center of
             the supercell is used.
+        store: str or DisplacementStore
+            Name of an AFF file (see ase.io.aff) for the output of all
+            displacements.  Default is one pickle file per displacement.
+        symmetry: bool
+            Use the symmetry of the supercell to calculate only the
+            irreducible displacements.  The other ones are obtained by
+            rotating the forces (this is only done by ``Phonons.read``).
+            Fixed atoms (FixAtoms) are only mapped onto fixed atoms;
+            other constraints can not be combined with symmetry.
 
         """
 
@@ -73,6 +89,11 @@ class Displacement:
         self.name = name
         self.delta = delta
         self.N_c = supercell
+        if isinstance(store, str):
+            store = DisplacementStore(store)
+        self.store = store
+        self.symmetry = symmetry
+        self.reduction = None
 
         # Reference cell offset
         if refcell is None:
@@ -129,7 +150,37 @@ class Displacement:
 
         return R_cN
     
-    def run(self):
+    def get_reduction(self):
+        """Irreducible displacements (see IrreducibleDisplacements).
+
+        The atoms are numbered as in the supercell."""
+        if self.reduction is None:
+            offset = len(self.atoms) * self.offset
+            operations = get_symmetry_operations(self.atoms, self.N_c)
+            self.reduction = IrreducibleDisplacements(
+                operations, [offset + a for a in self.indices])
+        return self.reduction
+
+    def displacements(self, symmetry=None):
+        """Yield key, atom, direction and sign of all displacements.
+
+        The first one is the equilibrium structure with key 'eq'.  With
+        symmetry, only the irreducible displacements are included."""
+        if symmetry is None:
+            symmetry = self.symmetry
+        if symmetry:
+            offset = len(self.atoms) * self.offset
+            needed = set((a - offset, i) for a, i in
+                         self.get_reduction().displacements)
+        yield 'eq', None, None, 0
+        for a in self.indices:
+            for i in range(3):
+                if symmetry and (a, i) not in needed:
+                    continue
+                for sign in [-1, 1]:
+                    yield '%d%s%s' % (a, 'xyz'[i], ' +-'[sign]), a, i, sign
+
+    def run(self, pool=None, executor=None):
         """Run the calculations for the required displacements.
 
         This will do a calculation for 6 displacements per atom, +-x, +-y, and
@@ -138,6 +189,16 @@ class Displacement:
         file (ending with .pckl), which must be deleted before restarting the
         job. Otherwise the calculation for that displacement will not be done.
 
+        If a JobPool (see ase.calculators.calculator) is given, the
+        calculations are submitted to the pool with the submit() method of
+        the calculator (a FileIOCalculator) and run concurrently.  This
+        requires derived classes to implement ``get_output``.
+
+        If an executor (e.g. a ProcessPoolExecutor from the
+        concurrent.futures module) is given, the calculations are done
+        concurrently by its workers, each with its own copy of the
+        calculator.  This also requires ``get_output``.
+
         """
 
         # Atoms in the supercell -- repeated in the lattice vector directions
@@ -147,20 +208,9 @@ class Displacement:
         # Set calculator if provided
         assert self.calc is not None, "Provide calculator in __init__ method"
         atoms_N.set_calculator(self.calc)
-        
-        # Do calculation on equilibrium structure
-        filename = self.name + '.eq.pckl'
 
-        fd = opencew(filename)
-        if fd is not None:
-            # Call derived class implementation of __call__
-            output = self.__call__(atoms_N)
-            # Write output to file
-            if rank == 0:
-                pickle.dump(output, fd)
-                sys.stdout.write('Writing %s\n' % filename)
-                fd.close()
-            sys.stdout.flush()
+        # Submitted calculations:
+        jobs = []
 
         # Positions of atoms to be displaced in the reference cell
         natoms = len(self.atoms)
@@ -168,46 +218,98 @@ class Displacement:
         pos = atoms_N.positions[offset: offset + natoms].copy()
         
         # Loop over all displacements
-        for a in self.indices:
-            for i in range(3):
-                for sign in [-1, 1]:
-                    # Filename for atomic displacement
-                    filename = '%s.%d%s%s.pckl' % \
-                               (self.name, a, 'xyz'[i], ' +-'[sign])
-                    # Wait for ranks before checking for file
-                    # barrier()
-                    fd = opencew(filename)
-                    if fd is None:
-                        # Skip if already done
-                        continue
-
-                    # Update atomic positions
-                    atoms_N.positions[offset + a, i] = \
-                        pos[a, i] + sign * self.delta
-                    
-                    # Call derived class implementation of __call__
-                    output = self.__call__(atoms_N)
-                    # Write output to file
-                    if rank == 0:
-                        pickle.dump(output, fd)
-                        sys.stdout.write('Writing %s\n' % filename)
-                        fd.close()
-                    sys.stdout.flush()
-                    # Return to initial positions
-                    atoms_N.positions[offset + a, i] = pos[a, i]
-        
+        displacements = list(self.displacements())
+        self.progress = [0, len(displacements)]
+        for key, a, i, sign in displacements:
+            fd = self.claim(key)
+            if fd is None:
+                # Skip if already done
+                self.progress[0] += 1
+                continue
+
+            if a is None:
+                # Equilibrium structure
+                self.start(atoms_N, key, fd, jobs, pool, executor)
+                continue
+
+            # Update atomic positions
+            atoms_N.positions[offset + a, i] = \
+                pos[a, i] + sign * self.delta
+            
+            self.start(atoms_N, key, fd, jobs, pool, executor)
+
+            # Return to initial positions
+            atoms_N.positions[offset + a, i] = pos[a, i]
+
+        for key, fd, future, atoms in as_completed(jobs):
+            results = apply_constraints(atoms, future.result())
+            self.write_output(key, fd, self.get_output(results))
+
+    def get_filename(self, key):
+        return '%s.%s.pckl' % (self.name, key)
+
+    def claim(self, key):
+        """Claim a displacement for calculation.
+
+        Returns None if it is already done (or being done by another
+        process), otherwise an open file (or the store) for the output."""
+        if self.store is not None:
+            if key in self.store:
+                return None
+            return self.store
+        return opencew(self.get_filename(key))
+
+    def start(self, atoms_N, key, fd, jobs, pool, executor=None):
+        """Calculate now or submit calculation to pool or executor."""
+        if executor is not None:
+            future = submit(executor, atoms_N, self.calc, self.properties)
+            jobs.append((key, fd, future, atoms_N.copy()))
+        elif pool is None:
+            # Call derived class implementation of __call__
+            self.write_output(key, fd, self.__call__(atoms_N))
+        else:
+            future = self.calc.submit(atoms_N, self.properties, pool=pool)
+            jobs.append((key, fd, future, atoms_N.copy()))
+
+    def write_output(self, key, fd, output):
+        """Write output to file or store."""
+        self.progress[0] += 1
+        if self.store is not None:
+            self.store.write(key, {'output': output})
+            filename = '%s in %s' % (key, self.store.filename)
+        else:
+            filename = self.get_filename(key)
+        if rank == 0:
+            if self.store is None:
+                pickle.dump(output, fd)
+                fd.close()
+            sys.stdout.write('Writing %s [%d/%d]\n' %
+                             ((filename,) + tuple(self.progress)))
+        sys.stdout.flush()
+
+    def load(self, key):
+        """Return output of a displacement."""
+        if self.store is not None:
+            return self.store.read(key)['output']
+        return pickle.load(open(self.get_filename(key), 'rb'))
+
+    def get_output(self, results):
+        """Return output of ``__call__`` from the results of a submitted
+        calculation."""
+
+        raise NotImplementedError("Implement in derived classes!.")
+
     def clean(self):
-        """Delete generated pickle files."""
-        
-        if isfile(self.name + '.eq.pckl'):
-            remove(self.name + '.eq.pckl')
-        
-        for a in self.indices:
-            for i in 'xyz':
-                for sign in '-+':
-                    name = '%s.%d%s%s.pckl' % (self.name, a, i, sign)
-                    if isfile(name):
-                        remove(name)
+        """Delete generated pickle files (or the store)."""
+
+        if self.store is not None:
+            self.store.remove()
+            return
+
+        for key, a, i, sign in self.displacements(symmetry=False):
+            name = self.get_filename(key)
+            if isfile(name):
+                remove(name)
 
 
 class Phonons(Displacement):
@@ -274,6 +376,8 @@ class Phonons(Displacement):
 
     """
 
+    properties = ['forces']
+
     def __init__(self, *args, **kwargs):
         """Initialize with base class args and kwargs."""
 
@@ -298,11 +402,15 @@ class Phonons(Displacement):
 
         return forces
 
+    def get_output(self, results):
+        """Return forces from the results of a submitted calculation."""
+
+        return results['forces']
+
     def check_eq_forces(self):
         """Check maximum size of forces in the equilibrium structure."""
 
-        fname = '%s.eq.pckl' % self.name
-        feq_av = pickle.load(open(fname))
+        feq_av = self.load('eq')
 
         fmin = feq_av.max()
         fmax = feq_av.min()
@@ -393,22 +501,36 @@ class Phonons(Displacement):
         # of eV / Ang**2
         C_xNav = np.empty((natoms * 3, N, natoms, 3), dtype=float)
 
-        # Loop over all atomic displacements and calculate force constants
-        for i, a in enumerate(self.indices):
-            for j, v in enumerate('xyz'):
-                # Atomic forces for a displacement of atom a in direction v
-                basename = '%s.%d%s' % (self.name, a, v)
-                fminus_av = pickle.load(open(basename + '-.pckl'))
-                fplus_av = pickle.load(open(basename + '+.pckl'))
+        def derivative(a, j):
+            # Atomic forces for a displacement of atom a in direction j
+            basename = '%d%s' % (a, 'xyz'[j])
+            fminus_av = self.load(basename + '-')
+            fplus_av = self.load(basename + '+')
+            
+            if method == 'frederiksen':
+                fminus_av[a] -= fminus_av.sum(0)
+                fplus_av[a]  -= fplus_av.sum(0)
                 
-                if method == 'frederiksen':
-                    fminus_av[a] -= fminus_av.sum(0)
-                    fplus_av[a]  -= fplus_av.sum(0)
-                    
-                # Finite difference derivative
-                C_av = fminus_av - fplus_av
-                C_av /= 2 * self.delta
+            # Finite difference derivative
+            C_av = fminus_av - fplus_av
+            C_av /= 2 * self.delta
+            return [C_av]
 
+        # Loop over all atomic displacements and calculate force constants
+        if self.symmetry:
+            # Derivatives of the irreducible displacements rotated to all
+            # the others (the atoms are numbered as in the supercell):
+            offset = len(self.atoms) * self.offset
+            C_axav = self.get_reduction().reconstruct(
+                lambda a, j: derivative(a - offset, j))
+            C_axav = dict((a - offset, C_xav)
+                          for a, C_xav in C_axav.items())
+        else:
+            C_axav = dict((a, [derivative(a, j) for j in range(3)])
+                          for a in self.indices)
+        for i, a in enumerate(self.indices):
+            for j in range(3):
+                C_av = C_axav[a][j][0]
                 # Slice out included atoms
                 C_Nav = C_av.reshape((N, len(self.atoms), 3))[:, self.indices]
                 index = 3*i + j
@@ -534,7 +656,8 @@ class Phonons(Displacement):
         
         return self.C_N
     
-    def band_structure(self, path_kc, modes=False, born=False, verbose=True):
+    def band_structure(self, path_kc, modes=False, born=False, verbose=True,
+                       chunksize=None, executor=None):
         """Calculate phonon dispersion along a path in the Brillouin zone.
 
         The dynamical matrix at arbitrary q-vectors is obtained by Fourier
@@ -560,6 +683,12 @@ class Phonons(Displacement):
             between the LO and TO branches for q -> 0.
         verbose: bool
             Print warnings when imaginary frequncies are detected.
+        chunksize: int
+            Number of q-vectors whose dynamical matrices are built and
+            diagonalized together.  Default is as many as fit in 64 MB.
+        executor: Executor
+            Diagonalize the chunks concurrently with an executor from
+            the concurrent.futures module.
         
         """
 
@@ -568,64 +697,48 @@ class Phonons(Displacement):
             assert self.Z_avv is not None
             assert self.eps_vv is not None
 
+        path_kc = np.asarray(path_kc, float).reshape((-1, 3))
+
         # Lattice vectors -- ordered as illustrated in class docstring
         R_cN = self.lattice_vectors()
 
-        # Dynamical matrix in real-space
-        D_N = self.D_N
-        
-        # Lists for frequencies and modes along path
-        omega_kl = []
-        u_kl = []
+        nx = self.D_N.shape[1]
+        if chunksize is None:
+            chunksize = max(1, 2**26 // (16 * nx**2))
+        chunks = [path_kc[k:k + chunksize]
+                  for k in range(0, len(path_kc), chunksize)]
+        # The non-analytic part is only built for one chunk at a time:
+        args = ((q_kc, self.D_N, R_cN,
+                 self.non_analytic(q_kc) if born else None, modes)
+                for q_kc in chunks)
+        if executor is None:
+            results = [diagonalize_dynamical_matrices(*arg) for arg in args]
+        else:
+            futures = [executor.submit(diagonalize_dynamical_matrices, *arg)
+                       for arg in args]
+            results = [future.result() for future in futures]
 
-        # Reciprocal basis vectors for use in non-analytic contribution
-        reci_vc = 2 * pi * la.inv(self.atoms.cell)
-        # Unit cell volume in Bohr^3
-        vol = abs(la.det(self.atoms.cell)) / units.Bohr**3
+        if modes:
+            omega2_kl = np.concatenate([omega2_kl for omega2_kl, u_kxl
+                                        in results])
+            u_kxl = np.concatenate([u_kxl for omega2_kl, u_kxl in results])
+            # Sort eigenmodes according to eigenvalues (see below) and
+            # multiply with mass prefactor
+            order_kl = omega2_kl.argsort(axis=1)
+            u_kxl = u_kxl[np.arange(len(path_kc))[:, np.newaxis, np.newaxis],
+                          np.arange(nx)[:, np.newaxis], order_kl[:, np.newaxis]]
+            u_klx = (self.m_inv_x[:, np.newaxis] * u_kxl).swapaxes(1, 2)
+            u_kl = u_klx.reshape((len(path_kc), nx, len(self.indices), 3))
+        else:
+            omega2_kl = np.concatenate(results)
 
-        for q_c in path_kc:
-           
-            # Add non-analytic part
-            if born:
-                # q-vector in cartesian coordinates
-                q_v = np.dot(reci_vc, q_c)
-                # Non-analytic contribution to force constants in atomic units
-                qdotZ_av = np.dot(q_v, self.Z_avv).ravel()
-                C_na = 4 * pi * np.outer(qdotZ_av, qdotZ_av) / \
-                       np.dot(q_v, np.dot(self.eps_vv, q_v)) / vol
-                self.C_na = C_na / units.Bohr**2 * units.Hartree
-                # Add mass prefactor and convert to eV / (Ang^2 * amu)
-                M_inv = np.outer(self.m_inv_x, self.m_inv_x)
-                D_na = C_na * M_inv / units.Bohr**2 * units.Hartree
-                self.D_na = D_na
-                D_N = self.D_N + D_na / np.prod(self.N_c)
-
-            ## if np.prod(self.N_c) == 1:
-            ##
-            ##     q_av = np.tile(q_v, len(self.indices))
-            ##     q_xx = np.vstack([q_av]*len(self.indices)*3)
-            ##     D_m += q_xx
-
-            # Evaluate fourier sum
-            phase_N = np.exp(-2.j * pi * np.dot(q_c, R_cN))
-            D_q = np.sum(phase_N[:, np.newaxis, np.newaxis] * D_N, axis=0)
-
-            if modes:
-                omega2_l, u_xl = la.eigh(D_q, UPLO='U')
-                # Sort eigenmodes according to eigenvalues (see below) and
-                # multiply with mass prefactor
-                u_lx = (self.m_inv_x[:, np.newaxis] *
-                        u_xl[:, omega2_l.argsort()]).T.copy()
-                u_kl.append(u_lx.reshape((-1, len(self.indices), 3)))
-            else:
-                omega2_l = la.eigvalsh(D_q, UPLO='U')
-
-            # Sort eigenvalues in increasing order
-            omega2_l.sort()
-            # Use dtype=complex to handle negative eigenvalues
-            omega_l = np.sqrt(omega2_l.astype(complex))
-
-            # Take care of imaginary frequencies
+        # Sort eigenvalues in increasing order
+        omega2_kl.sort(axis=1)
+        # Use dtype=complex to handle negative eigenvalues
+        omega_kl = np.sqrt(omega2_kl.astype(complex))
+
+        # Take care of imaginary frequencies
+        for q_c, omega2_l, omega_l in zip(path_kc, omega2_kl, omega_kl):
             if not np.all(omega2_l >= 0.):
                 indices = np.where(omega2_l < 0)[0]
 
@@ -637,18 +750,44 @@ class Phonons(Displacement):
                 
                 omega_l[indices] = -1 * np.sqrt(np.abs(omega2_l[indices].real))
 
-            omega_kl.append(omega_l.real)
-
         # Conversion factor: sqrt(eV / Ang^2 / amu) -> eV
         s = units._hbar * 1e10 / sqrt(units._e * units._amu)
-        omega_kl = s * np.asarray(omega_kl)
+        omega_kl = s * omega_kl.real
         
         if modes:
-            return omega_kl, np.asarray(u_kl)
+            return omega_kl, u_kl
         
         return omega_kl
 
-    def dos(self, kpts=(10, 10, 10), npts=1000, delta=1e-3, indices=None):
+    def non_analytic(self, q_qc):
+        """Non-analytic part of the dynamical matrices at q-vectors.
+
+        Given by the Born effective charges and the static part of the
+        high-frequency dielectric tensor.  The force constants and
+        dynamical matrix of the last q-vector are stored as C_na and
+        D_na."""
+
+        # Reciprocal basis vectors
+        reci_vc = 2 * pi * la.inv(self.atoms.cell)
+        # Unit cell volume in Bohr^3
+        vol = abs(la.det(self.atoms.cell)) / units.Bohr**3
+        # q-vectors in cartesian coordinates
+        q_qv = np.dot(q_qc, reci_vc.T)
+        # Non-analytic contribution to force constants in atomic units
+        qdotZ_qx = np.dot(q_qv, self.Z_avv).reshape((len(q_qc), -1))
+        qepsq_q = np.einsum('qv,vw,qw->q', q_qv, self.eps_vv, q_qv)
+        C_na = (4 * pi * qdotZ_qx[:, :, np.newaxis] *
+                qdotZ_qx[:, np.newaxis, :] /
+                qepsq_q[:, np.newaxis, np.newaxis] / vol)
+        self.C_na = C_na[-1] / units.Bohr**2 * units.Hartree
+        # Add mass prefactor and convert to eV / (Ang^2 * amu)
+        M_inv = np.outer(self.m_inv_x, self.m_inv_x)
+        D_na = C_na * M_inv / units.Bohr**2 * units.Hartree
+        self.D_na = D_na[-1]
+        return D_na
+
+    def dos(self, kpts=(10, 10, 10), npts=1000, delta=1e-3, indices=None,
+            method='lorentzian', executor=None):
         """Calculate phonon dos as a function of energy.
 
         Parameters
@@ -662,6 +801,12 @@ class Phonons(Displacement):
         indices: list
             If indices is not None, the atomic-partial dos for the specified
             atoms will be calculated.
+        method: str
+            'lorentzian' for a sum of Lorentzians or 'histogram' for the
+            number of frequencies between the energy points (no
+            broadening).
+        executor: Executor
+            Passed on to ``band_structure``.
             
         """
 
@@ -669,16 +814,26 @@ class Phonons(Displacement):
         kpts_kc = monkhorst_pack(kpts)
         N = np.prod(kpts)
         # Get frequencies
-        omega_kl = self.band_structure(kpts_kc)
+        omega_x = self.band_structure(kpts_kc, executor=executor).ravel()
         # Energy axis and dos
-        omega_e = np.linspace(0., np.amax(omega_kl) + 5e-3, num=npts)
+        omega_e = np.linspace(0., np.amax(omega_x) + 5e-3, num=npts)
+
+        if method == 'histogram':
+            de = omega_e[1] - omega_e[0]
+            edges = np.append(omega_e - 0.5 * de, omega_e[-1] + 0.5 * de)
+            dos_e = np.histogram(omega_x, edges)[0] / (N * de)
+            return omega_e, dos_e
+
+        assert method == 'lorentzian'
         dos_e = np.zeros_like(omega_e)
        
-        # Sum up contribution from all q-points and branches
-        for omega_l in omega_kl:
-            diff_el = (omega_e[:, np.newaxis] - omega_l[np.newaxis, :])**2
-            dos_el = 1. / (diff_el + (0.5 * delta)**2)
-            dos_e += dos_el.sum(axis=1)
+        # Sum up contribution from all q-points and branches in chunks of
+        # frequencies
+        chunksize = max(1, 2**22 // npts)
+        for x in range(0, len(omega_x), chunksize):
+            diff_ex = (omega_e[:, np.newaxis] -
+                       omega_x[np.newaxis, x:x + chunksize])**2
+            dos_e += (1. / (diff_ex + (0.5 * delta)**2)).sum(axis=1)
 
         dos_e *= 1. / (N * pi) * 0.5 * delta
         
@@ -755,3 +910,22 @@ class Phonons(Displacement):
                 traj.write(atoms)
                 
             traj.close()
+
+
+def diagonalize_dynamical_matrices(q_qc, D_N, R_cN, D_na_qxx=None,
+                                   modes=False):
+    """Eigenvalues (and eigenvectors) of the dynamical matrices at q_qc.
+
+    D_N is the dynamical matrix in real space for the lattice vectors
+    R_cN and D_na_qxx an optional non-analytic part for each q-vector."""
+
+    # Evaluate fourier sums for all q-vectors at once
+    phase_qN = np.exp(-2.j * pi * np.dot(q_qc, R_cN))
+    D_qxx = np.dot(phase_qN, D_N.reshape((len(D_N), -1)))
+    D_qxx.shape = (len(q_qc),) + D_N.shape[1:]
+    if D_na_qxx is not None:
+        D_qxx += (phase_qN.sum(1)[:, np.newaxis, np.newaxis] * D_na_qxx /
+                  len(D_N))
+    if modes:
+        return la.eigh(D_qxx, UPLO='U')
+    return la.eigvalsh(D_qxx, UPLO='U')
@@ -0,0 +1,95 @@
+import time
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.io import Trajectory, read
+from ase.md.verlet import VelocityVerlet
+from ase.optimize import BFGS
+from ase import units
+
+
+def md(**kwargs):
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+    atoms.calc = EMT()
+    atoms.rattle(0.1, seed=1)
+    dyn = VelocityVerlet(atoms, 5 * units.fs)
+    traj = Trajectory('md-%d.traj' % len(kwargs), 'w', atoms)
+    dyn.attach(traj, **kwargs)
+    dyn.run(20)
+    traj.close()
+
+md()
+md(async_=True)
+images1 = read('md-0.traj', ':')
+images2 = read('md-1.traj', ':')
+assert len(images1) == len(images2) == 20
+for a1, a2 in zip(images1, images2):
+    assert abs(a1.positions - a2.positions).max() == 0
+    assert abs(a1.get_momenta() - a2.get_momenta()).max() == 0
+    assert a1.get_potential_energy() == a2.get_potential_energy()
+    assert abs(a1.get_forces() - a2.get_forces()).max() == 0
+
+
+# Throttled observer: only the first call (the last step is not made
+# up for, since the atoms have moved after it):
+atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+atoms.rattle(0.1, seed=1)
+atoms.calc = EMT()
+opt = BFGS(atoms, logfile=open('opt.log', 'w'))
+steps = []
+opt.attach(lambda: steps.append(opt.nsteps), throttle=3600.0)
+opt.attach(lambda atoms: time.sleep(0.001), async_=True)
+opt.run(fmax=0.01, steps=10)
+assert steps == [0], steps
+assert len(open('opt.log').readlines()) == 10
+
+# ... but when the optimization converges, the final state is observed:
+steps2 = []
+opt.attach(lambda: steps2.append(opt.nsteps), throttle=3600.0)
+opt.run(fmax=0.5)
+assert steps2 == [10, opt.nsteps], steps2
+
+
+# Asynchronous MD logging gives the same log:
+def mdlog(name, **kwargs):
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+    atoms.rattle(0.1, seed=2)
+    atoms.calc = EMT()
+    dyn = VelocityVerlet(atoms, 5 * units.fs)
+    from ase.md import MDLogger
+    logger = MDLogger(dyn, atoms, name, mode='w')
+    dyn.attach(logger, **kwargs)
+    dyn.run(10)
+    logger.close()
+    return open(name).read()
+
+assert mdlog('md1.log') == mdlog('md2.log', async_=True)
+
+
+# Errors in the writer thread show up in the loop:
+def fail(atoms):
+    raise RuntimeError('disk full')
+
+dyn = VelocityVerlet(atoms, 5 * units.fs)
+dyn.attach(fail, async_=True)
+try:
+    dyn.run(5)
+except RuntimeError:
+    pass
+else:
+    assert False
+
+
+# Observers that can not take a snapshot of the atoms are rejected:
+def count(n):
+    pass
+
+for function, args in [(lambda: None, ()), (count, (1,)),
+                       (lambda atoms: None, (atoms,))]:
+    try:
+        dyn.attach(function, 1, *args, async_=True)
+    except ValueError:
+        pass
+    else:
+        assert False
+dyn.attach(lambda n, atoms=None: None, 1, 2, async_=True)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from ase.lattice import bulk
+from ase.calculators.lj import LennardJones
+
+atoms = bulk('Ar', 'fcc', a=1.55) * (2, 2, 2)
+v0 = atoms.get_versions()
+atoms.rattle()
+v1 = atoms.get_versions()
+assert v1['positions'] != v0['positions']
+assert all(v1[name] == v0[name] for name in v0 if name != 'positions')
+atoms.set_cell(atoms.cell * 1.01, scale_atoms=True)
+v2 = atoms.get_versions()
+assert v2['cell'] != v1['cell'] and v2['positions'] != v1['positions']
+atoms.set_initial_magnetic_moments([1.0] * len(atoms))
+atoms[0].charge = 0.5
+v3 = atoms.get_versions()
+assert v3['initial_magmoms'] != v2['initial_magmoms']
+assert v3['initial_charges'] != v2['initial_charges']
+assert atoms.copy().get_versions()['positions'] != v3['positions']
+
+
+class CountingLJ(LennardJones):
+    track_changes = True
+    ncalcs = 0
+
+    def calculate(self, *args, **kwargs):
+        self.ncalcs += 1
+        LennardJones.calculate(self, *args, **kwargs)
+
+atoms.calc = CountingLJ()
+e1 = atoms.get_potential_energy()
+f1 = atoms.get_forces()
+assert atoms.calc.ncalcs == 1
+assert not atoms.calc.atoms.constraints
+atoms.set_momenta(np.ones((len(atoms), 3)))
+atoms.get_potential_energy()
+assert atoms.calc.ncalcs == 1
+
+atoms.rattle(0.01, seed=1)
+e2 = atoms.get_potential_energy()
+assert atoms.calc.ncalcs == 2 and e2 != e1
+
+# In-place changes need touch():
+atoms.positions[0] += 0.05
+atoms.get_potential_energy()
+assert atoms.calc.ncalcs == 2
+atoms.touch('positions')
+e3 = atoms.get_potential_energy()
+assert atoms.calc.ncalcs == 3 and e3 != e2
+assert atoms.calc.check_state(atoms) == []
+
+calc = LennardJones()
+atoms.calc = calc
+assert abs(atoms.get_potential_energy() - e3) < 1e-12
@@ -0,0 +1,87 @@
+import numpy as np
+
+from ase.lattice import bulk
+from ase.constraints import FixAtoms
+from ase.calculators.lj import LennardJones
+from ase.calculators.pairpotential import PairPotential, LennardJonesTerm
+from ase.md.batch import BatchVelocityVerlet, BatchLangevin
+from ase.md.verlet import VelocityVerlet
+from ase.md.langevin import Langevin
+from ase.io import Trajectory, read
+
+atoms0 = bulk('Ar', 'fcc', a=1.55, cubic=True) * (2, 2, 2)
+atoms0.pbc = False
+atoms0.set_masses(np.ones(len(atoms0)))
+
+
+def replicas(n):
+    images = []
+    for r in range(n):
+        atoms = atoms0.copy()
+        atoms.rattle(0.05, seed=r)
+        images.append(atoms)
+    return images
+
+# Same trajectories as one replica at a time, with a neighbor list
+# (LennardJones) and with all pairs (no cutoff):
+for calc in [LennardJones, lambda: PairPotential(pairs=LennardJonesTerm())]:
+    images = replicas(3)
+    single = [atoms.copy() for atoms in images]
+    fixed = images[1].positions[:2].copy()
+    images[1].set_constraint(FixAtoms(indices=[0, 1]))
+    single[1].set_constraint(FixAtoms(indices=[0, 1]))
+    dyn = BatchVelocityVerlet(images, 0.005, calculator=calc())
+    traj = Trajectory('batch.traj', 'w', images[2])
+    dyn.attach(traj, interval=5)
+    dyn.run(20)
+    traj.close()
+    for atoms, atoms1 in zip(images, single):
+        atoms1.calc = calc()
+        VelocityVerlet(atoms1, 0.005).run(20)
+        assert abs(atoms.positions - atoms1.positions).max() < 1e-10
+        assert abs(atoms.get_forces() - atoms1.get_forces()).max() < 1e-9
+        assert abs(atoms.get_potential_energy() -
+                   atoms1.get_potential_energy()) < 1e-10
+    e = dyn.get_potential_energies() + dyn.get_kinetic_energies()
+    assert abs(e - [a.get_total_energy() for a in single]).max() < 1e-10
+    assert (images[1].positions[:2] == fixed).all()
+    assert len(read('batch.traj', ':')) == 4
+
+# Per-replica calculators (fallback) and Langevin with one replica:
+images = replicas(1)
+images[0].calc = LennardJones()
+single = images[0].copy()
+single.calc = LennardJones()
+np.random.seed(42)
+BatchLangevin(images, 0.005, 0.1, 0.05).run(10)
+np.random.seed(42)
+Langevin(single, 0.005, 0.1, 0.05, communicator=None).run(10)
+assert abs(images[0].positions - single.positions).max() < 1e-12
+assert abs(images[0].get_momenta() - single.get_momenta()).max() < 1e-12
+
+# Temperature per replica:
+images = replicas(2)
+dyn = BatchLangevin(images, 0.01, np.array([0.01, 1.0]), 1.0,
+                    calculator=LennardJones())
+dyn.run(500)
+ekin = dyn.get_kinetic_energies()
+print(ekin)
+assert 10 * ekin[0] < ekin[1]
+
+# Energies before the first step, and friction per replica and per atom:
+images = replicas(2)
+dyn = BatchLangevin(images, 0.01, 0.1, np.array([0.0, 0.5]),
+                    calculator=LennardJones())
+assert images[1].get_potential_energy() == dyn.get_potential_energies()[1]
+assert (dyn.c3[0] == dyn.c3[0, 0]).all() and dyn.c3[0, 0] != dyn.c3[1, 0]
+friction = np.linspace(0.0, 0.5, len(atoms0))
+for shape in [(len(atoms0),), (2, len(atoms0))]:
+    dyn.set_friction(np.broadcast_to(friction, shape))
+    assert dyn.c3.shape == (2, len(atoms0), 1)
+    assert (dyn.c3[0] == dyn.c3[1]).all() and dyn.c3[0, 0] != dyn.c3[0, 1]
+try:
+    dyn.set_friction(np.ones(3))
+except ValueError:
+    pass
+else:
+    assert False
@@ -0,0 +1,64 @@
+import os
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.calculators.cached import CachedCalculator
+
+
+class CountingEMT(EMT):
+    ncalcs = 0
+
+    def calculate(self, *args, **kwargs):
+        self.ncalcs += 1
+        EMT.calculate(self, *args, **kwargs)
+
+atoms = bulk('Cu', 'fcc', a=3.6) * (2, 2, 2)
+atoms.rattle(0.05)
+emt = CountingEMT()
+atoms.calc = CachedCalculator(emt, maxsize=2)
+e0 = atoms.get_potential_energy()
+f0 = atoms.get_forces()
+assert emt.ncalcs == 1
+
+p0 = atoms.get_positions()
+atoms.positions[0, 0] += 0.1
+e1 = atoms.get_potential_energy()
+atoms.positions[0, 0] -= 0.1
+assert atoms.get_potential_energy() == e0
+assert abs(atoms.get_forces() - f0).max() == 0
+assert emt.ncalcs == 2
+assert atoms.calc.hits == 1 and atoms.calc.misses == 2
+
+# Only two configurations are kept in memory:
+atoms.positions[1, 1] += 0.1
+atoms.get_potential_energy()
+atoms.positions[1, 1] -= 0.1
+atoms.positions[0, 0] += 0.1
+assert atoms.get_potential_energy() == e1
+assert emt.ncalcs == 4
+
+# Results survive in the database:
+if os.path.exists('cache.db'):
+    os.remove('cache.db')
+atoms.set_positions(p0)
+atoms.calc = CachedCalculator(emt, db='cache.db')
+atoms.get_potential_energy()
+assert emt.ncalcs == 5
+atoms.calc = CachedCalculator(emt, db='cache.db')
+assert atoms.get_potential_energy() == e0
+assert abs(atoms.get_forces() - f0).max() < 1e-12
+assert emt.ncalcs == 5
+
+# Results of other calculators and parameters are not returned:
+from ase.calculators.lj import LennardJones
+lj = LennardJones(sigma=2.5, epsilon=0.1)
+atoms.calc = CachedCalculator(lj, db='cache.db')
+e2 = atoms.get_potential_energy()
+assert e2 != e0
+lj.set(epsilon=0.2)
+assert abs(atoms.get_potential_energy() - 2 * e2) < 1e-10
+assert atoms.calc.misses == 2
+atoms.calc = CachedCalculator(LennardJones(sigma=2.5, epsilon=0.1),
+                              db='cache.db')
+assert atoms.get_potential_energy() == e2
+assert atoms.calc.hits == 1
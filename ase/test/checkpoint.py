@@ -0,0 +1,119 @@
+import os
+import pickle
+
+import numpy as np
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.io import Trajectory, read
+from ase.md import MDLogger
+from ase.md.langevin import Langevin
+from ase.md.npt import NPT
+from ase.optimize import BFGS
+from ase import units
+
+
+def system():
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+    atoms.rattle(0.1, seed=3)
+    atoms.calc = EMT()
+    return atoms
+
+
+def langevin(atoms):
+    return Langevin(atoms, 5 * units.fs, 300 * units.kB, 0.02)
+
+
+def npt(atoms):
+    return NPT(atoms, 2 * units.fs, 300 * units.kB, 0.0, 25 * units.fs, None)
+
+
+def bfgs(atoms):
+    return BFGS(atoms, logfile=None)
+
+
+for make in [langevin, npt, bfgs]:
+    # Uninterrupted run (a new calculator after 10 steps, like after a
+    # restart, since BFGS amplifies round-off differences):
+    np.random.seed(7)
+    atoms = system()
+    dyn = make(atoms)
+    dyn.run(steps=10)
+    atoms.calc = EMT()
+    dyn.run(steps=10)
+    ref = atoms.get_positions()
+
+    # Interrupted run:
+    np.random.seed(7)
+    atoms = system()
+    dyn = make(atoms)
+    dyn.attach_checkpoint('dyn.ckpt', interval=10)
+    dyn.run(steps=13)
+    np.random.seed(123)
+    atoms = system()
+    dyn = make(atoms)
+    dyn.read_checkpoint('dyn.ckpt')
+    assert dyn.nsteps == 10
+    dyn.run(steps=10)
+    assert abs(atoms.get_positions() - ref).max() < 1e-12, make
+    assert not [name for name in os.listdir('.') if name.endswith('.tmp')]
+
+# Trajectories and logs are rewound to the checkpoint on restart:
+for restart in [False, True]:
+    np.random.seed(7)
+    atoms = system()
+    dyn = langevin(atoms)
+    traj = Trajectory('md%d.traj' % restart, 'w', atoms)
+    dyn.attach(traj)
+    dyn.attach(MDLogger(dyn, atoms, 'md%d.log' % restart, mode='w'))
+    if restart:
+        dyn.attach_checkpoint('md.ckpt', interval=10)
+        dyn.run(steps=13)
+        traj.close()
+        np.random.seed(123)
+        atoms = system()
+        dyn = langevin(atoms)
+        traj = Trajectory('md1.traj', 'a', atoms)
+        dyn.attach(traj)
+        dyn.attach(MDLogger(dyn, atoms, 'md1.log', mode='a'))
+        dyn.attach_checkpoint('md.ckpt', interval=10)
+        dyn.read_checkpoint('md.ckpt')
+        dyn.run(steps=10)
+    else:
+        dyn.run(steps=20)
+    traj.close()
+images0 = read('md0.traj', ':')
+images1 = read('md1.traj', ':')
+assert len(images0) == len(images1) == 20
+for a0, a1 in zip(images0, images1):
+    assert abs(a0.positions - a1.positions).max() < 1e-12
+assert open('md0.log').read() == open('md1.log').read()
+
+# With a wall-time interval, only the first step and the end of the
+# run are written:
+atoms = system()
+dyn = langevin(atoms)
+dyn.attach_checkpoint('dyn.ckpt', seconds=3600.0)
+dyn.run(5)
+assert pickle.load(open('dyn.ckpt', 'rb'))['state']['nsteps'] == 5
+
+data = pickle.load(open('dyn.ckpt', 'rb'))
+data['version'] = 0
+pickle.dump(data, open('dyn.ckpt', 'wb'))
+try:
+    langevin(system()).read_checkpoint('dyn.ckpt')
+except ValueError:
+    pass
+else:
+    assert False
+
+# The restart file of an optimizer is also written at most once per
+# restartinterval seconds, and when run() returns:
+opt = BFGS(system(), restart='bfgs.pckl')
+opt.restartinterval = 3600.0
+opt.run(fmax=0.01, steps=1)
+H1 = pickle.load(open('bfgs.pckl', 'rb'))[0]
+opt.run(fmax=0.01, steps=3)
+assert opt.restartpending is False
+assert (pickle.load(open('bfgs.pckl', 'rb'))[0] == opt.H).all()
+assert not (H1 == opt.H).all()
@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+
+from ase import Atoms
+from ase.lattice import bulk
+from ase.utils.geometry import find_mic, reduced_lattice_basis
+
+rng = np.random.RandomState(42)
+
+# Minimum images in skewed cells must be valid images and not longer
+# than those found by a search over many translations:
+for pbc in [(1, 1, 1), (1, 1, 0), (0, 1, 0)]:
+    for i in range(10):
+        cell = rng.randn(3, 3) + 2 * np.eye(3)
+        D = rng.randn(50, 3) * 3
+        basis = reduced_lattice_basis(cell, pbc)
+        assert len(basis) == sum(pbc)
+        T = np.dot(list(itertools.product(range(-6, 7), repeat=sum(pbc))),
+                   basis)
+        ref = np.sqrt(((D[:, np.newaxis] + T)**2).sum(2)).min(1)
+        D_min, D_len = find_mic(D, cell, pbc)
+        assert (D_len < ref + 1e-10).all()
+        n = np.linalg.solve(cell.T, (D_min - D).T)
+        assert abs(n - np.round(n)).max() < 1e-8
+        assert (np.round(n)[np.logical_not(pbc)] == 0).all()
+        assert abs(np.sqrt((D_min**2).sum(1)) - D_len).max() < 1e-10
+
+# Pairs within a cutoff:
+for pbc in [False, True, (1, 0, 1)]:
+    atoms = Atoms('H50', positions=rng.rand(50, 3) * 5,
+                  cell=[[5, 0, 0], [3, 5, 0], [1, 2, 4]], pbc=pbc)
+    for mic in [False, True]:
+        dist = atoms.get_all_distances(mic=mic)
+        i, j, d = atoms.get_distances_within(2.5, mic=mic)
+        i0, j0 = np.nonzero(np.triu(dist < 2.5, 1))
+        assert (i == i0).all() and (j == j0).all()
+        assert abs(d - dist[i, j]).max() < 1e-10
+        i, j, D = atoms.get_distances_within(2.5, mic=mic, vector=True)
+        for n in [0, len(i) // 2, -1]:
+            assert abs(D[n] - atoms.get_distance(i[n], j[n], mic=mic,
+                                                 vector=True)).max() < 1e-10
+
+# Small cell with rcut larger than the cell:
+atoms = bulk('Cu', 'fcc', a=3.6) * (2, 1, 1)
+i, j, d = atoms.get_distances_within(5.0, mic=True)
+assert (i == 0).all() and (j == 1).all()
+assert abs(d[0] - atoms.get_distance(0, 1, mic=True)) < 1e-10
@@ -0,0 +1,75 @@
+import sys
+import time
+
+import numpy as np
+
+from ase import Atoms
+from ase.calculators.calculator import FileIOCalculator, JobPool
+from ase.constraints import FixAtoms
+from ase.neb import NEB
+from ase.vibrations import Vibrations
+
+script = ('import numpy as np; '
+          'p = np.loadtxt(\'PREFIX.in\').reshape((-1, 3)); '
+          'np.savetxt(\'PREFIX.out\', np.vstack([[0.5 * (p**2).sum()] * 3,'
+          ' -p]))')
+
+
+class Harmonic(FileIOCalculator):
+    implemented_properties = ['energy', 'forces']
+    command = '%s -c "%s"' % (sys.executable, script)
+
+    def write_input(self, atoms, properties=None, system_changes=None):
+        FileIOCalculator.write_input(self, atoms, properties, system_changes)
+        np.savetxt(self.label + '.in', atoms.positions)
+
+    def read_results(self):
+        data = np.loadtxt(self.label + '.out')
+        self.results = {'energy': data[0, 0], 'forces': data[1:]}
+
+atoms = Atoms('H2', [(0, 0, 0), (0, 0, 1.0)])
+atoms.calc = Harmonic(label='harmonic/h2')
+e0 = atoms.get_potential_energy()
+assert abs(e0 - 0.5) < 1e-12
+
+with JobPool(4) as pool:
+    t0 = time.time()
+    futures = []
+    for x in range(4):
+        atoms.positions[0, 0] = x
+        futures.append(atoms.calc.submit(atoms, pool=pool))
+    energies = [future.result()['energy'] for future in futures]
+    print(energies, time.time() - t0)
+assert np.allclose(energies, [0.5, 1.0, 2.5, 5.0])
+
+atoms.positions[0, 0] = 0.0
+vib = Vibrations(atoms, name='harmonic/vib')
+with JobPool(4) as pool:
+    vib.run(pool=pool)
+vib.read()
+assert np.allclose(vib.H, np.eye(6))
+vib.clean()
+
+# Constraints are applied to the forces of submitted calculations:
+atoms.set_constraint(FixAtoms([0]))
+vib = Vibrations(atoms, name='harmonic/vibc')
+vib.run()
+vib.read()
+H = vib.H
+vib.clean()
+with JobPool(4) as pool:
+    vib.run(pool=pool)
+vib.read()
+assert abs(vib.H - H).max() < 1e-12
+vib.clean()
+
+# NEB images calculated through the pool:
+images = [atoms.copy() for i in range(5)]
+for i, image in enumerate(images):
+    image.positions[1, 2] = 1.0 + 0.1 * i
+    image.calc = atoms.calc
+with JobPool(3) as pool:
+    forces = NEB(images, pool=pool).get_forces()
+for i, image in enumerate(images):
+    image.calc = Harmonic(label='harmonic/neb%d' % i)
+assert abs(NEB(images).get_forces() - forces).max() < 1e-12
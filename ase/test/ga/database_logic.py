@@ -76,4 +76,71 @@ assert dc.get_all_candidates_in_queue()[0] == confid
 dc.remove_from_queue(confid)
 assert len(dc.get_all_candidates_in_queue()) == 0
 
+
+def unrelaxed_ids(c):
+    """The state of the candidates from full queries."""
+    relaxed = set([t.gaid for t in c.select(relaxed=1)])
+    queued = set([t.gaid for t in c.select(queued=1)])
+    return sorted(set([t.gaid for t in c.select(relaxed=0)]) -
+                  relaxed - queued)
+
+
+# Changes made by another connection are seen:
+dc2 = DataConnection(db_file)
+a3 = dc2.get_an_unrelaxed_candidate()
+dc2.mark_as_queued(a3)
+assert dc.get_all_candidates_in_queue() == [a3.info['confid']]
+a3.set_raw_score(1.0)
+dc2.add_relaxed_step(a3)
+assert dc.get_all_candidates_in_queue() == []
+assert dc.get_number_of_unrelaxed_candidates() == 18
+assert dc.get_an_unrelaxed_candidate().info['confid'] == unrelaxed_ids(dc.c)[0]
+assert dc.get_all_relaxed_candidates(only_new=True)[0].info['confid'] == \
+    a3.info['confid']
+assert len(dc.get_all_relaxed_candidates(only_new=True)) == 0
+assert len(dc.get_all_relaxed_candidates()) == 2
+
+a4 = dc.get_an_unrelaxed_candidate()
+dc.add_unrelaxed_step(a4, 'mutation:test')
+dc.kill_candidate(a4.info['confid'])
+assert dc2.get_all_relaxed_candidates_after_generation(0)[0].get_raw_score() \
+    == 1.0
+for d in [dc, dc2]:
+    assert d.__get_ids_of_all_unrelaxed_candidates__() == unrelaxed_ids(d.c)
+    assert d.get_generation_number(size=2) == 1
+    assert d.get_generation_number(size=3) == 0
+assert dc.is_duplicate(description='test')
+assert not dc.is_duplicate(description='other')
+
+# Other connections can not change the database while we write, and a
+# change by one that does not use the lock file is not hidden by ours:
+other = dc2.get_an_unrelaxed_candidate()
+dc2.mark_as_queued(other)
+other.set_raw_score(2.0)
+a5 = dc.get_an_unrelaxed_candidate()
+assert a5.info['confid'] != other.info['confid']
+sync = dc._sync
+write = dc.c.write
+
+
+def sync_and_other():
+    sync()
+    dc2.c.write(other, gaid=other.info['confid'], relaxed=1,
+                key_value_pairs=other.info['key_value_pairs'])
+
+
+def locked_write(*args, **kwargs):
+    assert os.path.isfile(db_file + '.lock')
+    return write(*args, **kwargs)
+
+
+dc._sync = sync_and_other
+dc.c.write = locked_write
+dc.mark_as_queued(a5)
+del dc._sync
+dc.c.write = write
+assert not os.path.isfile(db_file + '.lock')
+assert dc.get_all_candidates_in_queue() == [a5.info['confid']]
+assert len(dc.get_all_relaxed_candidates()) == 3
+
 os.remove(db_file)
@@ -0,0 +1,69 @@
+import warnings
+
+import numpy as np
+
+from ase import Atoms
+from ase.io import write
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.ga.population import CandidateIndex, count_looks_like
+from ase.ga.standard_comparators import (InteratomicDistanceComparator,
+                                         SequentialComparator,
+                                         get_sorted_dist_list,
+                                         get_cached_dist_list)
+
+rng = np.random.RandomState(7)
+
+# Compare with distances calculated one pair at a time:
+atoms = Atoms('Ag6Au4', positions=rng.rand(10, 3) * 4,
+              cell=[4, 4, 4], pbc=True)
+for mic in [False, True]:
+    pair_cor = get_sorted_dist_list(atoms, mic=mic)
+    for n in [47, 79]:
+        i_un = [i for i in range(len(atoms)) if atoms.numbers[i] == n]
+        d = sorted(atoms.get_distance(i, j, mic)
+                   for k, i in enumerate(i_un) for j in i_un[k + 1:])
+        assert abs(pair_cor[n] - d).max() < 1e-12
+
+# The fingerprint is cached and recalculated when the atoms move:
+p1 = get_cached_dist_list(atoms, n_top=5)
+assert get_cached_dist_list(atoms, n_top=5) is p1
+assert get_cached_dist_list(atoms[-5:]) is not p1
+atoms.positions[-1] += 0.1
+p2 = get_cached_dist_list(atoms, n_top=5)
+assert p2 is not p1
+assert abs(p2[79] - get_sorted_dist_list(atoms[-5:])[79]).max() < 1e-12
+
+# Copies have their own cache, and the cache is not written to files:
+copy = atoms.copy()
+copy.positions[-1] += 0.1
+assert get_cached_dist_list(copy, n_top=5) is not p2
+assert get_cached_dist_list(atoms, n_top=5) is p2
+with warnings.catch_warnings(record=True) as w:
+    warnings.simplefilter('always')
+    write('fingerprints.traj', atoms)
+assert not [x for x in w if 'Skipping' in str(x.message)]
+
+# Candidates with a few different structures and energies:
+base = [rng.rand(8, 3) * 3 for i in range(4)]
+candidates = []
+for i in range(60):
+    a = Atoms('Cu8', positions=base[i % 4] + rng.rand(8, 3) * 0.01)
+    a.set_calculator(SinglePointCalculator(i % 4 + rng.rand() * 0.03,
+                                           None, None, None, a))
+    a.info['confid'] = i
+    candidates.append(a)
+
+comp = InteratomicDistanceComparator(n_top=8, dE=0.02)
+index = CandidateIndex(comp, candidates[:30])
+for a in candidates[30:]:
+    index.add(a)
+assert len(index) == 60
+for a in candidates[::7]:
+    near = index.near(a)
+    assert len(near) < 30
+    assert (count_looks_like(a, near, comp) ==
+            count_looks_like(a, candidates, comp))
+
+# Without an energy criterion all candidates are compared:
+index = CandidateIndex(SequentialComparator([comp]), candidates)
+assert index.near(candidates[0]) == candidates
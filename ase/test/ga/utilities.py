@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+
+from ase.cluster import Icosahedron
+from ase.ga.utilities import (get_distance_matrix, get_rdf, get_nndist,
+                              get_nnmat)
+
+
+# The implementations with loops over the atoms, for comparison:
+def old_distance_matrix(atoms, self_distance=1000):
+    dm = np.zeros([len(atoms), len(atoms)])
+    for i in range(len(atoms)):
+        dm[i][i] = self_distance
+        for j in range(i + 1, len(atoms)):
+            rij = atoms.get_distance(i, j)
+            dm[i][j] = rij
+            dm[j][i] = rij
+    return dm
+
+
+def old_rdf(atoms, rmax, nbins, dm):
+    rdf = np.zeros(nbins + 1)
+    dr = float(rmax / nbins)
+    for i in range(len(atoms)):
+        for j in range(i + 1, len(atoms)):
+            index = int(math.ceil(dm[i][j] / dr))
+            if index <= nbins:
+                rdf[index] += 1
+    phi = len(atoms) / atoms.get_volume()
+    norm = 2.0 * math.pi * dr * phi * len(atoms)
+    dists = [0]
+    for i in range(1, nbins + 1):
+        rrr = (i - 0.5) * dr
+        dists.append(rrr)
+        rdf[i] /= (norm * ((rrr**2) + (dr**2) / 12.))
+    return rdf, np.array(dists)
+
+
+def old_nnmat(atoms):
+    elements = sorted(set(atoms.get_chemical_symbols()))
+    nnmat = np.zeros((len(elements), len(elements)))
+    dm = atoms.get_all_distances()
+    rdf, dists = old_rdf(atoms, 10., 200, dm)
+    i = 0
+    while np.gradient(rdf)[i] >= 0:
+        i += 1
+    nndist = dists[i] + 0.2
+    for i in range(len(atoms)):
+        row = [j for j in range(len(elements))
+               if atoms[i].symbol == elements[j]][0]
+        neighbors = [j for j in range(len(dm[i])) if dm[i][j] < nndist]
+        for n in neighbors:
+            column = [j for j in range(len(elements))
+                      if atoms[n].symbol == elements[j]][0]
+            nnmat[row][column] += 1
+    for i, el in enumerate(elements):
+        nnmat[i] /= len([j for j in range(len(atoms))
+                         if atoms[int(j)].symbol == el])
+    return np.reshape(nnmat, (len(nnmat)**2))
+
+
+rng = np.random.RandomState(3)
+for symbols in [['Cu'], ['Cu', 'Ag', 'Au']]:
+    atoms = Icosahedron('Cu', 3)
+    atoms.set_chemical_symbols(rng.choice(symbols, len(atoms)))
+    atoms.center(vacuum=5.)
+    atoms.rattle(0.05, seed=2)
+    atoms.info['data'] = {}
+
+    dm = get_distance_matrix(atoms)
+    ref = old_distance_matrix(atoms)
+    assert abs(dm - ref).max() < 1e-12
+
+    for rmax, nbins in [(10., 200), (4., 37)]:
+        rdf, dists = get_rdf(atoms, rmax, nbins)
+        ref_rdf, ref_dists = old_rdf(atoms, rmax, nbins, ref)
+        assert abs(dists - ref_dists).max() < 1e-12
+        assert abs(rdf - ref_rdf).max() < 1e-12
+        rdf, dists = get_rdf(atoms, rmax, nbins, dm)
+        assert abs(rdf - ref_rdf).max() < 1e-12
+
+    assert get_nndist(atoms) == get_nndist(atoms, dm)
+
+    nnmat = get_nnmat(atoms)
+    ref = old_nnmat(atoms)
+    print(symbols, nnmat)
+    assert nnmat.shape == ref.shape
+    assert abs(nnmat - ref).max() < 1e-12
@@ -1,3 +1,5 @@
+import numpy as np
+
 from ase.structure import molecule
 from ase.neb import NEB
 
@@ -18,3 +20,22 @@ neb.idpp_interpolate()
 d2 = images[3].get_distance(2, 3)
 print(d0, d1, d2)
 assert abs(d2 - 1.74) < 0.01
+
+# Batched evaluation agrees with image by image:
+from ase.neb import IDPP, IDPPPath, idpp_pairs, pair_distances
+pairs = idpp_pairs(initial, final, cutoff=2.0)
+assert len(pairs[0]) < len(initial) * (len(initial) - 1) // 2
+targets = [pair_distances(image, *pairs) * 1.1 for image in images]
+path = IDPPPath(images, np.array(targets), pairs, mic=False)
+for n, image in enumerate(images):
+    e, f = path.get_results(n)
+    image.calc = IDPP(targets[n], mic=False, pairs=pairs)
+    assert abs(image.get_potential_energy() - e) < 1e-12
+    assert abs(image.get_forces() - f).max() < 1e-12
+
+# A large cutoff includes all pairs:
+for image in images[1:-1]:
+    image.positions[:] = initial.positions
+neb.interpolate()
+neb.idpp_interpolate(cutoff=10.0)
+assert abs(images[3].get_distance(2, 3) - d2) < 1e-12
@@ -0,0 +1,31 @@
+import os
+
+from ase.lattice.surface import fcc111, add_adsorbate
+from ase.constraints import FixAtoms
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS, InverseBFGS
+
+slab = fcc111('Cu', size=(2, 2, 3), vacuum=5.0)
+add_adsorbate(slab, 'Au', 2.0, 'fcc')
+slab.set_constraint(FixAtoms(mask=[atom.tag > 1 for atom in slab]))
+slab.rattle(0.05, seed=4)
+
+# The two updates are exact inverses of each other, so the steps agree:
+positions = []
+for optimizer in [BFGS, InverseBFGS]:
+    atoms = slab.copy()
+    atoms.calc = EMT()
+    optimizer(atoms).run(fmax=0.01, steps=8)
+    positions.append(atoms.get_positions())
+print(abs(positions[0] - positions[1]).max())
+assert abs(positions[0] - positions[1]).max() < 1e-8
+
+atoms = slab.copy()
+atoms.calc = EMT()
+opt = InverseBFGS(atoms, restart='ibfgs.pckl', restart_interval=1000)
+opt.run(fmax=0.01)
+assert os.path.isfile('ibfgs.pckl')
+opt = InverseBFGS(atoms, restart='ibfgs.pckl')
+opt.run(fmax=0.01)
+assert opt.get_number_of_steps() == 0
+os.remove('ibfgs.pckl')
@@ -0,0 +1,107 @@
+"""Streaming mode of the LAMMPS calculator tested against a stub lmp."""
+import os
+import sys
+
+from ase.lattice import bulk
+from ase.calculators.lammpsrun import LAMMPS
+
+stub = '''#!%s
+# Understands the commands written by the LAMMPS calculator and
+# evaluates harmonic springs tying each atom to the origin.
+import sys
+import numpy as np
+
+args = ['step', 'temp', 'press', 'cpu', 'pxx', 'pyy', 'pzz', 'pxy', 'pxz',
+        'pyz', 'ke', 'pe', 'etotal', 'vol', 'lx', 'ly', 'lz', 'atoms']
+
+
+def out(line):
+    if log:
+        sys.stdout.write(line + '\\n')
+        sys.stdout.flush()
+
+
+def write_dump(filename, columns, order=1):
+    f = open(filename, 'w')
+    f.write('ITEM: TIMESTEP\\n0\\nITEM: NUMBER OF ATOMS\\n%%d\\n' %% len(pos))
+    f.write('ITEM: BOX BOUNDS pp pp pp\\n')
+    for x in box:
+        f.write('0.0 %%r\\n' %% x)
+    f.write('ITEM: ATOMS %%s\\n' %% ' '.join(columns))
+    data = {'id': np.arange(1, len(pos) + 1), 'type': np.ones(len(pos), int),
+            'fx': -pos[:, 0], 'fy': -pos[:, 1], 'fz': -pos[:, 2],
+            'x': pos[:, 0], 'y': pos[:, 1], 'z': pos[:, 2],
+            'vx': 0 * pos[:, 0], 'vy': 0 * pos[:, 0], 'vz': 0 * pos[:, 0]}
+    for i in range(len(pos))[::order]:
+        f.write(' '.join(repr(data[c][i].item()) for c in columns) + '\\n')
+    f.close()
+
+log = True
+dump = None
+pos = None
+box = None
+for line in iter(sys.stdin.readline, ''):
+    out(line.rstrip())
+    words = line.split()
+    if not words:
+        continue
+    cmd = words[0]
+    if cmd == 'read_data':
+        lines = open(words[1]).readlines()
+        box = [float(l.split()[1]) for l in lines
+               if l.rstrip().endswith('hi')]
+        n = int(lines[2].split()[0])
+        start = [l.strip() for l in lines].index('Atoms') + 2
+        pos = np.array([[float(x) for x in l.split()[2:5]]
+                        for l in lines[start:start + n]])
+    elif cmd == 'dump':
+        dump = (words[5], words[6:])
+    elif cmd == 'undump':
+        dump = None
+    elif cmd == 'set':
+        pos[int(words[2]) - 1] = [float(x) for x in words[4:9:2]]
+    elif cmd == 'log':
+        log = words[1] != 'none'
+    elif cmd == 'run':
+        values = dict((a, 0.0) for a in args)
+        values['pe'] = 0.5 * (pos**2).sum()
+        values['atoms'] = len(pos)
+        out(' '.join(a.capitalize() for a in args))
+        out(' '.join(repr(float(values[a])) for a in args))
+        out('Loop time of 0.0 on 1 procs for 0 steps with %%d atoms' %% len(pos))
+        if dump is not None:
+            write_dump(*dump)
+    elif cmd == 'write_dump':
+        # Unsorted to check that the calculator sorts by id:
+        write_dump(words[3], words[4:words.index('modify')], -1)
+    elif cmd == 'print':
+        out(line.split('"')[1])
+''' % sys.executable
+
+with open('lmp_stub.py', 'w') as f:
+    f.write(stub)
+os.chmod('lmp_stub.py', 0o755)
+os.environ['LAMMPS_COMMAND'] = os.path.abspath('lmp_stub.py')
+
+atoms = bulk('Ar', 'fcc', a=4.0, cubic=True)
+atoms.rattle(0.1, seed=2)
+calc = LAMMPS(streaming=True)
+e = calc.get_potential_energy(atoms)
+assert abs(e - 0.5 * (atoms.positions**2).sum()) < 1e-10
+assert abs(calc.get_forces(atoms) + atoms.positions).max() < 1e-10
+
+for i in range(3):
+    atoms.positions[i] += 0.05 * (i + 1)
+    e = calc.get_potential_energy(atoms)
+    assert abs(e - 0.5 * (atoms.positions**2).sum()) < 1e-10
+    assert abs(calc.get_forces(atoms) + atoms.positions).max() < 1e-10
+assert calc.calls == 4 and calc._lmp_positions is not None
+
+# A new cell requires a full run:
+atoms.set_cell(atoms.cell * 1.01, scale_atoms=True)
+e = calc.get_potential_energy(atoms)
+assert abs(e - 0.5 * (atoms.positions**2).sum()) < 1e-10
+assert abs(calc.get_forces(atoms) + atoms.positions).max() < 1e-10
+atoms.positions[0] += 0.1
+assert abs(calc.get_forces(atoms) + atoms.positions).max() < 1e-10
+calc.clean()
@@ -0,0 +1,43 @@
+import numpy as np
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.md.langevin import Langevin, philox, counter_normal
+from ase import units
+
+# Known-answer tests from Random123:
+assert (philox([[0, 0, 0, 0]], (0, 0))[0] ==
+        [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]).all()
+assert (philox([[0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344]],
+               (0xa4093822, 0x299f31d0))[0] ==
+        [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1]).all()
+
+x = counter_normal(7, 3, np.arange(20000), 6)
+assert x.shape == (20000, 6)
+assert abs(x.mean()) < 0.01 and abs(x.var() - 1) < 0.01
+assert abs(np.corrcoef(x.T) - np.eye(6)).max() < 0.03
+# The numbers of an atom do not depend on the other atoms:
+assert (counter_normal(7, 3, [5, 17], 6) == x[[5, 17]]).all()
+assert abs(counter_normal(7, 4, [5], 6) - x[5]).min() > 0
+assert abs(counter_normal(8, 3, [5], 6) - x[5]).min() > 0
+
+
+class NoBroadcast:
+    def broadcast(self, a, root):
+        raise RuntimeError('broadcast called')
+
+
+def run(seed, communicator):
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (2, 2, 2)
+    atoms.calc = EMT()
+    dyn = Langevin(atoms, 5 * units.fs, 300 * units.kB, 0.02,
+                   communicator=communicator, seed=seed)
+    dyn.run(20)
+    return atoms
+
+a1 = run(42, NoBroadcast())
+np.random.seed(1)
+a2 = run(42, None)
+assert (a1.positions == a2.positions).all()
+assert (a1.get_momenta() == a2.get_momenta()).all()
+assert abs(run(43, None).positions - a1.positions).max() > 1e-6
@@ -0,0 +1,103 @@
+import numpy as np
+
+from ase import Atoms
+from ase.cluster.icosahedron import Icosahedron
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS
+from ase.optimize.minimahopping import MinimaStore, ComparePositions
+
+atoms = Icosahedron('Cu', 2)
+atoms.calc = EMT()
+images = []
+for seed in range(6):
+    a = atoms.copy()
+    a.rattle(0.3, seed=seed)
+    a.calc = EMT()
+    a.get_potential_energy()
+    images.append(a)
+
+compare = ComparePositions(translate=True)
+for name in [None, 'minima.traj', 'minima.db', 'minima.json']:
+    store = MinimaStore(name, threshold=0.1)
+    ids = [store.add(a) for a in images[:4]]
+    assert len(store) == 4
+
+    for id, a in zip(ids, images):
+        b = a.copy()
+        b.translate((1.0, 2.0, 3.0))
+        b.positions[0] += 0.02
+        assert store.find(b)[0] == id
+        # Permuted atoms are the same minimum:
+        assert store.find(b[::-1])[0] == id
+    for a in images[4:]:
+        found, dmax = store.find(a)
+        assert found is None
+        assert dmax > 0.1
+        assert dmax == np.inf or dmax == min(compare(b, a) for b in images[:4])
+
+    if name is not None:
+        # A second store sharing the file sees the same minima and new
+        # ones written by the first:
+        other = MinimaStore(name, threshold=0.1)
+        assert len(other) == 4
+        store.add(images[4])
+        other.update()
+        assert len(other) == 5
+        assert other.find(images[4])[0] is not None
+        assert abs(other.get_atoms(ids[1]).positions -
+                   images[1].positions).max() < 1e-10
+
+# The number of fingerprints compared in a lookup does not grow with
+# the number of minima:
+images = []
+for k in range(40):
+    a = atoms.copy()
+    a.rattle(0.05, seed=k)
+    a.positions *= 1 + 0.03 * k
+    a.calc = EMT()
+    a.get_potential_energy()
+    images.append(a)
+for energy_tolerance in [None, 0.1]:
+    ncompared = []
+    for nminima in [10, 40]:
+        store = MinimaStore(None, threshold=0.1,
+                            energy_tolerance=energy_tolerance)
+        for a in images[:nminima]:
+            store.add(a)
+        n = 0
+        for a in images[:nminima]:
+            assert store.find(a)[0] is not None
+            n = max(n, store.ncompared)
+        ncompared.append(n)
+    assert max(ncompared) <= 5, ncompared
+
+# Lookups agree with comparing against all minima for relaxed clusters,
+# whose energies and fingerprints are close to each other, and which
+# are found again from slightly different starting points:
+rng = np.random.RandomState(0)
+minima = []
+for n in range(24):
+    if n % 3 == 0:
+        start = rng.uniform(-3.5, 3.5, (13, 3))
+    a = Atoms('Cu13', start + rng.normal(0, 0.05, (13, 3)))
+    a.calc = EMT()
+    BFGS(a, logfile=None).run(fmax=0.05, steps=300)
+    minima.append(a)
+for energy_tolerance in [None, 0.1]:
+    store = MinimaStore(None, threshold=0.5,
+                        energy_tolerance=energy_tolerance)
+    nfound = 0
+    for a in minima:
+        e = a.get_potential_energy()
+        d = [(compare(store.get_atoms(id), a), id)
+             for id in range(1, len(store) + 1)
+             if energy_tolerance is None or
+             abs(store.energies[id] - e) <= energy_tolerance]
+        found, dmax = store.find(a)
+        if d and min(d)[0] < 0.5:
+            assert (dmax, found) == min(d)
+            nfound += 1
+        else:
+            assert found is None
+            store.add(a)
+    assert nfound > 0
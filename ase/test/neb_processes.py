@@ -0,0 +1,42 @@
+from ase.lattice.surface import fcc100, add_adsorbate
+from ase.constraints import FixAtoms
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.neb import NEB
+from ase.optimize import BFGS
+
+initial = fcc100('Al', size=(2, 2, 3))
+add_adsorbate(initial, 'Au', 1.7, 'hollow')
+initial.center(axis=2, vacuum=4.0)
+initial.set_constraint(FixAtoms(mask=[atom.tag > 1 for atom in initial]))
+final = initial.copy()
+final.positions[-1, 0] += initial.cell[0, 0] / 2
+
+
+def make_neb(**kwargs):
+    images = [initial.copy()]
+    for i in range(3):
+        images.append(initial.copy())
+    images.append(final.copy())
+    for image in images:
+        image.calc = EMT()
+    neb = NEB(images, **kwargs)
+    neb.interpolate()
+    return neb
+
+serial = make_neb()
+for workers in [None, 2]:
+    neb = make_neb(parallel='processes', workers=workers)
+    assert abs(neb.get_forces() - serial.get_forces()).max() < 1e-12
+    assert neb.get_potential_energy() == serial.get_potential_energy()
+
+    BFGS(neb).run(fmax=0.5, steps=3)
+    neb.get_forces()
+    assert isinstance(neb.images[2].calc, SinglePointCalculator)
+    e = neb.images[2].get_potential_energy()
+    neb.close()
+    assert isinstance(neb.images[2].calc, EMT)
+    assert abs(neb.images[2].get_potential_energy() - e) < 1e-12
+
+BFGS(serial).run(fmax=0.5, steps=3)
+assert abs(serial.get_positions() - neb.get_positions()).max() < 1e-10
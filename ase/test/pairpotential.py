@@ -0,0 +1,76 @@
+from __future__ import print_function
+import numpy as np
+from ase import Atoms
+from ase.lattice import bulk
+from ase.calculators.pairpotential import (PairPotential, LennardJonesTerm,
+                                           MorseTerm, TabulatedTerm)
+from ase.calculators.lj import LennardJones
+from ase.calculators.morse import MorsePotential
+
+# Mixed species, all three kinds of terms and both smoothing schemes:
+r = np.linspace(0.6, 3.5, 300)
+lj = LennardJonesTerm(1.0, 1.0)
+table = TabulatedTerm(r, *lj(r))
+pairs = {('Cu', 'Cu'): lj,
+         ('Cu', 'Ag'): MorseTerm(0.5, 5.0, 1.2),
+         (47, 47): table}
+
+atoms = bulk('Cu', 'fcc', a=1.6) * (2, 2, 2)
+atoms.numbers[::3] = 47
+atoms.rattle(0.02)
+for smoothing in ['shift', 'switch']:
+    atoms.calc = PairPotential(pairs=pairs, rc=3.0, smoothing=smoothing)
+    e = atoms.get_potential_energy()
+    f = atoms.get_forces()
+    fn = atoms.calc.calculate_numerical_forces(atoms, 1e-5)
+    s = atoms.get_stress()
+    sn = atoms.calc.calculate_numerical_stress(atoms, 1e-6)
+    print(smoothing, e, abs(f - fn).max(), abs(s - sn).max())
+    assert abs(f - fn).max() < 1e-5
+    assert abs(s - sn).max() < 1e-5
+    assert abs(atoms.get_potential_energies().sum() - e) < 1e-10
+    assert abs(atoms.get_stresses().sum(0) - s).max() < 1e-10
+
+# Tabulated term reproduces the analytic one:
+x = np.linspace(0.9, 3.0, 77)
+e1, de1 = lj(x)
+e2, de2 = table(x)
+assert abs(e1 - e2).max() < 1e-5
+assert abs(de1 - de2).max() < 1e-4 * abs(de1).max()
+
+# Thin configurations agree with explicit ones:
+atoms = bulk('Ar', 'fcc', a=1.5) * (2, 2, 2)
+atoms.rattle(0.03)
+atoms.calc = LennardJones(sigma=0.9, rc=2.5)
+e = atoms.get_potential_energy()
+f = atoms.get_forces()
+atoms.calc = PairPotential(pairs=LennardJonesTerm(1.0, 0.9), rc=2.5,
+                           smoothing='shift')
+assert abs(atoms.get_potential_energy() - e) < 1e-12
+assert abs(atoms.get_forces() - f).max() < 1e-12
+
+dimer = Atoms('H2', [(0, 0, 0), (0, 0, 1.1)])
+dimer.calc = MorsePotential()
+r0 = 1.1
+expf = np.exp(6.0 * (1 - r0))
+assert abs(dimer.get_potential_energy() - expf * (expf - 2)) < 1e-12
+assert abs(dimer.get_forces()[1, 2] - 12 * expf * (expf - 1)) < 1e-12
+assert 'stress' not in dimer.calc.results
+
+# The derived calculators take all smoothing parameters:
+atoms = bulk('Ar', 'fcc', a=1.5) * (2, 2, 2)
+atoms.rattle(0.03)
+atoms.calc = LennardJones(sigma=0.9, rc=2.5, smoothing='switch', width=0.5)
+e = atoms.get_potential_energy()
+atoms.calc = PairPotential(pairs=LennardJonesTerm(1.0, 0.9), rc=2.5,
+                           smoothing='switch', width=0.5)
+assert abs(atoms.get_potential_energy() - e) < 1e-12
+
+# Missing or wrong pairs:
+for bad in [None, {}, {('H', 'H'): 1.0}]:
+    try:
+        PairPotential(pairs=bad)
+    except ValueError:
+        pass
+    else:
+        assert False, bad
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.phonons import Phonons
+from ase import units
+
+atoms = bulk('Cu', 'fcc', a=3.6)
+ph = Phonons(atoms, EMT(), supercell=(3, 3, 3), delta=0.02, name='bands')
+ph.run()
+ph.read(acoustic=True)
+
+# Reference: one q-vector at a time
+q_qc = np.random.RandomState(1).rand(50, 3)
+R_cN = ph.lattice_vectors()
+s = units._hbar * 1e10 / np.sqrt(units._e * units._amu)
+ref_ql = []
+ref_qxl = []
+for q_c in q_qc:
+    phase_N = np.exp(-2.j * np.pi * np.dot(q_c, R_cN))
+    D_q = np.sum(phase_N[:, np.newaxis, np.newaxis] * ph.D_N, axis=0)
+    omega2_l, u_xl = np.linalg.eigh(D_q)
+    ref_ql.append(s * np.sqrt(omega2_l))
+    ref_qxl.append(u_xl)
+ref_ql = np.array(ref_ql)
+
+assert abs(ph.band_structure(q_qc) - ref_ql).max() < 1e-12
+assert abs(ph.band_structure(q_qc, chunksize=7) - ref_ql).max() < 1e-12
+with ThreadPoolExecutor(2) as executor:
+    omega_ql = ph.band_structure(q_qc, chunksize=10, executor=executor)
+assert abs(omega_ql - ref_ql).max() < 1e-12
+
+omega_ql, u_qlav = ph.band_structure(q_qc[:5], modes=True, chunksize=2)
+assert u_qlav.shape == (5, 3, 1, 3)
+assert abs(omega_ql - ref_ql[:5]).max() < 1e-12
+# The modes are the eigenvectors (times the mass prefactor), up to a
+# phase:
+for u_lav, u_xl in zip(u_qlav, ref_qxl):
+    for u_av, u_x in zip(u_lav, u_xl.T):
+        u_x = ph.m_inv_x * u_x
+        overlap = abs(np.vdot(u_x, u_av.ravel()))
+        assert abs(overlap - np.vdot(u_x, u_x).real) < 1e-10
+        assert abs(np.vdot(u_av, u_av) - np.vdot(u_x, u_x)) < 1e-10
+
+# The dos integrates to the number of branches:
+for method in ['lorentzian', 'histogram']:
+    omega_e, dos_e = ph.dos(kpts=(8, 8, 8), npts=2000, delta=1e-4,
+                            method=method)
+    integral = dos_e.sum() * (omega_e[1] - omega_e[0])
+    print(method, integral)
+    assert abs(integral - 3) < 0.05
+ph.clean()
@@ -0,0 +1,57 @@
+import numpy as np
+
+from ase.lattice import bulk
+from ase.constraints import FixAtoms
+from ase.calculators.emt import EMT
+from ase.optimize import LBFGS, FIRE
+from ase.optimize.precon import Exp, FF
+
+atoms = bulk('Cu', 'fcc', a=3.6, cubic=True) * (3, 3, 3)
+del atoms[0]
+atoms.rattle(0.05, seed=2)
+atoms.set_constraint(FixAtoms(indices=[1, 2]))
+atoms.calc = EMT()
+
+for precon in [Exp(mu=2.0), Exp(), FF()]:
+    precon.make_precon(atoms)
+    P = precon.P.toarray()
+    assert abs(P - P.T).max() < 1e-12
+    assert np.linalg.eigvalsh(P).min() > 0
+    x = np.random.RandomState(1).rand(3 * len(atoms))
+    assert abs(precon.dot(precon.solve(x)) - x).max() < 1e-10
+    # Fixed atoms are decoupled:
+    assert abs(P[3:9, 9:]).max() == 0
+assert precon.P.nnz < 0.2 * (3 * len(atoms))**2
+
+# Preconditioning saves force calls:
+nsteps = []
+for precon in [None, Exp()]:
+    a = atoms.copy()
+    a.calc = EMT()
+    opt = LBFGS(a, precon=precon)
+    opt.run(fmax=0.01)
+    nsteps.append(opt.get_number_of_steps())
+    assert abs(a.get_forces()).max() < 0.01
+print(nsteps)
+assert nsteps[1] < nsteps[0]
+
+a = atoms.copy()
+a.calc = EMT()
+FIRE(a, precon=Exp()).run(fmax=0.01, steps=500)
+assert abs(a.get_forces()).max() < 0.01
+
+# mu can not be fitted when all atoms are fixed:
+a = atoms.copy()
+a.set_constraint(FixAtoms(indices=range(len(a))))
+a.calc = EMT()
+precon = Exp()
+precon.make_precon(a)
+assert precon.mu == 1.0
+
+# The LBFGS history is cleared when P is rebuilt:
+for skin, nhistory in [(1.0, 3), (0.0, 0)]:
+    a = atoms.copy()
+    a.calc = EMT()
+    opt = LBFGS(a, precon=Exp(mu=2.0, skin=skin))
+    opt.run(fmax=0.01, steps=4)
+    assert len(opt.s) == len(opt.y) == len(opt.rho) == nhistory
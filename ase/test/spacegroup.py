@@ -0,0 +1,78 @@
+import numpy as np
+
+from ase.lattice.spacegroup import Spacegroup
+from ase.lattice.spacegroup.spacegroup import (SpacegroupNotFoundError,
+                                               SpacegroupValueError,
+                                               spacegroup_from_data)
+
+sg = Spacegroup(225)
+assert sg.symbol == 'F m -3 m'
+assert sg.nsymop == 192
+assert Spacegroup('Fm-3m').no == 225
+assert Spacegroup(225) is not sg
+assert Spacegroup(166, setting=2).setting == 2
+
+# Instances share the data, which must not be changed:
+try:
+    sg.rotations[0, 0, 0] = 2
+except ValueError:
+    pass
+else:
+    assert False
+
+# Replacing the data of one instance does not change the others:
+sg2 = spacegroup_from_data(225, sitesym=['x,y,z'])
+assert sg2.nsymop == 2 * 4
+assert Spacegroup(225).nsymop == 192
+
+for spacegroup, setting in [(231, 1), ('P 7', 1), (1, 2)]:
+    try:
+        Spacegroup(spacegroup, setting)
+    except SpacegroupNotFoundError:
+        pass
+    else:
+        assert False
+
+sites, kinds = Spacegroup(227).equivalent_sites([(0, 0, 0)])
+assert len(sites) == 8
+assert np.all(kinds == np.zeros(8))
+
+# Symmetry-equivalent input positions:
+sg = Spacegroup(225)
+sites, kinds = sg.equivalent_sites([(0, 0, 0), (0.5, 0.5, 0), (0.5, 0, 0)],
+                                   ondublicates='keep')
+assert len(sites) == 8 and kinds == [0, 0, 0, 0, 2, 2, 2, 2]
+sites, kinds = sg.equivalent_sites([(0, 0, 0), (0.5, 0.5, 0), (0.5, 0, 0)],
+                                   ondublicates='replace')
+assert kinds == [1, 1, 1, 1, 2, 2, 2, 2]
+try:
+    sg.equivalent_sites([(0, 0, 0), (1, 0.5, 0.5)])
+except SpacegroupValueError:
+    pass
+else:
+    assert False
+
+# Many general positions:
+scaled = np.random.RandomState(1).rand(100, 3)
+sites, kinds = sg.equivalent_sites(scaled)
+for k in [0, 17, 99]:
+    assert (sites[np.array(kinds) == k] ==
+            sg.equivalent_sites(scaled[k])[0]).all()
+assert len(sg.unique_sites(sites)) == 100
+
+# The binary copy of the database goes to the cache directory, and a
+# broken copy is replaced:
+import os
+from ase.lattice.spacegroup import spacegroup
+spacegroup._cachedir = os.path.abspath('sgcache')
+for content in [None, b'', b'PK\x03\x04 broken']:
+    spacegroup._tables.clear()
+    spacegroup._cache.clear()
+    if content is not None:
+        with open(npzfile, 'wb') as fd:
+            fd.write(content)
+    assert Spacegroup(225).nsymop == 192
+    npzfile, = [os.path.join('sgcache', name)
+                for name in os.listdir('sgcache')]
+    assert npzfile.endswith('.npz')
+    assert os.path.getsize(npzfile) > 1000
@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from ase.transport.calculators import TransportCalculator
+
+# Lead with nearest and next-nearest neighbor hopping:
+H_lead = np.zeros((4, 4))
+for i in range(3):
+    H_lead[i, i + 1] = H_lead[i + 1, i] = -1.0
+for i in range(2):
+    H_lead[i, i + 2] = H_lead[i + 2, i] = 0.2
+
+H_scat = np.zeros((6, 6))
+H_scat[:2, :2] = H_lead[:2, :2]
+H_scat[-2:, -2:] = H_lead[:2, :2]
+H_scat[2, 3] = H_scat[3, 2] = -0.8
+H_scat[1, 2] = H_scat[2, 1] = 0.2
+H_scat[3, 4] = H_scat[4, 3] = 0.2
+
+S_scat = np.identity(6)
+S_scat[2, 3] = S_scat[3, 2] = 0.1
+
+energies = np.arange(-3, 3, 0.02)
+for s in [None, S_scat]:
+    tcalc = TransportCalculator(h=H_scat, h1=H_lead, s=s, eta=0.02,
+                                energies=energies, eigenchannels=2,
+                                dos=True, pdos=[2, 3])
+    ref = [tcalc.get_transmission(), tcalc.get_eigenchannels(),
+           tcalc.get_dos(), tcalc.get_pdos()]
+
+    for batch, executor in [(1, None), (64, None), (1000, None),
+                            (50, ThreadPoolExecutor(2)),
+                            (50, ProcessPoolExecutor(2))]:
+        tcalc.set(batch=batch, executor=executor)
+        results = [tcalc.get_transmission(), tcalc.get_eigenchannels(),
+                   tcalc.get_dos(), tcalc.get_pdos()]
+        for x, y in zip(ref, results):
+            assert x.shape == y.shape
+            assert abs(x - y).max() < 1e-9 * max(1, abs(x).max())
+        if executor is not None:
+            executor.shutdown()
+    print(tcalc.get_transmission().max())
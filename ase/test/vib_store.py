@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from ase import Atoms
+from ase.lattice import bulk
+from ase.calculators.emt import EMT
+from ase.optimize import QuasiNewton
+from ase.vibrations import Vibrations
+from ase.phonons import Phonons
+
+
+class FailingEMT(EMT):
+    """EMT that fails after a number of calculations."""
+    ncalls = 0
+    maxcalls = None
+
+    def calculate(self, *args, **kwargs):
+        FailingEMT.ncalls += 1
+        if self.maxcalls is not None and self.ncalls > self.maxcalls:
+            raise RuntimeError('Stopped')
+        EMT.calculate(self, *args, **kwargs)
+
+
+n2 = Atoms('N2',
+           positions=[(0, 0, 0), (0, 0, 1.1)],
+           calculator=EMT())
+QuasiNewton(n2).run(fmax=0.01)
+vib = Vibrations(n2, name='vibpckl')
+vib.run()
+f0 = vib.get_frequencies()
+
+for executor in [None, ThreadPoolExecutor(2), ProcessPoolExecutor(2)]:
+    vib = Vibrations(n2, name='vibaff', store='vib.aff')
+    vib.clean()
+    vib.run(executor=executor)
+    assert len(vib.store) == 13
+    assert abs(vib.get_frequencies() - f0).max() < 1e-8
+    if executor is not None:
+        executor.shutdown()
+
+# One reader serves all reads until the file is written:
+store = vib.store
+store.read('eq')
+reader = store.reader
+store.read('0x+')
+assert store.reader is reader
+store.write('extra', {'forces': np.zeros((2, 3))})
+assert store.reader is None
+assert abs(store.read('extra')['forces']).max() == 0
+assert len(store.read('0x+')['forces']) == 2
+vib.clean()
+assert len(store) == 0 and store.reader is None
+
+# Resume an interrupted run:
+n2.set_calculator(FailingEMT())
+FailingEMT.maxcalls = 5
+vib = Vibrations(n2, store='vibfail.aff')
+vib.clean()
+try:
+    vib.run()
+except RuntimeError:
+    pass
+assert len(vib.store) == 5
+FailingEMT.maxcalls = None
+FailingEMT.ncalls = 0
+vib = Vibrations(n2, store='vibfail.aff')
+vib.run()
+assert FailingEMT.ncalls == 8
+assert abs(vib.get_frequencies() - f0).max() < 1e-8
+
+# Phonons:
+atoms = bulk('Al', 'fcc', a=4.05)
+energies = []
+for name, store, executor in [('phpckl', None, None),
+                              ('phaff', 'ph.aff', ProcessPoolExecutor(2))]:
+    ph = Phonons(atoms, EMT(), supercell=(3, 3, 3), delta=0.05, name=name,
+                 store=store)
+    ph.run(executor=executor)
+    ph.read(acoustic=True)
+    energies.append(ph.band_structure([[0.5, 0.5, 0], [0.1, 0.2, 0.3]]))
+    ph.clean()
+assert abs(energies[0] - energies[1]).max() < 1e-10
+assert np.all(energies[0] > 0)
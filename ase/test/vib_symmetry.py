@@ -0,0 +1,98 @@
+import numpy as np
+
+from ase.lattice import bulk
+from ase.structure import molecule
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms, Hookean
+from ase.optimize import BFGS
+from ase.phonons import Phonons
+from ase.vibrations import Vibrations
+from ase.vibrations.infrared import InfraRed
+from ase.vibrations.displacements import (get_symmetry_operations,
+                                          IrreducibleDisplacements)
+
+
+class DipoleEMT(EMT):
+    """EMT with the dipole moment of fixed point charges."""
+    def get_dipole_moment(self, atoms):
+        charges = np.where(atoms.numbers == 1, 0.25, -1.0)
+        return np.dot(charges, atoms.positions)
+
+
+# Number of symmetry operations and irreducible displacements:
+atoms = bulk('Al', 'fcc', a=4.05)
+operations = get_symmetry_operations(atoms, (3, 3, 3))
+assert len(operations) == 48 * 27
+for Q, perm in operations:
+    assert abs(np.dot(Q, Q.T) - np.eye(3)).max() < 1e-10
+    assert sorted(perm) == list(range(27))
+assert IrreducibleDisplacements(operations, [0]).displacements == [(0, 0)]
+assert len(get_symmetry_operations(molecule('C6H6'))) == 24
+
+# Phonons:
+for atoms, N_c, refcell in [(bulk('Al', 'fcc', a=4.05), (3, 3, 3), None),
+                            (bulk('NiO', 'rocksalt', a=4.2), (2, 2, 2), None),
+                            (bulk('Cu', 'hcp', a=2.55), (2, 2, 2), 'c')]:
+    energies = []
+    ndisplacements = []
+    for symmetry in [False, True]:
+        ph = Phonons(atoms, EMT(), supercell=N_c, delta=0.01,
+                     name='phsym%d' % symmetry, refcell=refcell,
+                     symmetry=symmetry)
+        ph.run()
+        ph.read(acoustic=True)
+        energies.append(ph.band_structure([[0.5, 0.5, 0], [0.1, 0.2, 0.3]]))
+        ndisplacements.append(len(list(ph.displacements())))
+        ph.clean()
+    print(atoms.get_chemical_formula(), ndisplacements,
+          abs(energies[0] - energies[1]).max())
+    assert ndisplacements[1] < ndisplacements[0]
+    assert abs(energies[0] - energies[1]).max() < 1e-5
+
+# Vibrations and infrared intensities:
+for name in ['CH4', 'NH3']:
+    m = molecule(name)
+    m.set_calculator(DipoleEMT())
+    BFGS(m, logfile=None).run(fmax=1e-5)
+    results = []
+    for symmetry in [False, True]:
+        ir = InfraRed(m, name='irsym%d' % symmetry, delta=0.001,
+                      symmetry=symmetry)
+        ir.run()
+        ir.read()
+        results.append((ir.get_frequencies()[6:].real,
+                        ir.intensities[6:],
+                        len(list(ir.displacements()))))
+        ir.clean()
+    (f0, i0, n0), (f1, i1, n1) = results
+    print(name, n0, n1, abs(f0 - f1).max(), abs(i0 - i1).max())
+    assert n1 < n0
+    assert abs(f0 - f1).max() < 0.05
+    assert abs(i0 - i1).max() < 1e-3 * i0.max()
+
+# Fixed atoms are only mapped onto fixed atoms:
+m = molecule('CO2')
+m.set_calculator(EMT())
+BFGS(m, logfile=None).run(fmax=1e-4)
+for fixed in [[0], [1]]:
+    m.set_constraint(FixAtoms(fixed))
+    H = []
+    for symmetry in [False, True]:
+        vib = Vibrations(m, name='vibfix%d' % symmetry, symmetry=symmetry)
+        vib.run()
+        vib.read()
+        H.append(vib.H)
+        vib.clean()
+    print(fixed, abs(H[0] - H[1]).max())
+    assert abs(H[0] - H[1]).max() < 1e-8
+assert len(get_symmetry_operations(m)) == 1
+m.set_constraint(FixAtoms([0]))
+assert len(get_symmetry_operations(m)) == 2
+
+m.set_constraint(Hookean(1, 2, 3.0, rt=2.5))
+try:
+    get_symmetry_operations(m)
+except ValueError:
+    pass
+else:
+    assert False
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ase.cluster.icosahedron import Icosahedron
+from ase.xrdebye import XrDebye
+
+atoms = Icosahedron('Ag', 3)
+atoms.rattle(0.05)
+atoms.numbers[::3] = 79  # Au
+s = np.linspace(0.1, 0.6, 40)
+
+for method in ['Iwasa', 'Debye']:
+    xrd = XrDebye(wavelength=0.5, method=method)
+    # Debye formula with a double loop over the atoms:
+    ref = []
+    for s1 in s:
+        sinth = xrd.wavelength * s1 / 2
+        costh = np.sqrt(1 - sinth**2)
+        pre = np.exp(-xrd.damping * s1**2 / 2)
+        if method == 'Iwasa':
+            pre *= costh / (1 + xrd.alpha * np.cos(2 * np.arccos(costh))**2)
+            f = [xrd.get_waasmaier(a.symbol, s1) for a in atoms]
+        else:
+            f = atoms.numbers
+        d = atoms.positions[:, np.newaxis] - atoms.positions
+        r = np.sqrt((d**2).sum(2))
+        ref.append(pre * np.dot(f, np.dot(np.sinc(2 * s1 * r), f)))
+    ref = np.array(ref)
+
+    I = xrd.get_pattern(atoms, s)
+    assert abs(I - ref).max() < 1e-10 * ref.max()
+    assert abs(xrd.get(atoms, s[7]) - ref[7]) < 1e-10 * ref.max()
+    with ThreadPoolExecutor(2) as executor:
+        I = xrd.get_pattern(atoms, s, chunksize=7, executor=executor)
+    assert abs(I - ref).max() < 1e-10 * ref.max()
+    I = xrd.get_pattern(atoms, s, binsize=0.01)
+    print(method, abs(I - ref).max() / ref.max())
+    assert abs(I - ref).max() < 1e-3 * ref.max()
@@ -1,4 +1,6 @@
 from __future__ import print_function
+import copy
+
 import numpy as np
 
 from numpy import linalg
@@ -67,6 +69,16 @@ class TransportCalculator:
             The total density of states of the central region.
         box: XXX
             YYY
+        batch : {None, int}, optional
+            Number of energy points to treat together.  The Green
+            functions and lead self-energies of a batch are calculated
+            as stacks of matrices, which is much faster than one energy
+            at a time for small and medium sized systems.  Use None to
+            treat one energy at a time.
+        executor : {None, Executor}, optional
+            An executor from the concurrent.futures module, e.g. a
+            ProcessPoolExecutor, used to calculate the batches
+            concurrently.  Requires batch to be set.
             
         If hc1/hc2 are None, they are assumed to be identical to
         the coupling matrix elements between neareste neighbor
@@ -104,6 +116,8 @@ class TransportCalculator:
                                  'eigenchannels': 0,
                                  'dos': False,
                                  'pdos': [],
+                                 'batch': None,
+                                 'executor': None,
                                  }
         self.initialized = False  # Changed Hamiltonians?
         self.uptodate = False  # Changed energy grid?
@@ -117,7 +131,7 @@ class TransportCalculator:
                 self.initialized = False
                 self.uptodate = False
                 break
-            elif key in ['energies', 'eigenchannels', 'dos', 'pdos']:
+            elif key in ['energies', 'eigenchannels', 'dos', 'pdos', 'batch']:
                 self.uptodate = False
             elif key not in self.input_parameters:
                 raise KeyError('%r not a vaild keyword' % key)
@@ -144,18 +158,18 @@ class TransportCalculator:
         print('# Initializing calculator...', file=self.log)
 
         p = self.input_parameters
-        if p['s'] == None:
+        if p['s'] is None:
             p['s'] = np.identity(len(p['h']))
         
         identical_leads = False
-        if p['h2'] == None:
+        if p['h2'] is None:
             p['h2'] = p['h1'] # Lead2 is idendical to lead1
             identical_leads = True
  
-        if p['s1'] == None:
+        if p['s1'] is None:
             p['s1'] = np.identity(len(p['h1']))
        
-        if p['s2'] == None and not identical_leads:
+        if p['s2'] is None and not identical_leads:
             p['s2'] = np.identity(len(p['h2'])) # Orthonormal basis for lead 2
         else: # Lead2 is idendical to lead1
             p['s2'] = p['s1']
@@ -163,8 +177,8 @@ class TransportCalculator:
            
         h_mm = p['h']
         s_mm = p['s']
-        pl1 = len(p['h1']) / 2
-        pl2 = len(p['h2']) / 2
+        pl1 = len(p['h1']) // 2
+        pl2 = len(p['h2']) // 2
         h1_ii = p['h1'][:pl1, :pl1]
         h1_ij = p['h1'][:pl1, pl1:2 * pl1]
         s1_ii = p['s1'][:pl1, :pl1]
@@ -206,7 +220,7 @@ class TransportCalculator:
                 p['sc2'] = s2_im
 
         align_bf = p['align_bf']
-        if align_bf != None:
+        if align_bf is not None:
             diff = (h_mm[align_bf, align_bf] - h1_ii[align_bf, align_bf]) \
                    / s_mm[align_bf, align_bf]
             print('# Aligning scat. H to left lead H. diff=', diff, file=self.log)
@@ -255,6 +269,11 @@ class TransportCalculator:
         if nchan > 0:
             self.eigenchannels_ne = np.empty((nchan, nepts))
 
+        if p['batch'] is not None:
+            self.update_batches()
+            self.uptodate = True
+            return
+
         for e, energy in enumerate(self.energies):
             Ginv_mm = self.greenfunction.retarded(energy, inverse=True)
             lambda1_mm = self.selfenergies[0].get_lambda(energy)
@@ -281,9 +300,40 @@ class TransportCalculator:
         
         self.uptodate = True
 
+    def update_batches(self):
+        p = self.input_parameters
+        energies = np.asarray(self.energies, float)
+        slices = [slice(e, e + p['batch'])
+                  for e in range(0, len(energies), p['batch'])]
+        args = (p['eigenchannels'], p['dos'], p['pdos'])
+        if p['executor'] is None:
+            results = (transport_batch(self.greenfunction, self.selfenergies,
+                                       energies[s], *args) for s in slices)
+        else:
+            # Each job gets its own copies, since the Green function and
+            # self-energies cache the matrices of the last batch:
+            results = [p['executor'].submit(
+                transport_batch,
+                *copy.deepcopy((self.greenfunction, self.selfenergies)) +
+                (energies[s],) + args) for s in slices]
+            results = (future.result() for future in results)
+
+        for s, (T_e, eigenchannels_ne, dos_e, pdos_ne) in zip(slices,
+                                                               results):
+            self.T_e[s] = T_e
+            for energy, T in zip(energies[s], T_e):
+                print(energy, T, file=self.log)
+            self.log.flush()
+            if eigenchannels_ne is not None:
+                self.eigenchannels_ne[:, s] = eigenchannels_ne
+            if dos_e is not None:
+                self.dos_e[s] = dos_e
+            if pdos_ne is not None:
+                self.pdos_ne[:, s] = pdos_ne
+
     def print_pl_convergence(self):
         self.initialize()
-        pl1 = len(self.input_parameters['h1']) / 2
+        pl1 = len(self.input_parameters['h1']) // 2
         
         h_ii = self.selfenergies[0].h_ii
         s_ii = self.selfenergies[0].s_ii
@@ -295,7 +345,7 @@ class TransportCalculator:
 
     def plot_pl_convergence(self):
         self.initialize()
-        pl1 = len(self.input_parameters['h1']) / 2
+        pl1 = len(self.input_parameters['h1']) // 2
         hlead = self.selfenergies[0].h_ii.real.diagonal()
         hprincipal = self.greenfunction.H.real.diagonal[:pl1]
 
@@ -411,3 +461,31 @@ class TransportCalculator:
         v_in = np.dot(np.dot(s_s_isqrt_ii, ut_ii), c_in)
 
         return T_n, v_in
+
+
+def transport_batch(greenfunction, selfenergies, energies, nchan=0,
+                    dos=False, pdos=[]):
+    """Transport properties at a batch of energies.
+
+    The same quantities as in TransportCalculator.update() are calculated
+    for all energies at once using stacked (nE, N, N) matrices.  Returns
+    the transmission and the eigenchannels, dos and pdos (None if not
+    requested)."""
+    Ginv_emm = greenfunction.retarded_batch(energies, inverse=True)
+    lambda1_emm = selfenergies[0].get_lambda_batch(energies)
+    lambda2_emm = selfenergies[1].get_lambda_batch(energies)
+    a_emm = linalg.solve(Ginv_emm, lambda1_emm)
+    b_emm = linalg.solve(Ginv_emm.conj().swapaxes(1, 2), lambda2_emm)
+    T_emm = np.matmul(a_emm, b_emm)
+    eigenchannels_ne = dos_e = pdos_ne = None
+    if nchan > 0:
+        t_en = np.sort(linalg.eigvals(T_emm).real, axis=1)
+        eigenchannels_ne = t_en[:, -nchan:].T
+        T_e = t_en.sum(1)
+    else:
+        T_e = np.einsum('eii->e', T_emm).real
+    if dos:
+        dos_e = greenfunction.dos_batch(energies)
+    if pdos != []:
+        pdos_ne = np.take(greenfunction.pdos_batch(energies), pdos, axis=1).T
+    return T_e, eigenchannels_ne, dos_e, pdos_ne
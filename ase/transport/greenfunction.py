@@ -10,6 +10,8 @@ class GreenFunction:
         self.eta = eta
         self.energy = None
         self.Ginv = np.empty(H.shape, complex)
+        self.energies = None
+        self.Ginv_emm = None
 
     def retarded(self, energy, inverse=False):
         """Get retarded Green function at specified energy.
@@ -22,7 +24,7 @@ class GreenFunction:
 
             if self.S is None:
                 self.Ginv[:] = 0.0
-                self.Ginv.flat[:: len(self.S) + 1] = z
+                self.Ginv.flat[:: len(self.H) + 1] = z
             else:
                 self.Ginv[:] = z
                 self.Ginv *= self.S
@@ -36,6 +38,29 @@ class GreenFunction:
         else:
             return np.linalg.inv(self.Ginv)
 
+    def retarded_batch(self, energies, inverse=False):
+        """Get retarded Green functions at many energies.
+
+        Returns an (nE, n, n) array.  If 'inverse' is True, the inverse
+        Green functions are returned (faster)."""
+        energies = np.asarray(energies, float)
+        if self.energies is None or not np.array_equal(energies,
+                                                       self.energies):
+            self.energies = energies.copy()
+            z_e = (energies + self.eta * 1.j)[:, np.newaxis, np.newaxis]
+            if self.S is None:
+                self.Ginv_emm = z_e * np.identity(len(self.H)) - self.H
+            else:
+                self.Ginv_emm = z_e * self.S - self.H
+
+            for selfenergy in self.selfenergies:
+                self.Ginv_emm -= selfenergy.retarded_batch(energies)
+
+        if inverse:
+            return self.Ginv_emm
+        else:
+            return np.linalg.inv(self.Ginv_emm)
+
     def calculate(self, energy, sigma):
         """XXX is this really needed"""
         ginv = energy * self.S - self.H - sigma 
@@ -48,6 +73,27 @@ class GreenFunction:
         """
         return np.linalg.solve(self.retarded(energy, inverse=True), X)
 
+    def dos_batch(self, energies):
+        """Total density of states at many energies (see dos)."""
+        if self.S is None:
+            G_emm = self.retarded_batch(energies)
+        else:
+            Ginv_emm = self.retarded_batch(energies, True)
+            G_emm = np.linalg.solve(Ginv_emm,
+                                    np.broadcast_to(self.S, Ginv_emm.shape))
+        return -np.einsum('eii->e', G_emm).imag / np.pi
+
+    def pdos_batch(self, energies):
+        """Projected density of states at many energies (see pdos)."""
+        if self.S is None:
+            return -np.einsum('eii->ei',
+                              self.retarded_batch(energies)).imag / np.pi
+        S = self.S
+        Ginv_emm = self.retarded_batch(energies, True)
+        SGS_emm = np.matmul(S, np.linalg.solve(
+            Ginv_emm, np.broadcast_to(S, Ginv_emm.shape)))
+        return -(np.einsum('eii->ei', SGS_emm) / S.diagonal()).imag / np.pi
+
     def dos(self, energy):
         """Total density of states -1/pi Im(Tr(GS))"""
         if self.S is None:
@@ -13,6 +13,8 @@ class LeadSelfEnergy:
         self.energy = None
         self.bias = 0
         self.sigma_mm = np.empty((self.nbf, self.nbf), complex)
+        self.energies = None
+        self.sigma_emm = None
     
     def retarded(self, energy):
         """Return self-energy (sigma) evaluated at specified energy."""
@@ -26,8 +28,25 @@ class LeadSelfEnergy:
 
         return self.sigma_mm
 
+    def retarded_batch(self, energies):
+        """Return self-energies at many energies as an (nE, n, n) array."""
+        energies = np.asarray(energies, float)
+        if self.energies is None or not np.array_equal(energies,
+                                                       self.energies):
+            self.energies = energies.copy()
+            z_e = energies - self.bias + self.eta * 1.j
+            z_e = z_e[:, np.newaxis, np.newaxis]
+            tau_eim = z_e * self.s_im - self.h_im
+            a_eim = np.linalg.solve(self.get_sgfinv_batch(energies), tau_eim)
+            tau_emi = z_e * self.s_im.T.conj() - self.h_im.T.conj()
+            self.sigma_emm = np.matmul(tau_emi, a_eim)
+
+        return self.sigma_emm
+
     def set_bias(self, bias):
         self.bias = bias
+        self.energy = None
+        self.energies = None
 
     def get_lambda(self, energy):
         """Return the lambda (aka Gamma) defined by i(S-S^d).
@@ -37,6 +56,11 @@ class LeadSelfEnergy:
         """
         sigma_mm = self.retarded(energy)
         return 1.j * (sigma_mm - sigma_mm.T.conj())
+
+    def get_lambda_batch(self, energies):
+        """Return lambda at many energies (see get_lambda)."""
+        sigma_emm = self.retarded_batch(energies)
+        return 1.j * (sigma_emm - sigma_emm.conj().swapaxes(1, 2))
         
     def get_sgfinv(self, energy):
         """The inverse of the retarded surface Green function""" 
@@ -61,6 +85,33 @@ class LeadSelfEnergy:
 
         return v_00
 
+    def get_sgfinv_batch(self, energies):
+        """Inverse surface Green functions at many energies.
+
+        The decimation is done for all energies at once; energies drop
+        out of the iteration as they converge."""
+        z_e = (np.asarray(energies) - self.bias +
+               self.eta * 1.j)[:, np.newaxis, np.newaxis]
+
+        v_e00 = z_e * self.s_ii.T.conj() - self.h_ii.T.conj()
+        v_e11 = v_e00.copy()
+        v_e10 = z_e * self.s_ij - self.h_ij
+        v_e01 = z_e * self.s_ij.T.conj() - self.h_ij.T.conj()
+
+        # Energies not yet converged:
+        e = np.arange(len(z_e))
+        while len(e):
+            a = np.linalg.solve(v_e11[e], v_e01[e])
+            b = np.linalg.solve(v_e11[e], v_e10[e])
+            v_01_dot_b = np.matmul(v_e01[e], b)
+            v_e00[e] -= v_01_dot_b
+            v_e11[e] -= np.matmul(v_e10[e], a) + v_01_dot_b
+            v_e01[e] = -np.matmul(v_e01[e], a)
+            v_e10[e] = -np.matmul(v_e10[e], b)
+            e = e[abs(v_e01[e]).max(axis=(1, 2)) > self.conv]
+
+        return v_e00
+
 
 class BoxProbe:
     """Box shaped Buttinger probe.
@@ -80,4 +131,8 @@ class BoxProbe:
     
     def retarded(self, energy):
         return self.selfenergy_e[self.energies.searchsorted(energy)] * self.S
+
+    def retarded_batch(self, energies):
+        se_e = self.selfenergy_e[self.energies.searchsorted(energies)]
+        return se_e[:, np.newaxis, np.newaxis] * self.S
         
@@ -5,6 +5,8 @@ from __future__ import print_function
 """Utility tools for convenient creation of slabs and interfaces of
 different orientations."""
 
+import itertools
+
 import numpy as np
 
 
@@ -563,6 +565,11 @@ def minimize_tilt(atoms, order=range(3), fold_atoms=True):
 
 def find_mic(D, cell, pbc=True):
     """Finds the minimum-image representation of vector(s) D"""
+    D = np.asarray(D, float)
+    pbc = np.zeros(3, bool) | np.asarray(pbc, bool)
+    if not pbc.any():
+        return D, np.sqrt((D**2).sum(1))
+
     # Calculate the 4 unique unit cell diagonal lengths
     diags = np.sqrt((np.dot([[1, 1, 1],
                              [-1, 1, 1],
@@ -570,62 +577,154 @@ def find_mic(D, cell, pbc=True):
                              [-1, -1, 1],
                              ], cell)**2).sum(1))
 
-    # calculate 'mic' vectors (D) and lengths (D_len) using simple method
-    Dr = np.dot(D, np.linalg.inv(cell))
-    D = np.dot(Dr - np.round(Dr) * pbc, cell)
-    D_len = np.sqrt((D**2).sum(1))
-    # return mic vectors and lengths for only orthorhombic cells,
-    # as the results may be wrong for non-orthorhombic cells
+    # return mic vectors and lengths for orthorhombic cells using the
+    # simple method, as the results may be wrong for non-orthorhombic cells
     if (max(diags) - min(diags)) / max(diags) < 1e-9:
-        return D, D_len
-
-    # The cutoff radius is the longest direct distance between atoms
-    # or half the longest lattice diagonal, whichever is smaller
-    cutoff = min(max(D_len), max(diags) / 2.)
-
-    # The number of neighboring images to search in each direction is
-    # equal to the ceiling of the cutoff distance (defined above) divided
-    # by the length of the projection of the lattice vector onto its
-    # corresponding surface normal. a's surface normal vector is e.g.
-    # b x c / (|b| |c|), so this projection is (a . (b x c)) / (|b| |c|).
-    # The numerator is just the lattice volume, so this can be simplified
-    # to V / (|b| |c|). This is rewritten as V |a| / (|a| |b| |c|)
-    # for vectorization purposes.
-    latt_len = np.sqrt((cell**2).sum(1))
-    V = abs(np.linalg.det(cell))
-    n = pbc * np.array(np.ceil(cutoff * np.prod(latt_len) /
-                               (V * latt_len)), dtype=int)
-
-    # Construct a list of translation vectors. For example, if we are
-    # searching only the nearest images (27 total), tvecs will be a
-    # 27x3 array of translation vectors. This is the only nested loop
-    # in the routine, and it takes a very small fraction of the total
-    # execution time, so it is not worth optimizing further.
-    tvecs = []
-    for i in range(-n[0], n[0] + 1):
-        latt_a = i * cell[0]
-        for j in range(-n[1], n[1] + 1):
-            latt_ab = latt_a + j * cell[1]
-            for k in range(-n[2], n[2] + 1):
-                tvecs.append(latt_ab + k * cell[2])
-    tvecs = np.array(tvecs)
-
-    # Translate the direct displacement vectors by each translation
-    # vector, and calculate the corresponding lengths.
-    D_trans = tvecs[np.newaxis] + D[:, np.newaxis]
-    D_trans_len = np.sqrt((D_trans**2).sum(2))
-
-    # Find mic distances and corresponding vector(s) for each given pair
-    # of atoms. For symmetrical systems, there may be more than one
-    # translation vector corresponding to the MIC distance; this finds the
-    # first one in D_trans_len.
-    D_min_len = np.min(D_trans_len, axis=1)
-    D_min_ind = D_trans_len.argmin(axis=1)
-    D_min = D_trans[range(len(D_min_ind)), D_min_ind]
+        Dr = np.dot(D, np.linalg.inv(cell))
+        D = np.dot(Dr - np.round(Dr) * pbc, cell)
+        return D, np.sqrt((D**2).sum(1))
+
+    # In a reduced basis of the periodic lattice, the minimum image of
+    # a vector wrapped into the reduced cell is the vector itself or
+    # one of its images translated by -1, 0 or 1 reduced cell vectors:
+    basis = reduced_lattice_basis(cell, pbc)
+    tvecs = np.dot(list(itertools.product([-1, 0, 1], repeat=len(basis))),
+                   basis)
+    pinv = np.linalg.pinv(basis)
+    # If several images are equally short, the first one is chosen
+    # with the translations sorted by their coefficients in the
+    # original cell vectors:
+    coefs = np.round(np.dot(tvecs, np.linalg.pinv(np.array(cell)[pbc])))
+    tvecs = tvecs[np.lexsort(coefs.T[::-1])]
+
+    D_min = np.empty_like(D)
+    D_min_len = np.empty(len(D))
+    # Chunks of vectors keep the (n, 27, 3) temporary array small:
+    chunksize = 2**16
+    for i in range(0, len(D), chunksize):
+        Dw = D[i:i + chunksize]
+        Dw = Dw - np.dot(np.round(np.dot(Dw, pinv)), basis)
+        D_trans = Dw[:, np.newaxis] + tvecs
+        D_trans_len = np.sqrt((D_trans**2).sum(2))
+        # For symmetrical systems, there may be more than one
+        # translation vector corresponding to the MIC distance; this
+        # finds the first one.
+        D_len = D_trans_len.min(axis=1)[:, np.newaxis]
+        ind = (D_trans_len <= D_len * (1 + 1e-10)).argmax(axis=1)
+        D_min[i:i + chunksize] = D_trans[np.arange(len(ind)), ind]
+        D_min_len[i:i + chunksize] = D_trans_len[np.arange(len(ind)), ind]
 
     return D_min, D_min_len
 
 
+def reduced_lattice_basis(cell, pbc=True):
+    """Reduced basis for the lattice of the periodic cell vectors.
+
+    Returns an array with a row for each periodic direction: the Niggli
+    reduced cell for three periodic directions and a Lagrange-Gauss
+    reduced basis for two."""
+    pbc = np.zeros(3, bool) | np.asarray(pbc, bool)
+    basis = np.array(cell, float)[pbc]
+    if len(basis) == 3:
+        return niggli_reduce_cell(basis)[0]
+    if len(basis) == 2:
+        a, b = basis
+        while True:
+            if np.dot(b, b) < np.dot(a, a):
+                a, b = b, a
+            mu = np.round(np.dot(a, b) / np.dot(a, a))
+            if mu == 0:
+                break
+            b = b - mu * a
+        basis = np.array([a, b])
+    return basis
+
+
+def get_distances_within(positions, rcut, cell=None, pbc=False,
+                         mic=False):
+    """Find all pairs of positions closer than rcut.
+
+    The positions are sorted into cubic bins of size rcut, so that only
+    neighbouring bins are compared.  With mic=True, the minimum-image
+    distance is used along the periodic directions of cell.
+
+    Returns arrays i, j, D and d with one entry for each pair with
+    i < j, sorted by i and j: the indices, the distance vectors from
+    positions[i] to (the minimum image of) positions[j] and the
+    distances."""
+    positions = np.asarray(positions, float)
+    natoms = len(positions)
+    pbc = np.zeros(3, bool) | np.asarray(pbc, bool)
+    if not mic:
+        pbc = np.zeros(3, bool)
+
+    index = np.arange(natoms)
+    points = positions
+    if pbc.any():
+        # Wrap the positions into the cell and add the periodic images
+        # within rcut of it:
+        cell = np.asarray(cell, float)
+        icell = np.linalg.inv(cell)
+        scaled = np.dot(positions, icell)
+        scaled[:, pbc] %= 1.0
+        points = np.dot(scaled, cell)
+        # Distance between lattice planes:
+        h_c = 1 / np.sqrt((icell**2).sum(0))
+        margin_c = np.where(pbc, rcut / h_c, np.inf)
+        n_c = np.where(pbc, np.ceil(margin_c), 0).astype(int)
+        lo_c = scaled.min(0) - margin_c
+        hi_c = scaled.max(0) + margin_c
+        images = [points]
+        indices = [index]
+        for shift in itertools.product(*[range(-n, n + 1) for n in n_c]):
+            if not any(shift):
+                continue
+            s = scaled + shift
+            m = ((s > lo_c) & (s < hi_c)).all(1)
+            images.append(np.dot(s[m], cell))
+            indices.append(index[m])
+        points = np.concatenate(images)
+        index = np.concatenate(indices)
+
+    # Bins and neighbouring bins:
+    bin_pc = np.floor((points - points.min(0)) / rcut).astype(int)
+    nbins_c = bin_pc.max(0) + 3
+    bin_pc += 1
+    key_p = np.dot(bin_pc, [nbins_c[1] * nbins_c[2], nbins_c[2], 1])
+    order = np.argsort(key_p, kind='mergesort')
+    sorted_keys = key_p[order]
+
+    i_x = []
+    j_x = []
+    for offset in itertools.product([-1, 0, 1], repeat=3):
+        key = np.dot(bin_pc[:natoms] + offset,
+                     [nbins_c[1] * nbins_c[2], nbins_c[2], 1])
+        start = np.searchsorted(sorted_keys, key, 'left')
+        count = np.searchsorted(sorted_keys, key, 'right') - start
+        i = np.repeat(np.arange(natoms), count)
+        k = (np.arange(count.sum()) +
+             np.repeat(start - np.cumsum(count) + count, count))
+        p = order[k]
+        m = index[p] > i
+        i_x.append(i[m])
+        j_x.append(p[m])
+    i = np.concatenate(i_x)
+    p = np.concatenate(j_x)
+    D = points[p] - points[i]
+    d = np.sqrt((D**2).sum(1))
+    m = d < rcut
+    i, j, D, d = i[m], index[p[m]], D[m], d[m]
+
+    # Sort and keep the shortest distance for each pair:
+    order = np.lexsort((d, j, i))
+    i, j, D, d = i[order], j[order], D[order], d[order]
+    if len(i):
+        first = np.concatenate(([True], (i[1:] != i[:-1]) |
+                                (j[1:] != j[:-1])))
+        i, j, D, d = i[first], j[first], D[first], d[first]
+    return i, j, D, d
+
+
 def niggli_reduce(atoms):
     """Convert the supplied atoms object's unit cell into its
     maximally-reduced Niggli unit cell. Even if the unit cell is already
@@ -646,23 +745,44 @@ def niggli_reduce(atoms):
     """
 
     assert all(atoms.pbc), 'Can only reduce 3d periodic unit cells!'
+    G, C = _niggli_reduce(atoms.cell)
+    scpos = np.dot(atoms.get_scaled_positions(), np.linalg.inv(C).T)
+    scpos %= 1.0
+    scpos %= 1.0
+
+    atoms.set_cell(G.get_new_cell())
+    atoms.set_scaled_positions(scpos)
+
+
+def niggli_reduce_cell(cell):
+    """Return the Niggli reduced cell and the transformation to it.
+
+    Unlike :func:`niggli_reduce`, the cell is not rotated: the reduced
+    cell vectors are integer combinations of the rows of cell,
+    ``np.dot(C.T, cell)``, spanning the same lattice.  Returns the
+    reduced cell and the integer matrix C."""
+    G, C = _niggli_reduce(cell)
+    return np.dot(C.T, cell), C
+
+
+def _niggli_reduce(cell):
     C = np.eye(3, dtype=int)
 
     class _gtensor(object):
         """The G tensor as defined in Grosse-Kunstleve."""
-        def __init__(self, atoms):
+        def __init__(self, cell):
 
-            self.atoms = atoms
+            self.cell = cell
 
-            self.epsilon = 1e-5 * atoms.get_volume()**(1. / 3.)
+            self.epsilon = 1e-5 * abs(np.linalg.det(cell))**(1. / 3.)
 
-            self.a = np.dot(atoms.cell[0], atoms.cell[0])
-            self.b = np.dot(atoms.cell[1], atoms.cell[1])
-            self.c = np.dot(atoms.cell[2], atoms.cell[2])
+            self.a = np.dot(cell[0], cell[0])
+            self.b = np.dot(cell[1], cell[1])
+            self.c = np.dot(cell[2], cell[2])
 
-            self.x = 2 * np.dot(atoms.cell[1], atoms.cell[2])
-            self.y = 2 * np.dot(atoms.cell[0], atoms.cell[2])
-            self.z = 2 * np.dot(atoms.cell[0], atoms.cell[1])
+            self.x = 2 * np.dot(cell[1], cell[2])
+            self.y = 2 * np.dot(cell[0], cell[2])
+            self.z = 2 * np.dot(cell[0], cell[1])
 
             self._G = np.array([[self.a, self.z / 2., self.y / 2.],
                                 [self.z / 2., self.b, self.x / 2.],
@@ -709,9 +829,9 @@ def niggli_reduce(atoms):
             b = np.sqrt(self.b)
             c = np.sqrt(self.c)
 
-            ad = self.atoms.cell[0] / np.linalg.norm(self.atoms.cell[0])
+            ad = self.cell[0] / np.linalg.norm(self.cell[0])
 
-            Z = np.cross(self.atoms.cell[0], self.atoms.cell[1])
+            Z = np.cross(self.cell[0], self.cell[1])
             Z /= np.linalg.norm(Z)
             X = ad - np.dot(ad, Z) * Z
             X /= np.linalg.norm(X)
@@ -732,7 +852,7 @@ def niggli_reduce(atoms):
             abc = np.vstack((va, vb, vc))
             T = np.vstack((X, Y, Z))
             return np.dot(abc, T)
-    G = _gtensor(atoms)
+    G = _gtensor(cell)
 
     # Once A2 and A5-A8 all evaluate to False, the unit cell will have
     # been fully reduced.
@@ -834,12 +954,7 @@ def niggli_reduce(atoms):
     else:
         raise RuntimeError('Niggli did not converge \
                 in {n} iterations!'.format(n=count))
-    scpos = np.dot(atoms.get_scaled_positions(), np.linalg.inv(C).T)
-    scpos %= 1.0
-    scpos %= 1.0
-
-    atoms.set_cell(G.get_new_cell())
-    atoms.set_scaled_positions(scpos)
+    return G, C
 
 # Self test
 if __name__ == '__main__':
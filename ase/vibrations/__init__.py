@@ -14,6 +14,10 @@ import ase.units as units
 from ase.io.trajectory import Trajectory
 from ase.parallel import rank, paropen
 from ase.utils import opencew
+from ase.vibrations.displacements import (DisplacementStore, submit,
+                                          as_completed, apply_constraints,
+                                          get_symmetry_operations,
+                                          IrreducibleDisplacements)
 
 
 class Vibrations:
@@ -43,6 +47,16 @@ class Vibrations:
         Number of displacements per atom and cartesian coordinate, 2 and 4 are
         supported. Default is 2 which will displace each atom +delta and
         -delta for each cartesian coordinate.
+    store: str or DisplacementStore
+        Name of an AFF file (see ase.io.aff) for the results of all
+        displacements.  Default is one pickle file per displacement.
+    symmetry: bool
+        Use the symmetry of the atoms to calculate only the irreducible
+        displacements.  The forces for the other displacements are
+        obtained by rotating those.  The same atoms (in the same
+        positions) must be used for run() and read().  Fixed atoms
+        (FixAtoms) are only mapped onto fixed atoms; other constraints
+        can not be combined with symmetry.
 
     Example:
 
@@ -59,19 +73,19 @@ class Vibrations:
     BFGS:   3  16:01:21        0.262777       0.0088
     >>> vib = Vibrations(n2)
     >>> vib.run()
-    Writing vib.eq.pckl
-    Writing vib.0x-.pckl
-    Writing vib.0x+.pckl
-    Writing vib.0y-.pckl
-    Writing vib.0y+.pckl
-    Writing vib.0z-.pckl
-    Writing vib.0z+.pckl
-    Writing vib.1x-.pckl
-    Writing vib.1x+.pckl
-    Writing vib.1y-.pckl
-    Writing vib.1y+.pckl
-    Writing vib.1z-.pckl
-    Writing vib.1z+.pckl
+    Writing vib.eq.pckl [1/13]
+    Writing vib.0x-.pckl [2/13]
+    Writing vib.0x+.pckl [3/13]
+    Writing vib.0y-.pckl [4/13]
+    Writing vib.0y+.pckl [5/13]
+    Writing vib.0z-.pckl [6/13]
+    Writing vib.0z+.pckl [7/13]
+    Writing vib.1x-.pckl [8/13]
+    Writing vib.1x+.pckl [9/13]
+    Writing vib.1y-.pckl [10/13]
+    Writing vib.1y+.pckl [11/13]
+    Writing vib.1z-.pckl [12/13]
+    Writing vib.1z+.pckl [13/13]
     >>> vib.summary()
     ---------------------
     #    meV     cm^-1
@@ -88,7 +102,8 @@ class Vibrations:
 
     """
 
-    def __init__(self, atoms, indices=None, name='vib', delta=0.01, nfree=2):
+    def __init__(self, atoms, indices=None, name='vib', delta=0.01, nfree=2,
+                 store=None, symmetry=False):
         assert nfree in [2, 4]
         self.atoms = atoms
         if indices is None:
@@ -97,10 +112,41 @@ class Vibrations:
         self.name = name
         self.delta = delta
         self.nfree = nfree
+        if isinstance(store, str):
+            store = DisplacementStore(store)
+        self.store = store
+        self.symmetry = symmetry
+        self.reduction = None
         self.H = None
         self.ir = None
 
-    def run(self):
+    def get_reduction(self):
+        """Irreducible displacements (see IrreducibleDisplacements)."""
+        if self.reduction is None:
+            self.reduction = IrreducibleDisplacements(
+                get_symmetry_operations(self.atoms), self.indices)
+        return self.reduction
+
+    def displacements(self, symmetry=None):
+        """Yield key, atom, direction and size of all displacements.
+
+        The first one is the equilibrium structure with key 'eq'.  With
+        symmetry, only the irreducible displacements are included."""
+        if symmetry is None:
+            symmetry = self.symmetry
+        if symmetry:
+            needed = set(self.get_reduction().displacements)
+        yield 'eq', None, None, 0.0
+        for a in self.indices:
+            for i in range(3):
+                if symmetry and (a, i) not in needed:
+                    continue
+                for sign in [-1, 1]:
+                    for ndis in range(1, self.nfree // 2 + 1):
+                        key = '%d%s%s' % (a, 'xyz'[i], ndis * ' +-'[sign])
+                        yield key, a, i, ndis * sign * self.delta
+
+    def run(self, pool=None, executor=None):
         """Run the vibration calculations.
 
         This will calculate the forces for 6 displacements per atom +/-x,
@@ -114,59 +160,146 @@ class Vibrations:
         simultaneously by several independent processes. This feature relies
         on the existence of files and the subsequent creation of the file in
         case it is not found.
+
+        If a JobPool (see ase.calculators.calculator) is given, all
+        displacements are submitted to the pool with the submit() method of
+        the calculator (a FileIOCalculator) and run concurrently.
+
+        If an executor (e.g. a ProcessPoolExecutor from the
+        concurrent.futures module) is given, the displacements are
+        calculated concurrently by its workers, each with its own copy of
+        the calculator.  The results are written as they come in.
+
+        If the results are kept in a store (see the *store* argument),
+        the displacements already in the store are skipped.
         """
 
-        filename = self.name + '.eq.pckl'
-        fd = opencew(filename)
-        if fd is not None:
-            self.calculate(filename, fd)
+        if pool is None and executor is None:
+            jobs = None
+        else:
+            jobs = []
 
+        displacements = list(self.displacements())
+        self.progress = [0, len(displacements)]
         p = self.atoms.positions.copy()
-        for a in self.indices:
-            for i in range(3):
-                for sign in [-1, 1]:
-                    for ndis in range(1, self.nfree // 2 + 1):
-                        filename = ('%s.%d%s%s.pckl' %
-                                    (self.name, a, 'xyz'[i],
-                                     ndis * ' +-'[sign]))
-                        if (isfile(filename) and getsize(filename) == 0
-                            and rank == 0):
-                            remove(filename)
-                        fd = opencew(filename)
-                        if fd is not None:
-                            disp = ndis * sign * self.delta
-                            self.atoms.positions[a, i] = p[a, i] + disp
-                            self.calculate(filename, fd)
-                            self.atoms.positions[a, i] = p[a, i]
-
-    def calculate(self, filename, fd):
+        for key, a, i, disp in displacements:
+            fd = self.claim(key)
+            if fd is None:
+                self.progress[0] += 1
+                continue
+            if a is not None:
+                self.atoms.positions[a, i] = p[a, i] + disp
+            try:
+                self.start(key, fd, jobs, pool, executor)
+            finally:
+                self.atoms.positions[:] = p
+
+        if jobs:
+            for key, fd, future, atoms in as_completed(jobs):
+                results = apply_constraints(atoms, future.result())
+                self.write_output(key, fd, results['forces'],
+                                  results.get('dipole'))
+
+    def get_filename(self, key):
+        return '%s.%s.pckl' % (self.name, key)
+
+    def claim(self, key):
+        """Claim a displacement for calculation.
+
+        Returns None if it is already done (or being done by another
+        process), otherwise an open file (or the store) for the result."""
+        if self.store is not None:
+            if key in self.store:
+                return None
+            return self.store
+        filename = self.get_filename(key)
+        if (key != 'eq' and isfile(filename) and getsize(filename) == 0
+            and rank == 0):
+            remove(filename)
+        return opencew(filename)
+
+    def start(self, key, fd, jobs, pool, executor=None):
+        """Calculate now or submit calculation to pool or executor."""
+        properties = ['forces']
+        if self.ir:
+            properties.append('dipole')
+        if executor is not None:
+            future = submit(executor, self.atoms, self.atoms.get_calculator(),
+                            properties)
+            jobs.append((key, fd, future, self.atoms.copy()))
+        elif pool is None:
+            self.calculate(key, fd)
+        else:
+            future = self.atoms.get_calculator().submit(
+                self.atoms, properties, pool=pool)
+            jobs.append((key, fd, future, self.atoms.copy()))
+
+    def calculate(self, key, fd):
         forces = self.atoms.get_forces()
         if self.ir:
             dipole = self.calc.get_dipole_moment(self.atoms)
+        else:
+            dipole = None
+        self.write_output(key, fd, forces, dipole)
+
+    def write_output(self, key, fd, forces, dipole=None):
+        self.progress[0] += 1
+        if self.store is not None:
+            results = {'forces': forces}
+            if self.ir:
+                results['dipole'] = dipole
+            self.store.write(key, results)
+            filename = '%s in %s' % (key, self.store.filename)
+        else:
+            filename = self.get_filename(key)
         if rank == 0:
+            if self.store is None:
+                if self.ir:
+                    pickle.dump([forces, dipole], fd)
+                else:
+                    pickle.dump(forces, fd)
+                fd.close()
             if self.ir:
-                pickle.dump([forces, dipole], fd)
                 sys.stdout.write(
-                    'Writing %s, dipole moment = (%.6f %.6f %.6f)\n' %
+                    'Writing %s, dipole moment = (%.6f %.6f %.6f)' %
                     (filename, dipole[0], dipole[1], dipole[2]))
             else:
-                pickle.dump(forces, fd)
-                sys.stdout.write('Writing %s\n' % filename)
-            fd.close()
+                sys.stdout.write('Writing %s' % filename)
+            sys.stdout.write(' [%d/%d]\n' % tuple(self.progress))
         sys.stdout.flush()
 
+    def load(self, key):
+        """Return forces and dipole moment (None if not calculated) of a
+        displacement."""
+        if self.store is not None:
+            results = self.store.read(key)
+            return results['forces'], results.get('dipole')
+        f = pickle.load(open(self.get_filename(key), 'rb'))
+        if not hasattr(f, 'shape'):
+            # output from InfraRed
+            return f[0], f[1]
+        return f, None
+
     def clean(self):
-        if isfile(self.name + '.eq.pckl'):
-            remove(self.name + '.eq.pckl')
+        if self.store is not None:
+            self.store.remove()
+            return
 
-        for a in self.indices:
-            for i in 'xyz':
-                for sign in '-+':
-                    for ndis in range(1, self.nfree // 2 + 1):
-                        name = '%s.%d%s%s.pckl' % (self.name, a, i,
-                                                   ndis * sign)
-                        if isfile(name):
-                            remove(name)
+        for key, a, i, disp in self.displacements(symmetry=False):
+            name = self.get_filename(key)
+            if isfile(name):
+                remove(name)
+
+    def get_derivatives(self, derivative):
+        """Derivatives for displacements of all atoms in all directions.
+
+        derivative(a, i) returns a list of arrays (see
+        IrreducibleDisplacements.reconstruct()).  With symmetry, it is
+        only called for the irreducible displacements."""
+        if self.symmetry:
+            return self.get_reduction().reconstruct(derivative)
+        return dict((a, [derivative(a, i) for i in range(3)])
+                    for a in self.indices)
 
     def read(self, method='standard', direction='central'):
         self.method = method.lower()
@@ -174,46 +307,45 @@ class Vibrations:
         assert self.method in ['standard', 'frederiksen']
         assert self.direction in ['central', 'forward', 'backward']
 
-        def load(fname):
-            f = pickle.load(open(fname, 'rb'))
-            if not hasattr(f, 'shape'):
-                # output from InfraRed
-                return f[0]
-            return f
+        def load(key):
+            return self.load(key)[0]
 
+        if direction != 'central':
+            feq = load('eq')
+
+        def derivative(a, i):
+            name = '%d%s' % (a, 'xyz'[i])
+            fminus = load(name + '-')
+            fplus = load(name + '+')
+            if self.method == 'frederiksen':
+                fminus[a] -= fminus.sum(0)
+                fplus[a] -= fplus.sum(0)
+            if self.nfree == 4:
+                fminusminus = load(name + '--')
+                fplusplus = load(name + '++')
+                if self.method == 'frederiksen':
+                    fminusminus[a] -= fminusminus.sum(0)
+                    fplusplus[a] -= fplusplus.sum(0)
+            if self.direction == 'central':
+                if self.nfree == 2:
+                    f = .5 * (fminus - fplus)
+                else:
+                    f = (-fminusminus + 8 * fminus - 8 * fplus +
+                         fplusplus) / 12.0
+            elif self.direction == 'forward':
+                f = feq - fplus
+            else:
+                assert self.direction == 'backward'
+                f = fminus - feq
+            return [f / (2 * self.delta)]
+
+        derivatives = self.get_derivatives(derivative)
         n = 3 * len(self.indices)
         H = np.empty((n, n))
         r = 0
-        if direction != 'central':
-            feq = load(self.name + '.eq.pckl')
         for a in self.indices:
-            for i in 'xyz':
-                name = '%s.%d%s' % (self.name, a, i)
-                fminus = load(name + '-.pckl')
-                fplus = load(name + '+.pckl')
-                if self.method == 'frederiksen':
-                    fminus[a] -= fminus.sum(0)
-                    fplus[a] -= fplus.sum(0)
-                if self.nfree == 4:
-                    fminusminus = load(name + '--.pckl')
-                    fplusplus = load(name + '++.pckl')
-                    if self.method == 'frederiksen':
-                        fminusminus[a] -= fminusminus.sum(0)
-                        fplusplus[a] -= fplusplus.sum(0)
-                if self.direction == 'central':
-                    if self.nfree == 2:
-                        H[r] = .5 * (fminus - fplus)[self.indices].ravel()
-                    else:
-                        H[r] = H[r] = (-fminusminus +
-                                       8 * fminus -
-                                       8 * fplus +
-                                       fplusplus)[self.indices].ravel() / 12.0
-                elif self.direction == 'forward':
-                    H[r] = (feq - fplus)[self.indices].ravel()
-                else:
-                    assert self.direction == 'backward'
-                    H[r] = (fminus - feq)[self.indices].ravel()
-                H[r] /= 2 * self.delta
+            for i in range(3):
+                H[r] = derivatives[a][i][0][self.indices].ravel()
                 r += 1
         H += H.copy().T
         self.H = H
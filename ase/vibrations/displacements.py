@@ -0,0 +1,391 @@
+"""Storage and concurrent calculation of finite-difference displacements.
+
+Used by :class:`ase.vibrations.Vibrations`, :class:`ase.vibrations.InfraRed`
+and :class:`ase.phonons.Phonons`.  Instead of one pickle file per
+displacement, the results can be kept in a single AFF file (see
+:mod:`ase.io.aff`), and the displacements can be calculated concurrently
+by an executor from the :mod:`concurrent.futures` module::
+
+    from concurrent.futures import ProcessPoolExecutor
+    vib = Vibrations(atoms, store='vib.aff')
+    with ProcessPoolExecutor(4) as executor:
+        vib.run(executor=executor)
+"""
+
+import copy
+import itertools
+from os import remove
+from os.path import isfile, getsize
+
+import numpy as np
+
+from ase.constraints import FixAtoms
+from ase.io.aff import affopen
+from ase.parallel import rank
+
+
+class DisplacementStore:
+    """Results of all displacements in one AFF file.
+
+    Each displacement is one item holding its key (e.g. 'eq' or '0x+')
+    and the calculated arrays.  Items are appended as the calculations
+    finish, so after an interruption only the displacements that were
+    being calculated are lost, and a new run skips those already in the
+    file.
+
+    The file must only be written by one run at a time.  With one
+    pickle file per displacement, several independent runs (or jobs in
+    a queue) could share the work, because each file was claimed with
+    opencew() before it was calculated.  A store can not be shared
+    like that: concurrent appends corrupt the file.  Use an executor
+    to calculate the displacements concurrently instead."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.index = {}  # key -> item number
+        self.reader = None
+        self.update()
+
+    def get_reader(self):
+        """Reader of the file, kept open until the file is written."""
+        if self.reader is None:
+            self.reader = affopen(self.filename)
+        return self.reader
+
+    def close(self):
+        """Close the reader of the file (it is reopened when needed)."""
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def update(self):
+        """Index items appended to the file since the last update."""
+        self.close()
+        if not isfile(self.filename) or getsize(self.filename) == 0:
+            return
+        reader = self.get_reader()
+        for n in range(len(self.index), len(reader)):
+            self.index[reader[n].key] = n
+
+    def remove(self):
+        """Delete the file and forget all results."""
+        self.close()
+        if isfile(self.filename) and rank == 0:
+            remove(self.filename)
+        self.index = {}
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def write(self, key, results):
+        """Append the results (a dict of arrays) of a displacement."""
+        self.close()
+        if rank == 0:
+            writer = affopen(self.filename, 'a')
+            writer.write(key=key, **results)
+            writer.close()
+        self.index[key] = len(self.index)
+
+    def read(self, key):
+        """Return the results of a displacement as a dict."""
+        item = self.get_reader()[self.index[key]]
+        return dict((name, item.get(name)) for name in dir(item)
+                    if name != 'key')
+
+
+def calculate(calc, atoms, properties):
+    """Calculate properties of a displaced configuration.
+
+    Runs in a worker of an executor and returns a dict of the results."""
+    atoms.set_calculator(calc)
+    results = {}
+    for name in properties:
+        if name == 'forces':
+            # Constraints are applied by apply_constraints() when the
+            # results are collected:
+            results[name] = atoms.get_forces(apply_constraint=False)
+        elif name == 'dipole':
+            results[name] = calc.get_dipole_moment(atoms)
+        else:
+            results[name] = calc.get_property(name, atoms)
+    return results
+
+
+def submit(executor, atoms, calc, properties):
+    """Submit calculation of a copy of atoms to executor.
+
+    Each job gets its own copy of the calculator, so that worker threads
+    do not share one.  Returns a future for the dict of results."""
+    return executor.submit(calculate, copy.deepcopy(calc), atoms.copy(),
+                           properties)
+
+
+def apply_constraints(atoms, results):
+    """Return results with the constraints of atoms applied to the forces.
+
+    Submitted calculations return the raw forces of the calculator.
+    This makes them equal to those from atoms.get_forces()."""
+    if 'forces' not in results or not atoms.constraints:
+        return results
+    forces = np.array(results['forces'])
+    for constraint in atoms.constraints:
+        constraint.adjust_forces(atoms, forces)
+    return dict(results, forces=forces)
+
+
+def as_completed(jobs):
+    """Iterate over (key, fd, future, atoms) jobs as their futures finish.
+
+    atoms is a copy of the configuration that was submitted."""
+    if not jobs:
+        return
+    from concurrent.futures import as_completed
+    futures = dict((job[2], job) for job in jobs)
+    for future in as_completed(futures):
+        yield futures[future]
+
+
+def get_lattice_symmetry(atoms, symprec=1e-4):
+    """Symmetry operations of atoms in a unit cell.
+
+    Returns a list of (W, perm, shifts) tuples, where W is an integer
+    matrix acting on scaled positions and perm and shifts tell that
+    atom a is moved to atom perm[a] in the cell shifted by the lattice
+    vector shifts[a] (in units of the cell vectors).  Only rotations
+    with elements -1, 0 and 1 are tried, so some operations may be
+    missed for very skewed cells.  Along directions without periodic
+    boundary conditions the atoms are not wrapped, and the rotations
+    may only change the sign of that direction."""
+
+    cell = atoms.get_cell()
+    pbc = atoms.get_pbc()
+    numbers = atoms.get_atomic_numbers()
+    spos = atoms.get_scaled_positions(wrap=False)
+    metric = np.dot(cell, cell.T)
+
+    W_x = np.array(list(itertools.product([-1, 0, 1], repeat=9)))
+    W_x = W_x.reshape((-1, 3, 3))
+    W_x = W_x[abs(np.einsum('xji,jk,xkl->xil', W_x, metric, W_x) -
+                  metric).max(axis=(1, 2)) < symprec * metric.max()]
+    for c in np.arange(3)[~pbc]:
+        W_x = W_x[(abs(W_x[:, c, c]) == 1) &
+                  (abs(W_x[:, c]).sum(1) == 1) &
+                  (abs(W_x[:, :, c]).sum(1) == 1)]
+
+    # Try to map the rarest kind of atom first:
+    kinds, counts = np.unique(numbers, return_counts=True)
+    a0 = np.nonzero(numbers == kinds[counts.argmin()])[0][0]
+
+    operations = []
+    for W in W_x:
+        rotated = np.dot(spos, W.T)
+        for a in np.nonzero(numbers == numbers[a0])[0]:
+            d = rotated + (spos[a] - rotated[a0])
+            # d[b] - spos[perm[b]] must be a lattice vector:
+            diff = d[:, np.newaxis] - spos
+            shifts = np.round(diff) * pbc
+            dist = np.sqrt((np.dot(diff - shifts, cell)**2).sum(2))
+            match = (dist < symprec) & (numbers[:, np.newaxis] == numbers)
+            if not match.any(1).all():
+                continue
+            perm = match.argmax(1)
+            if len(np.unique(perm)) < len(perm):
+                continue
+            shifts = shifts[np.arange(len(perm)), perm].astype(int)
+            operations.append((W, perm, shifts))
+    return operations
+
+
+def get_point_symmetry(atoms, symprec=1e-4):
+    """Symmetry operations of a finite structure.
+
+    Returns a list of (Q, perm) tuples, where the orthogonal matrix Q
+    (rotation or improper rotation about the center) moves atom a to
+    atom perm[a]."""
+
+    numbers = atoms.get_atomic_numbers()
+    pos = atoms.get_positions()
+    pos = pos - pos.mean(0)
+    r = np.sqrt((pos**2).sum(1))
+
+    # Two atoms not on a line with the center:
+    p = r.argmax()
+    cross = np.cross(pos[p], pos)
+    q = np.sqrt((cross**2).sum(1)).argmax()
+    if np.sqrt((cross[q]**2).sum()) < symprec * max(r[p], 1.0):
+        # Linear molecule (or a single atom):
+        candidates = [np.eye(3), -np.eye(3)]
+    else:
+        A = np.array([pos[p], pos[q], np.cross(pos[p], pos[q])])
+        candidates = []
+        for p1 in np.nonzero((numbers == numbers[p]) &
+                             (abs(r - r[p]) < symprec))[0]:
+            for q1 in np.nonzero((numbers == numbers[q]) &
+                                 (abs(r - r[q]) < symprec))[0]:
+                if abs(np.dot(pos[p1], pos[q1]) -
+                       np.dot(pos[p], pos[q])) > symprec * r[p]:
+                    continue
+                for sign in [1, -1]:
+                    B = np.array([pos[p1], pos[q1],
+                                  sign * np.cross(pos[p1], pos[q1])])
+                    candidates.append(np.linalg.solve(A, B).T)
+
+    operations = []
+    for Q in candidates:
+        if abs(np.dot(Q, Q.T) - np.eye(3)).max() > symprec:
+            continue
+        diff = np.dot(pos, Q.T)[:, np.newaxis] - pos
+        match = ((np.sqrt((diff**2).sum(2)) < symprec) &
+                 (numbers[:, np.newaxis] == numbers))
+        if not match.any(1).all():
+            continue
+        perm = match.argmax(1)
+        if len(np.unique(perm)) == len(perm):
+            operations.append((Q, perm))
+    return operations
+
+
+def get_fixed_atoms(atoms):
+    """Mask of the atoms fixed by FixAtoms constraints.
+
+    Other constraints break the symmetry in ways that are not handled,
+    so they raise ValueError."""
+    fixed = np.zeros(len(atoms), bool)
+    for constraint in atoms.constraints:
+        if not isinstance(constraint, FixAtoms):
+            raise ValueError('Symmetry can not be used with a {0} '
+                             'constraint'.format(
+                                 constraint.__class__.__name__))
+        fixed[constraint.index] = True
+    return fixed
+
+
+def get_symmetry_operations(atoms, supercell=(1, 1, 1), symprec=1e-4):
+    """Symmetry operations of atoms repeated by supercell.
+
+    Returns a list of (Q, perm) tuples, where the orthogonal matrix Q
+    is the cartesian rotation and perm[a] the atom that atom a of
+    ``atoms * supercell`` is moved to.  For periodic structures the
+    translations by the lattice vectors of the small cell are
+    included.  Operations that move atoms fixed by FixAtoms onto free
+    atoms are left out, and other constraints raise ValueError."""
+
+    fixed = np.tile(get_fixed_atoms(atoms), np.prod(supercell))
+    return [(Q, perm)
+            for Q, perm in get_all_symmetry_operations(atoms, supercell,
+                                                       symprec)
+            if (fixed[perm] == fixed).all()]
+
+
+def get_all_symmetry_operations(atoms, supercell=(1, 1, 1), symprec=1e-4):
+    """Symmetry operations of atoms repeated by supercell.
+
+    Like get_symmetry_operations(), but the constraints are ignored."""
+
+    natoms = len(atoms)
+    if not atoms.pbc.any():
+        assert tuple(supercell) == (1, 1, 1)
+        return get_point_symmetry(atoms, symprec)
+
+    N_c = np.array(supercell)
+    cell = atoms.get_cell()
+    if abs(np.linalg.det(cell)) < 1e-10:
+        return [(np.eye(3), np.arange(natoms * N_c.prod()))]
+    # Cell index m and atom b of the atoms in the supercell:
+    m_Nc = np.indices(N_c).reshape((3, -1)).T
+    operations = []
+    for W, perm, shifts in get_lattice_symmetry(atoms, symprec):
+        # The rotation must map the supercell lattice onto itself:
+        if (np.dot(W, np.diag(N_c)) % N_c[:, np.newaxis]).any():
+            continue
+        Q = np.dot(cell.T, np.dot(W, np.linalg.inv(cell.T)))
+        m_Nbc = (np.dot(m_Nc, W.T)[:, np.newaxis] + shifts)
+        for T_c in m_Nc:
+            m1_Nbc = (m_Nbc + T_c) % N_c
+            n_Nb = np.ravel_multi_index(m1_Nbc.reshape((-1, 3)).T, N_c)
+            operations.append(
+                (Q, (n_Nb.reshape((-1, natoms)) * natoms + perm).ravel()))
+    return operations
+
+
+def rotate(x, Q, perm):
+    """Apply symmetry operation to per-atom vectors or a single vector."""
+    if x.ndim == 1:
+        return np.dot(Q, x)
+    y = np.empty_like(x)
+    y[perm] = np.dot(x, Q.T)
+    return y
+
+
+class IrreducibleDisplacements:
+    """Displacements needed to get all derivatives using symmetry.
+
+    operations: list of (Q, perm) tuples
+        Symmetry operations (see get_symmetry_operations()).
+    indices: list of int
+        Atoms whose derivatives are needed.
+
+    The *displacements* attribute is the list of (a, i) tuples of atoms
+    and cartesian directions that must be calculated.  For every atom in
+    indices, three independent directions are known from these by
+    symmetry.  Without symmetry (or if the symmetry operations do not
+    map the atoms in indices onto each other), all directions of all
+    atoms are needed."""
+
+    def __init__(self, operations, indices):
+        self.indices = list(indices)
+        self.known = dict((a, []) for a in self.indices)
+        self.displacements = []
+        for a in self.indices:
+            for i in range(3):
+                u_i = [source[0] for source in self.known[a]]
+                if len(u_i) == 3 or dependent(u_i, np.eye(3)[i]):
+                    continue
+                self.displacements.append((a, i))
+                for Q, perm in operations:
+                    b = perm[a]
+                    if b not in self.known or len(self.known[b]) == 3:
+                        continue
+                    u = Q[:, i]
+                    if not dependent([source[0] for source in
+                                        self.known[b]], u):
+                        self.known[b].append((u, Q, perm, a, i))
+
+    def reconstruct(self, derivative):
+        """Derivatives of all atoms along x, y and z.
+
+        derivative(a, i) must return a list of arrays for the
+        displacement of atom a in direction i: per-atom vectors of shape
+        (natoms, 3) (like forces) or single vectors of shape (3,) (like
+        dipole moments).  Returns a dictionary mapping each atom in
+        indices to a list of such lists for the x, y and z directions."""
+        calculated = {}
+        results = {}
+        for a in self.indices:
+            U = []
+            rotated = []
+            for u, Q, perm, a0, i0 in self.known[a]:
+                if (a0, i0) not in calculated:
+                    calculated[(a0, i0)] = derivative(a0, i0)
+                U.append(u)
+                rotated.append([rotate(x, Q, perm)
+                                for x in calculated[(a0, i0)]])
+            # Derivative along u_k is sum_i U[k, i] * derivative along i:
+            Uinv = np.linalg.inv(U)
+            results[a] = [[sum(Uinv[i, k] * rotated[k][n] for k in range(3))
+                           for n in range(len(rotated[0]))]
+                          for i in range(3)]
+        return results
+
+
+def dependent(u_k, u, tol=1e-6):
+    """Is u linearly dependent on the vectors in u_k?"""
+    if not u_k:
+        return False
+    return np.linalg.matrix_rank(np.array(u_k + [u]), tol) == len(u_k)
@@ -3,7 +3,6 @@
 
 """Infrared intensities"""
 
-import pickle
 from math import sqrt
 from sys import stdout
 
@@ -12,6 +11,7 @@ import numpy as np
 import ase.units as units
 from ase.parallel import parprint, paropen
 from ase.vibrations import Vibrations
+from ase.vibrations.displacements import DisplacementStore
 
 
 class InfraRed(Vibrations):
@@ -65,6 +65,11 @@ class InfraRed(Vibrations):
         be considered, whereas for directions = [0, 1] only the dipole
         moment in the xy-plane will be considered. Default behavior is to
         use the dipole moment in all directions.
+    store: str or DisplacementStore
+        Name of an AFF file for the results of all displacements (see
+        Vibrations).
+    symmetry: bool
+        Calculate only the irreducible displacements (see Vibrations).
 
     Example:
     
@@ -143,7 +148,7 @@ class InfraRed(Vibrations):
 
     """
     def __init__(self, atoms, indices=None, name='ir', delta=0.01, 
-                 nfree=2, directions=None):
+                 nfree=2, directions=None, store=None, symmetry=False):
         assert nfree in [2, 4]
         self.atoms = atoms
         if atoms.constraints:
@@ -156,6 +161,11 @@ class InfraRed(Vibrations):
         self.nfree = nfree
         self.name = name + '-d%.3f' % delta
         self.delta = delta
+        if isinstance(store, str):
+            store = DisplacementStore(store)
+        self.store = store
+        self.symmetry = symmetry
+        self.reduction = None
         self.H = None
         if directions is None:
             self.directions = np.asarray([0, 1, 2])
@@ -172,46 +182,47 @@ class InfraRed(Vibrations):
                 'Only central difference is implemented at the moment.')
 
         # Get "static" dipole moment and forces
-        name = '%s.eq.pckl' % self.name
-        [forces_zero, dipole_zero] = pickle.load(open(name))
+        forces_zero, dipole_zero = self.load('eq')
         self.dipole_zero = (sum(dipole_zero**2)**0.5) / units.Debye
         self.force_zero = max([sum((forces_zero[j])**2)**0.5 
                                for j in self.indices])
 
+        def derivative(a, i):
+            name = '%d%s' % (a, 'xyz'[i])
+            fminus, dminus = self.load(name + '-')
+            fplus, dplus = self.load(name + '+')
+            if self.nfree == 4:
+                fminusminus, dminusminus = self.load(name + '--')
+                fplusplus, dplusplus = self.load(name + '++')
+            if self.method == 'frederiksen':
+                fminus[a] += -fminus.sum(0)
+                fplus[a] += -fplus.sum(0)
+                if self.nfree == 4:
+                    fminusminus[a] += -fminus.sum(0)
+                    fplusplus[a] += -fplus.sum(0)
+            if self.nfree == 2:
+                f = (fminus - fplus) / 2.0
+                d = dminus - dplus
+            if self.nfree == 4:
+                f = (-fminusminus + 8 * fminus - 8 * fplus +
+                     fplusplus) / 12.0
+                d = (-dplusplus + 8 * dplus - 8 * dminus + 
+                     dminusminus) / 6.0
+            return [f / (2 * self.delta), d / (2 * self.delta)]
+
+        derivatives = self.get_derivatives(derivative)
         ndof = 3 * len(self.indices)
         H = np.empty((ndof, ndof))
         dpdx = np.empty((ndof, 3))
         r = 0
         for a in self.indices:
-            for i in 'xyz':
-                name = '%s.%d%s' % (self.name, a, i)
-                [fminus, dminus] = pickle.load(open(name + '-.pckl'))
-                [fplus, dplus] = pickle.load(open(name + '+.pckl'))
-                if self.nfree == 4:
-                    [fminusminus, dminusminus] = pickle.load(
-                        open(name + '--.pckl'))
-                    [fplusplus, dplusplus] = pickle.load(
-                        open(name + '++.pckl'))
-                if self.method == 'frederiksen':
-                    fminus[a] += -fminus.sum(0)
-                    fplus[a] += -fplus.sum(0)
-                    if self.nfree == 4:
-                        fminusminus[a] += -fminus.sum(0)
-                        fplusplus[a] += -fplus.sum(0)
-                if self.nfree == 2:
-                    H[r] = (fminus - fplus)[self.indices].ravel() / 2.0
-                    dpdx[r] = (dminus - dplus)
-                if self.nfree == 4:
-                    H[r] = (-fminusminus + 8 * fminus - 8 * fplus +
-                            fplusplus)[self.indices].ravel() / 12.0
-                    dpdx[r] = (-dplusplus + 8 * dplus - 8 * dminus + 
-                               dminusminus) / 6.0
-                H[r] /= 2 * self.delta
-                dpdx[r] /= 2 * self.delta
+            for i in range(3):
+                f, d = derivatives[a][i]
+                H[r] = f[self.indices].ravel()
+                dpdx[r] = d
                 for n in range(3):
                     if n not in self.directions:
                         dpdx[r][n] = 0
-                        dpdx[r][n] = 0
                 r += 1
         # Calculate eigenfrequencies and eigenvectors
         m = self.atoms.get_masses()
@@ -223,7 +234,7 @@ class InfraRed(Vibrations):
         self.modes = modes.T.copy()
 
         # Calculate intensities
-        dpdq = np.array([dpdx[j] / sqrt(m[self.indices[j / 3]] * 
+        dpdq = np.array([dpdx[j] / sqrt(m[self.indices[j // 3]] * 
                                         units._amu / units._me) 
                          for j in range(ndof)])
         dpdQ = np.dot(dpdq.T, modes)
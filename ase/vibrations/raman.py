@@ -3,8 +3,6 @@
 """Resonant Raman intensities"""
 
 from __future__ import print_function
-import pickle
-import os
 import sys
 
 import numpy as np
@@ -64,16 +62,14 @@ class ResonantRaman(Vibrations):
         self.timer = Timer()
         self.txt = get_txt(txt, rank)
 
-    def calculate(self, filename, fd):
+    def calculate(self, key, fd):
         """Call ground and excited state calculation"""
         self.timer.start('Ground state')
         forces = self.atoms.get_forces()
-        if rank == 0:
-            pickle.dump(forces, fd)
-            fd.close()
+        self.write_output(key, fd, forces)
         self.timer.stop('Ground state')
         self.timer.start('Excitations')
-        basename, _ = os.path.splitext(filename)
+        basename = '%s.%s' % (self.name, key)
         excitations = self.exobj(self.atoms.get_calculator())
         excitations.write(basename + '.excitations')
         self.timer.stop('Excitations')
@@ -1,5 +1,4 @@
 from __future__ import print_function
-from math import exp, pi, sin, sqrt, cos, acos
 import numpy as np
 
 from ase.data import atomic_numbers
@@ -41,62 +40,123 @@ class XrDebye:
         After: T. Iwasa and K. Nobusada, J. Phys. Chem. C 111 (2007) 45
                s is assumed to be in 1/Angstrom
         """
+        return self.get_pattern(atoms, [s])[0]
 
+    def get_pattern(self, atoms, s, binsize=None, chunksize=None,
+                    executor=None):
+        """Get the powder x-ray (XRD) pattern for many values of s.
+
+        The pair distances are calculated once per pair of elements and
+        the Debye sum is done for all s (in 1/Angstrom) at once.
+
+        binsize: float
+            Histogram the pair distances in bins of this size (in
+            Angstrom), which is much faster for large structures.  The
+            binsize should be small compared to 1 / s.
+        chunksize: int
+            Number of s values to treat together.  Default is to use
+            roughly 64 MB for each chunk.
+        executor: Executor
+            An executor from the concurrent.futures module used to
+            calculate the chunks of s values concurrently.
+        """
+        s = np.asarray(s, float)
         sinth = self.wavelength * s / 2.
-        costh = sqrt(1. - sinth**2)
-        cos2th = cos(2. * acos(costh))
-        pre = exp(- self.damping * s**2 / 2)
- 
+        costh = np.sqrt(1. - sinth**2)
+        cos2th = np.cos(2. * np.arccos(costh))
+        pre = np.exp(- self.damping * s**2 / 2)
+
         if self.method == 'Iwasa':
             pre *= costh / (1. + self.alpha * cos2th**2)
 
         f = {}
-        def atomic(symbol):
-            if symbol not in f:
-                if self.method == 'Iwasa':
-                    f[symbol] = self.get_waasmaier(symbol, s)
-                else:
-                    f[symbol] = atomic_numbers[symbol]
-            return f[symbol]
-
-        def sinc(x):
-            if x < 1.e-6:
-                x2 = x * x
-                return 1 - x2 / 6. + x2 * x2 / 120.
+        for symbol in set(atoms.get_chemical_symbols()):
+            if self.method == 'Iwasa':
+                f[symbol] = self.get_waasmaier(symbol, s)
             else:
-                return sin(x) / x
+                f[symbol] = atomic_numbers[symbol] * np.ones_like(s)
 
-        I = 0.
-        for a in atoms:
-            fa = atomic(a.symbol)
-#            print a.symbol, fa
-            for b in atoms:
-                fb = atomic(b.symbol)
+        pairs = get_pair_distances(atoms, binsize)
+        if chunksize is None:
+            npairs = max([len(r) for r, w in pairs.values()] + [1])
+            chunksize = max(1, 2**23 // npairs)
+        chunks = [slice(i, i + chunksize)
+                  for i in range(0, len(s), chunksize)]
 
-                if a == b:
-                    twopis = 0.
-                else:
-                    vrij = a.position - b.position
-                    rij = np.sqrt(np.dot(vrij, vrij))
-                    twopisr = 2 * pi * s * rij
+        I = np.zeros_like(s)
+        for symbol in f:
+            I += (atoms.get_chemical_symbols().count(symbol) *
+                  f[symbol]**2)
+        for (a, b), (r, w) in pairs.items():
+            if executor is None:
+                sums = [debye_sum(s[c], r, w) for c in chunks]
+            else:
+                sums = [future.result() for future in
+                        [executor.submit(debye_sum, s[c], r, w)
+                         for c in chunks]]
+            I += f[a] * f[b] * np.concatenate(sums or [np.zeros(0)])
 
-                I += fa * fb * sinc(twopisr)
-                    
         return pre * I
 
     def get_waasmaier(self, symbol, s):
-        """Scattering factor for free atoms."""
+        """Scattering factor for free atoms.
+
+        s may be a number or an array."""
         if symbol == 'H':
             # XXXX implement analytical H
-            return 0
+            return 0 * s
         elif symbol in waasmaier:
             abc = waasmaier[symbol]
             f = abc[10]
-            s2 = s*s
+            s2 = s * s
             for i in range(5):
-                f += abc[2 * i] * exp(-abc[2 * i + 1] * s2)
+                f = f + abc[2 * i] * np.exp(-abc[2 * i + 1] * s2)
             return f
         if self.warn:
             print('<xrdebye::get_atomic> Element', symbol, 'not available')
-        return 0
-        
+        return 0 * s
+
+
+def get_pair_distances(atoms, binsize=None):
+    """Distances between all pairs of atoms, grouped by elements.
+
+    Returns a dictionary mapping pairs of chemical symbols to
+    (distances, weights), where the weights count both orderings of
+    each pair of atoms.  With binsize, the distances are histogrammed
+    and the mean distance in each bin is returned with the number of
+    pairs in the bin as weight."""
+    symbols = np.array(atoms.get_chemical_symbols())
+    pos = atoms.get_positions()
+    kinds = sorted(set(symbols))
+    pairs = {}
+    for i, a in enumerate(kinds):
+        pos_a = pos[symbols == a]
+        for b in kinds[i:]:
+            pos_b = pos[symbols == b]
+            r = []
+            # Row by row to avoid large temporary arrays:
+            for j, p in enumerate(pos_a):
+                if a == b:
+                    d = pos_b[j + 1:] - p
+                else:
+                    d = pos_b - p
+                r.append(np.sqrt((d**2).sum(1)))
+            r = np.concatenate(r) if r else np.zeros(0)
+            if binsize is None:
+                w = 2.0 * np.ones_like(r)
+            elif len(r):
+                n = np.floor(r / binsize).astype(int)
+                w = np.bincount(n)
+                r = np.bincount(n, r)[w > 0] / w[w > 0]
+                w = 2.0 * w[w > 0]
+            else:
+                w = r
+            pairs[(a, b)] = (r, w)
+    return pairs
+
+
+def debye_sum(s, r, w):
+    """Sum of w * sin(2 pi s r) / (2 pi s r) over distances r.
+
+    Returns an array with a value for each s."""
+    return np.dot(np.sinc(2 * s[:, np.newaxis] * r), w)